@@ -4,8 +4,11 @@ Flask Web Server for RAG Chatbot UI
 """
 
 import argparse
+import json
 import os
 import sys
+import time
+import uuid
 from pathlib import Path
 
 # Add src directory to path
@@ -13,34 +16,169 @@ src_dir = Path(__file__).parent
 if str(src_dir) not in sys.path:
     sys.path.insert(0, str(src_dir))
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context
 from flask_cors import CORS
-from chatbot import LocalChatbot
+from chatbot import LocalChatbot, context_builder_from_env, corpus_paths_from_env
+from dispatcher import Dispatcher, FairScheduler
+from facets import SearchFilter
+from metrics import ChatMetrics
+from ollama_client import OllamaBusyError, OllamaClient
+from response_cache import ResponseCache
+from sessions import SessionStore
+from startup import StartupPipeline
 
 app = Flask(__name__, template_folder='../templates', static_folder='../static')
 CORS(app)
 
-# Initialize chatbot instance
-chatbot_instance = None
+
+SESSION_COOKIE = 'rag_session'
+sessions = SessionStore(
+    max_sessions=int(os.getenv('SESSION_MAX', '1000')),
+    ttl_seconds=float(os.getenv('SESSION_TTL', '3600')),
+    max_chars=int(os.getenv('SESSION_MAX_CHARS', '20000000'))
+)
+
+# Hot-path latencies and Ollama timings, exposed at /api/metrics
+metrics = ChatMetrics()
+metrics.registry.gauge('rag_active_sessions', 'Browser sessions with conversation history.',
+                       lambda: len(sessions))
+
+def _response_cache_stat(name):
+    chatbot = startup.chatbot
+    if chatbot is None or chatbot.response_cache is None:
+        return None
+    return chatbot.response_cache.stats()[name]
+
+metrics.registry.gauge('rag_response_cache_entries', 'Answers held in the response cache.',
+                       lambda: _response_cache_stat('entries'))
+metrics.registry.gauge('rag_response_cache_hits_total', 'Response cache hits.',
+                       lambda: _response_cache_stat('hits'), kind='counter')
+metrics.registry.gauge('rag_response_cache_misses_total', 'Response cache misses.',
+                       lambda: _response_cache_stat('misses'), kind='counter')
+
+def _query_cache_stat(name):
+    chatbot = startup.chatbot
+    if chatbot is None or chatbot.vector_store is None:
+        return None
+    stats = chatbot.vector_store.query_cache_stats()
+    return stats[name] if stats else None
+
+metrics.registry.gauge('rag_query_cache_entries', 'Search results held in the query cache.',
+                       lambda: _query_cache_stat('entries'))
+metrics.registry.gauge('rag_query_cache_hits_total', 'Query cache hits.',
+                       lambda: _query_cache_stat('hits'), kind='counter')
+metrics.registry.gauge('rag_query_cache_misses_total', 'Query cache misses.',
+                       lambda: _query_cache_stat('misses'), kind='counter')
+metrics.registry.gauge('rag_query_cache_evictions_total', 'Query cache entries evicted to stay within its size.',
+                       lambda: _query_cache_stat('evictions'), kind='counter')
+
+def build_dispatcher():
+    """Fair per-model queue in front of Ollama that coalesces identical generations"""
+    queue_timeout = os.getenv('OLLAMA_QUEUE_TIMEOUT')
+    scheduler = FairScheduler(
+        limit=int(os.getenv('OLLAMA_MODEL_CONCURRENCY', '2')),
+        max_queue=int(os.getenv('OLLAMA_MAX_QUEUE', '256'))
+    )
+    metrics.track_scheduler(scheduler)
+    return Dispatcher(
+        scheduler,
+        coalesce=os.getenv('OLLAMA_COALESCE', '1') != '0',
+        max_wait=float(queue_timeout) if queue_timeout else None
+    )
+
+dispatcher = build_dispatcher()
+
+def build_response_cache():
+    """Response cache configured from the environment, or None when disabled"""
+    size = int(os.getenv('RESPONSE_CACHE_SIZE', '512'))
+    if size <= 0:
+        return None
+    return ResponseCache(
+        max_entries=size,
+        ttl_seconds=float(os.getenv('RESPONSE_CACHE_TTL', '3600')),
+        path=os.getenv('RESPONSE_CACHE_PATH')
+    )
+
+def build_chatbot():
+    """Create the chatbot shared by every session: the retrieval index is
+    read-only, while conversation history lives in the session store"""
+    ollama_host = os.getenv('OLLAMA_HOST', 'http://localhost:11434')
+    client = OllamaClient(
+        ollama_host,
+        pool_size=int(os.getenv('OLLAMA_POOL_SIZE', '10')),
+        connect_timeout=float(os.getenv('OLLAMA_CONNECT_TIMEOUT', '3')),
+        read_timeout=float(os.getenv('OLLAMA_READ_TIMEOUT', '60')),
+        retries=int(os.getenv('OLLAMA_RETRIES', '2'))
+    )
+    return LocalChatbot(
+        model_name=os.getenv('OLLAMA_MODEL', 'llama2'),
+        ollama_host=ollama_host,
+        use_rag=True,
+        index_path=os.getenv('RAG_INDEX_PATH'),
+        corpus_paths=corpus_paths_from_env(),
+        scorer=os.getenv('RAG_SCORER', 'tfidf'),
+        retrieval=os.getenv('RAG_RETRIEVAL', 'lexical'),
+        embed_model=os.getenv('RAG_EMBED_MODEL', 'nomic-embed-text'),
+        embedding_cache_path=os.getenv('RAG_EMBED_CACHE'),
+        retrieval_timeout=float(os.getenv('RAG_RETRIEVAL_TIMEOUT', '0.5')),
+        context_builder=context_builder_from_env(),
+        keep_alive=os.getenv('OLLAMA_KEEP_ALIVE', '30m'),
+        client=client,
+        response_cache=build_response_cache(),
+        metrics=metrics,
+        dispatcher=dispatcher
+    )
+
+# Loads the index and prepares Ollama in the background, so no request waits on it
+startup = StartupPipeline(build_chatbot, retry_seconds=float(os.getenv('OLLAMA_STARTUP_RETRY', '10')))
 
 def get_chatbot():
-    """Get or create chatbot instance"""
-    global chatbot_instance
-    if chatbot_instance is None:
-        chatbot_instance = LocalChatbot(
-            model_name=os.getenv('OLLAMA_MODEL', 'llama2'),
-            ollama_host=os.getenv('OLLAMA_HOST', 'http://localhost:11434'),
-            use_rag=True
-        )
-        
-        # Initialize Ollama if needed
-        if not chatbot_instance.check_ollama_running():
-            chatbot_instance.start_ollama_service()
-        
-        # Check and pull model
-        chatbot_instance.check_and_pull_model()
-    
-    return chatbot_instance
+    """The shared chatbot once its index is loaded, otherwise None"""
+    startup.start()
+    return startup.chatbot
+
+def starting_up_response():
+    """503 returned while the index is still loading"""
+    response = jsonify({
+        'success': False,
+        'error': 'The assistant is still starting up. Please try again shortly.',
+        'startup': startup.status()
+    })
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+def retrieval_only_reason():
+    return f"The language model is not available yet. {startup.message()}"
+
+def current_session():
+    """Get the chat session for this request's session cookie, assigning one if needed"""
+    session_id = request.cookies.get(SESSION_COOKIE)
+    if not session_id:
+        session_id = uuid.uuid4().hex
+        g.new_session_id = session_id
+    return sessions.get(session_id)
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    """Time every request by route; streamed responses are timed until their headers"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.http_seconds.observe(time.perf_counter() - started, method=request.method,
+                                     route=route, status=str(response.status_code))
+    return response
+
+@app.after_request
+def set_session_cookie(response):
+    """Send newly assigned session ids back to the browser"""
+    session_id = g.pop('new_session_id', None)
+    if session_id:
+        response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite='Lax')
+    return response
 
 @app.route('/')
 def index():
@@ -56,9 +194,28 @@ def chat():
         
         if not user_message:
             return jsonify({'error': 'Message is required'}), 400
+        try:
+            filters = SearchFilter.from_dict(data.get('filters'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         chatbot = get_chatbot()
-        response = chatbot.generate_response(user_message)
+        if chatbot is None:
+            return starting_up_response()
+        if not startup.model_ready.is_set():
+            # Answer from the index alone; the exchange is not added to history
+            return jsonify({
+                'success': True,
+                'response': chatbot.retrieval_only_response(user_message, filters, retrieval_only_reason()),
+                'model': chatbot.model_name,
+                'rag_enabled': chatbot.use_rag,
+                'retrieval_only': True
+            })
+        session = current_session()
+        with session.lock:
+            response = chatbot.generate_response(user_message, session.history, filters,
+                                                 client_id=session.session_id)
+        sessions.update(session)
         
         if response:
             return jsonify({
@@ -72,19 +229,70 @@ def chat():
                 'success': False,
                 'error': 'Failed to generate response. Please ensure Ollama is running.'
             }), 500
-            
+
+    except OllamaBusyError as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+def _sse(payload):
+    """Format a payload as a Server-Sent Events message"""
+    return f"data: {json.dumps(payload)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Handle chat requests, streaming tokens as Server-Sent Events"""
+    data = request.json or {}
+    user_message = data.get('message', '').strip()
+
+    if not user_message:
+        return jsonify({'error': 'Message is required'}), 400
+    try:
+        filters = SearchFilter.from_dict(data.get('filters'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    chatbot = get_chatbot()
+    if chatbot is None:
+        return starting_up_response()
+    session = current_session()
+
+    def events():
+        if not startup.model_ready.is_set():
+            yield _sse({'token': chatbot.retrieval_only_response(user_message, filters, retrieval_only_reason())})
+            yield _sse({'done': True, 'model': chatbot.model_name, 'rag_enabled': chatbot.use_rag,
+                        'retrieval_only': True})
+            return
+        try:
+            with session.lock:
+                for token in chatbot.generate_response_stream(user_message, session.history, filters,
+                                                              client_id=session.session_id):
+                    yield _sse({'token': token})
+            sessions.update(session)
+            yield _sse({
+                'done': True,
+                'model': chatbot.model_name,
+                'rag_enabled': chatbot.use_rag
+            })
+        except Exception as e:
+            yield _sse({'error': f'Failed to generate response: {e}'})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/clear', methods=['POST'])
 def clear_history():
     """Clear conversation history"""
     try:
-        chatbot = get_chatbot()
-        chatbot.conversation_history = []
+        session_id = request.cookies.get(SESSION_COOKIE)
+        if session_id:
+            sessions.clear(session_id)
         return jsonify({'success': True, 'message': 'History cleared'})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -94,13 +302,37 @@ def status():
     """Get chatbot status"""
     try:
         chatbot = get_chatbot()
-        ollama_running = chatbot.check_ollama_running()
+        if chatbot is None:
+            # Still loading the index; report progress without waiting for it
+            return jsonify({
+                'success': True,
+                'ready': False,
+                'ollama_running': False,
+                'model': os.getenv('OLLAMA_MODEL', 'llama2'),
+                'rag_enabled': True,
+                'active_sessions': len(sessions),
+                'dispatcher': dispatcher.scheduler.stats(),
+                'startup': startup.status()
+            })
+        startup_status = startup.status()
+        if startup_status['ready']:
+            ollama_running = chatbot.check_ollama_running()
+        else:
+            # The startup pipeline is already probing Ollama; don't stall the status poll on it
+            ollama_running = startup_status['ollama_ready']
         
         return jsonify({
             'success': True,
+            'ready': startup_status['ready'],
             'ollama_running': ollama_running,
             'model': chatbot.model_name,
-            'rag_enabled': chatbot.use_rag
+            'rag_enabled': chatbot.use_rag,
+            'active_sessions': len(sessions),
+            'response_cache': chatbot.response_cache.stats() if chatbot.response_cache else None,
+            'retrievers': chatbot.hybrid.stats() if chatbot.hybrid else None,
+            'query_cache': chatbot.vector_store.query_cache_stats() if chatbot.vector_store else None,
+            'dispatcher': dispatcher.scheduler.stats(),
+            'startup': startup_status
         })
     except Exception as e:
         return jsonify({
@@ -108,6 +340,11 @@ def status():
             'error': str(e)
         }), 500
 
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Latency histograms and counters in the Prometheus text format"""
+    return Response(metrics.render(), mimetype=None, content_type=metrics.registry.CONTENT_TYPE)
+
 if __name__ == '__main__':
     print("🚀 Starting Release Dashboard AI Assistant...")
 
@@ -128,6 +365,10 @@ if __name__ == '__main__':
     )
     args = parser.parse_args()
 
+    # With the reloader on, only the child process that serves requests warms up
+    if not args.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        startup.start()
+
     visible_host = "localhost" if args.host in ("0.0.0.0", "127.0.0.1") else args.host
     print(f"📱 Open http://{visible_host}:{args.port} in your browser")
 
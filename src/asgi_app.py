@@ -0,0 +1,576 @@
+#!/usr/bin/env python3
+"""
+ASGI Web Server for RAG Chatbot UI
+
+An asyncio serving path for the same UI and API as app.py. Chat requests wait
+on Ollama as coroutines instead of pinning a worker thread each. Generations
+go through a fair per-model queue that caps how many run at once and
+coalesces identical requests.
+
+Run with any ASGI server, e.g.:
+
+    uvicorn asgi_app:app --app-dir src --port 5002
+"""
+
+import argparse
+import asyncio
+import json
+import mimetypes
+import os
+import sys
+import time
+import uuid
+from http.cookies import SimpleCookie
+from pathlib import Path
+
+# Add src directory to path
+src_dir = Path(__file__).parent
+if str(src_dir) not in sys.path:
+    sys.path.insert(0, str(src_dir))
+
+from chatbot import LocalChatbot, context_builder_from_env, corpus_paths_from_env
+from dispatcher import AsyncDispatcher, FairScheduler, request_key
+from facets import SearchFilter
+from metrics import ChatMetrics
+from ollama_client import AsyncOllamaClient, OllamaBusyError
+from response_cache import ResponseCache
+from sessions import SessionStore
+from startup import StartupPipeline
+
+STATIC_DIR = (src_dir.parent / 'static').resolve()
+TEMPLATE_PATH = src_dir.parent / 'templates' / 'index.html'
+SESSION_COOKIE = 'rag_session'
+
+sessions = SessionStore(
+    max_sessions=int(os.getenv('SESSION_MAX', '1000')),
+    ttl_seconds=float(os.getenv('SESSION_TTL', '3600')),
+    max_chars=int(os.getenv('SESSION_MAX_CHARS', '20000000'))
+)
+
+# Hot-path latencies and Ollama timings, exposed at /api/metrics
+metrics = ChatMetrics()
+metrics.registry.gauge('rag_active_sessions', 'Browser sessions with conversation history.',
+                       lambda: len(sessions))
+
+
+class ChatService:
+    """Shared chatbot (retrieval + prompt building) plus the async Ollama client"""
+
+    def __init__(self):
+        self.startup = None
+        self.client = None
+        self.dispatcher = None
+        self.index_html = b''
+
+    @property
+    def chatbot(self):
+        """The shared chatbot once its index is loaded, otherwise None"""
+        return self.startup.chatbot if self.startup is not None else None
+
+    @property
+    def model_ready(self):
+        return self.startup is not None and self.startup.model_ready.is_set()
+
+    async def start(self):
+        """Open the async client and start loading the chatbot in the background"""
+        ollama_host = os.getenv('OLLAMA_HOST', 'http://localhost:11434')
+        # The scheduler below is the only concurrency limit and wait queue
+        self.client = AsyncOllamaClient(
+            ollama_host,
+            max_concurrency=None,
+            pool_size=int(os.getenv('OLLAMA_POOL_SIZE', '10')),
+            connect_timeout=float(os.getenv('OLLAMA_CONNECT_TIMEOUT', '3')),
+            read_timeout=float(os.getenv('OLLAMA_READ_TIMEOUT', '60'))
+        )
+        # Per-model fair queue that coalesces identical generations
+        scheduler = FairScheduler(
+            limit=int(os.getenv('OLLAMA_MODEL_CONCURRENCY', '2')),
+            max_queue=int(os.getenv('OLLAMA_MAX_QUEUE', '256'))
+        )
+        metrics.track_scheduler(scheduler)
+        queue_timeout = os.getenv('OLLAMA_QUEUE_TIMEOUT')
+        self.dispatcher = AsyncDispatcher(
+            scheduler,
+            coalesce=os.getenv('OLLAMA_COALESCE', '1') != '0',
+            max_wait=float(queue_timeout) if queue_timeout else None
+        )
+        # Loading the index, starting Ollama and pulling the model can take
+        # minutes; do it in the background so the server accepts requests at once
+        self.startup = StartupPipeline(
+            lambda: LocalChatbot(
+                model_name=os.getenv('OLLAMA_MODEL', 'llama2'),
+                ollama_host=ollama_host,
+                use_rag=True,
+                index_path=os.getenv('RAG_INDEX_PATH'),
+                corpus_paths=corpus_paths_from_env(),
+                scorer=os.getenv('RAG_SCORER', 'tfidf'),
+                retrieval=os.getenv('RAG_RETRIEVAL', 'lexical'),
+                embed_model=os.getenv('RAG_EMBED_MODEL', 'nomic-embed-text'),
+                embedding_cache_path=os.getenv('RAG_EMBED_CACHE'),
+                retrieval_timeout=float(os.getenv('RAG_RETRIEVAL_TIMEOUT', '0.5')),
+                context_builder=context_builder_from_env(),
+                keep_alive=os.getenv('OLLAMA_KEEP_ALIVE', '30m'),
+                response_cache=build_response_cache(),
+                metrics=metrics
+            ),
+            retry_seconds=float(os.getenv('OLLAMA_STARTUP_RETRY', '10'))
+        )
+        self.startup.start()
+        self.index_html = await asyncio.to_thread(render_index)
+
+    async def stop(self):
+        if self.startup is not None:
+            self.startup.stop()
+        if self.client is not None:
+            await self.client.aclose()
+
+    async def retrieval_only(self, user_message, filters):
+        """Answer from the index alone while the model is unavailable"""
+        reason = f"The language model is not available yet. {self.startup.message()}"
+        return await asyncio.to_thread(self.chatbot.retrieval_only_response, user_message, filters, reason)
+
+    async def _chat(self, payload):
+        result = await self.client.chat(payload)
+        metrics.record_ollama(result)
+        return result
+
+    async def _chat_stream(self, payload):
+        async for chunk in self.client.chat_stream(payload):
+            if chunk.get('error'):
+                raise RuntimeError(chunk['error'])
+            yield chunk
+            if chunk.get('done'):
+                metrics.record_ollama(chunk)
+                break
+
+    async def generate(self, user_message, history, filters=None, client_id=''):
+        """Generate a full response and record the exchange in ``history``"""
+        # Dense retrieval embeds the question with a blocking HTTP call
+        messages, cache_key, cached = await asyncio.to_thread(
+            self.chatbot.prepare_turn, user_message, history, filters)
+        if cached is not None:
+            self.chatbot.record_exchange(history, user_message, cached)
+            return cached
+
+        payload = self.chatbot.chat_payload(messages, stream=False)
+        try:
+            with metrics.stage('generate'):
+                result = await self.dispatcher.call(self.chatbot.model_name, request_key(payload),
+                                                    lambda: self._chat(payload), client_id)
+        except Exception:
+            metrics.turns.inc(outcome='error')
+            raise
+        ai_response = result.get('message', {}).get('content', '')
+        self.chatbot.finish_turn(history, user_message, ai_response, cache_key)
+        return ai_response
+
+    async def generate_stream(self, user_message, history, filters=None, client_id=''):
+        """Yield response tokens; the exchange is recorded once the stream completes"""
+        messages, cache_key, cached = await asyncio.to_thread(
+            self.chatbot.prepare_turn, user_message, history, filters)
+        if cached is not None:
+            yield cached
+            self.chatbot.record_exchange(history, user_message, cached)
+            return
+
+        chunks = []
+        payload = self.chatbot.chat_payload(messages, stream=True)
+        started = time.perf_counter()
+        try:
+            stream = self.dispatcher.stream(self.chatbot.model_name, request_key(payload),
+                                            lambda: self._chat_stream(payload), client_id)
+            async for chunk in stream:
+                token = chunk.get('message', {}).get('content', '')
+                if token:
+                    if not chunks:
+                        metrics.first_token_seconds.observe(time.perf_counter() - started)
+                    chunks.append(token)
+                    yield token
+                if chunk.get('done'):
+                    break
+        except Exception:
+            metrics.turns.inc(outcome='error')
+            raise
+        metrics.stage_seconds.observe(time.perf_counter() - started, stage='generate')
+        self.chatbot.finish_turn(history, user_message, ''.join(chunks), cache_key)
+
+    async def ollama_running(self):
+        try:
+            response = await self.client.get('/api/tags', timeout=3)
+            return response.status_code == 200
+        except Exception:
+            return False
+
+
+service = ChatService()
+
+
+def _response_cache_stat(name):
+    chatbot = service.chatbot
+    if chatbot is None or chatbot.response_cache is None:
+        return None
+    return chatbot.response_cache.stats()[name]
+
+
+metrics.registry.gauge('rag_response_cache_entries', 'Answers held in the response cache.',
+                       lambda: _response_cache_stat('entries'))
+metrics.registry.gauge('rag_response_cache_hits_total', 'Response cache hits.',
+                       lambda: _response_cache_stat('hits'), kind='counter')
+metrics.registry.gauge('rag_response_cache_misses_total', 'Response cache misses.',
+                       lambda: _response_cache_stat('misses'), kind='counter')
+
+
+def _query_cache_stat(name):
+    chatbot = service.chatbot
+    if chatbot is None or chatbot.vector_store is None:
+        return None
+    stats = chatbot.vector_store.query_cache_stats()
+    return stats[name] if stats else None
+
+
+metrics.registry.gauge('rag_query_cache_entries', 'Search results held in the query cache.',
+                       lambda: _query_cache_stat('entries'))
+metrics.registry.gauge('rag_query_cache_hits_total', 'Query cache hits.',
+                       lambda: _query_cache_stat('hits'), kind='counter')
+metrics.registry.gauge('rag_query_cache_misses_total', 'Query cache misses.',
+                       lambda: _query_cache_stat('misses'), kind='counter')
+metrics.registry.gauge('rag_query_cache_evictions_total', 'Query cache entries evicted to stay within its size.',
+                       lambda: _query_cache_stat('evictions'), kind='counter')
+
+
+def build_response_cache():
+    """Response cache configured from the environment, or None when disabled"""
+    size = int(os.getenv('RESPONSE_CACHE_SIZE', '512'))
+    if size <= 0:
+        return None
+    return ResponseCache(
+        max_entries=size,
+        ttl_seconds=float(os.getenv('RESPONSE_CACHE_TTL', '3600')),
+        path=os.getenv('RESPONSE_CACHE_PATH')
+    )
+
+
+def render_index():
+    """Render the UI template once, with the same static URLs Flask generates"""
+    from jinja2 import Template
+
+    def url_for(endpoint, filename):
+        return f'/{endpoint}/{filename}'
+
+    return Template(TEMPLATE_PATH.read_text()).render(url_for=url_for).encode('utf-8')
+
+
+class Request:
+    """Minimal view of an ASGI HTTP request"""
+
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self.receive = receive
+        self.method = scope['method']
+        self.path = scope['path']
+        self.cookies = SimpleCookie()
+        for name, value in scope.get('headers', []):
+            if name == b'cookie':
+                self.cookies.load(value.decode('latin-1'))
+        self.new_session_id = None
+
+    async def json(self):
+        body = b''
+        while True:
+            message = await self.receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        return json.loads(body) if body else {}
+
+    def cookie(self, name):
+        morsel = self.cookies.get(name)
+        return morsel.value if morsel else None
+
+    def session(self):
+        """Get the chat session for this request's cookie, assigning one if needed"""
+        session_id = self.cookie(SESSION_COOKIE)
+        if not session_id:
+            session_id = self.new_session_id = uuid.uuid4().hex
+        return sessions.get(session_id)
+
+
+def _headers(request, content_type, extra=()):
+    headers = [
+        (b'content-type', content_type.encode()),
+        (b'access-control-allow-origin', b'*'),
+    ]
+    headers.extend(extra)
+    if request.new_session_id:
+        cookie = f'{SESSION_COOKIE}={request.new_session_id}; Path=/; HttpOnly; SameSite=Lax'
+        headers.append((b'set-cookie', cookie.encode()))
+    return headers
+
+
+async def send_body(send, request, status, body, content_type):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': _headers(request, content_type)})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, request, payload, status=200):
+    await send_body(send, request, status, json.dumps(payload).encode('utf-8'), 'application/json')
+
+
+def _sse(payload):
+    """Format a payload as a Server-Sent Events message"""
+    return f"data: {json.dumps(payload)}\n\n".encode('utf-8')
+
+
+async def index(request, send):
+    """Serve the main UI page"""
+    await send_body(send, request, 200, service.index_html, 'text/html; charset=utf-8')
+
+
+async def static_file(request, send):
+    """Serve files under /static, refusing paths that escape the static directory"""
+    path = (STATIC_DIR / request.path[len('/static/'):]).resolve()
+    if STATIC_DIR not in path.parents or not path.is_file():
+        await send_body(send, request, 404, b'Not Found', 'text/plain')
+        return
+    content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+    await send_body(send, request, 200, await asyncio.to_thread(path.read_bytes), content_type)
+
+
+async def starting_up(request, send):
+    """503 sent while the index is still loading"""
+    body = json.dumps({
+        'success': False,
+        'error': 'The assistant is still starting up. Please try again shortly.',
+        'startup': service.startup.status()
+    }).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': 503,
+                'headers': _headers(request, 'application/json', [(b'retry-after', b'5')])})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def chat(request, send):
+    """Handle chat requests"""
+    try:
+        data = await request.json()
+        user_message = data.get('message', '').strip()
+
+        if not user_message:
+            await send_json(send, request, {'error': 'Message is required'}, 400)
+            return
+        try:
+            filters = SearchFilter.from_dict(data.get('filters'))
+        except ValueError as e:
+            await send_json(send, request, {'error': str(e)}, 400)
+            return
+
+        if service.chatbot is None:
+            await starting_up(request, send)
+            return
+        if not service.model_ready:
+            # Answer from the index alone; the exchange is not added to history
+            await send_json(send, request, {
+                'success': True,
+                'response': await service.retrieval_only(user_message, filters),
+                'model': service.chatbot.model_name,
+                'rag_enabled': service.chatbot.use_rag,
+                'retrieval_only': True
+            })
+            return
+
+        session = request.session()
+        response = await service.generate(user_message, session.history, filters, session.session_id)
+        sessions.update(session)
+
+        if response:
+            await send_json(send, request, {
+                'success': True,
+                'response': response,
+                'model': service.chatbot.model_name,
+                'rag_enabled': service.chatbot.use_rag
+            })
+        else:
+            await send_json(send, request, {
+                'success': False,
+                'error': 'Failed to generate response. Please ensure Ollama is running.'
+            }, 500)
+
+    except OllamaBusyError as e:
+        await send_json(send, request, {'success': False, 'error': str(e)}, 503)
+    except Exception as e:
+        await send_json(send, request, {'success': False, 'error': str(e)}, 500)
+
+
+async def chat_stream(request, send):
+    """Handle chat requests, streaming tokens as Server-Sent Events"""
+    data = await request.json()
+    user_message = data.get('message', '').strip()
+
+    if not user_message:
+        await send_json(send, request, {'error': 'Message is required'}, 400)
+        return
+    try:
+        filters = SearchFilter.from_dict(data.get('filters'))
+    except ValueError as e:
+        await send_json(send, request, {'error': str(e)}, 400)
+        return
+
+    if service.chatbot is None:
+        await starting_up(request, send)
+        return
+
+    session = request.session()
+    await send({'type': 'http.response.start', 'status': 200,
+                'headers': _headers(request, 'text/event-stream',
+                                    [(b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')])})
+    if not service.model_ready:
+        token = await service.retrieval_only(user_message, filters)
+        await send({'type': 'http.response.body', 'body': _sse({'token': token}), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': _sse({
+            'done': True,
+            'model': service.chatbot.model_name,
+            'rag_enabled': service.chatbot.use_rag,
+            'retrieval_only': True
+        })})
+        return
+    try:
+        async for token in service.generate_stream(user_message, session.history, filters,
+                                                   session.session_id):
+            await send({'type': 'http.response.body', 'body': _sse({'token': token}), 'more_body': True})
+        sessions.update(session)
+        event = {
+            'done': True,
+            'model': service.chatbot.model_name,
+            'rag_enabled': service.chatbot.use_rag
+        }
+    except Exception as e:
+        event = {'error': f'Failed to generate response: {e}'}
+    await send({'type': 'http.response.body', 'body': _sse(event)})
+
+
+async def clear_history(request, send):
+    """Clear conversation history"""
+    session_id = request.cookie(SESSION_COOKIE)
+    if session_id:
+        sessions.clear(session_id)
+    await send_json(send, request, {'success': True, 'message': 'History cleared'})
+
+
+async def status(request, send):
+    """Get chatbot status"""
+    chatbot = service.chatbot
+    startup_status = service.startup.status()
+    if startup_status['ready']:
+        ollama_running = await service.ollama_running()
+    else:
+        # The startup pipeline is already probing Ollama; don't stall the status poll on it
+        ollama_running = startup_status['ollama_ready']
+    await send_json(send, request, {
+        'success': True,
+        'ready': startup_status['ready'],
+        'ollama_running': ollama_running,
+        'model': chatbot.model_name if chatbot else os.getenv('OLLAMA_MODEL', 'llama2'),
+        'rag_enabled': chatbot.use_rag if chatbot else True,
+        'active_sessions': len(sessions),
+        'ollama_active': service.client.active,
+        'ollama_waiting': service.client.waiting,
+        'dispatcher': service.dispatcher.scheduler.stats(),
+        'response_cache': chatbot.response_cache.stats() if chatbot and chatbot.response_cache else None,
+        'retrievers': chatbot.hybrid.stats() if chatbot and chatbot.hybrid else None,
+        'query_cache': chatbot.vector_store.query_cache_stats() if chatbot and chatbot.vector_store else None,
+        'startup': startup_status
+    })
+
+
+async def prometheus_metrics(request, send):
+    """Latency histograms and counters in the Prometheus text format"""
+    await send_body(send, request, 200, metrics.render().encode('utf-8'), metrics.registry.CONTENT_TYPE)
+
+
+ROUTES = {
+    ('GET', '/'): index,
+    ('POST', '/api/chat'): chat,
+    ('POST', '/api/chat/stream'): chat_stream,
+    ('POST', '/api/clear'): clear_history,
+    ('GET', '/api/status'): status,
+    ('GET', '/api/metrics'): prometheus_metrics,
+}
+
+
+async def not_found(request, send):
+    await send_body(send, request, 404, b'Not Found', 'text/plain')
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await service.start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await service.stop()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    request = Request(scope, receive)
+    if request.method == 'OPTIONS':
+        await send({'type': 'http.response.start', 'status': 204, 'headers': _headers(request, 'text/plain', [
+            (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+            (b'access-control-allow-headers', b'Content-Type'),
+        ])})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    handler = ROUTES.get((request.method, request.path))
+    route = request.path
+    if handler is None and request.method == 'GET' and request.path.startswith('/static/'):
+        handler, route = static_file, '/static/<path>'
+    if handler is None:
+        handler, route = not_found, 'unmatched'
+    started = time.perf_counter()
+
+    async def timed_send(message):
+        # Streamed responses are timed until their headers
+        if message['type'] == 'http.response.start':
+            metrics.http_seconds.observe(time.perf_counter() - started, method=request.method,
+                                         route=route, status=str(message['status']))
+        await send(message)
+
+    await handler(request, timed_send)
+
+
+if __name__ == '__main__':
+    print("🚀 Starting Release Dashboard AI Assistant (async)...")
+
+    parser = argparse.ArgumentParser(
+        description="Release Dashboard AI Assistant ASGI Web Server"
+    )
+    parser.add_argument(
+        "--host", default="0.0.0.0",
+        help="Host interface to bind (default: 0.0.0.0)"
+    )
+    parser.add_argument(
+        "--port", type=int, default=int(os.getenv("PORT", "5002")),
+        help="Port to serve the web UI (default: 5002)"
+    )
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("❌ The async server needs uvicorn: pip install uvicorn")
+        sys.exit(1)
+
+    visible_host = "localhost" if args.host in ("0.0.0.0", "127.0.0.1") else args.host
+    print(f"📱 Open http://{visible_host}:{args.port} in your browser")
+
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""Benchmark ingest and search scaling of the vector store on synthetic chat logs.
+
+Examples:
+
+    python src/benchmark.py --sizes 1k,10k,100k
+    python src/benchmark.py --sizes 1m --backends numpy --output results.json
+    python src/benchmark.py --sizes 100k --backends python --workers 1,2,4,8
+    python src/benchmark.py --sizes 100k --scorers tfidf,bm25
+
+Every (size, backend) case runs in a fresh process so that index memory is
+measured without leftovers from earlier cases. Results are printed as a table
+and, with ``--output``, written as JSON for regression tracking.
+"""
+
+import argparse
+import gc
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from rich.console import Console
+from rich.table import Table
+
+from sparse_index import NUMPY_AVAILABLE
+from vector_store import SimpleVectorStore, _tokenize
+
+console = Console()
+
+SPEAKERS = [
+    "Sagar Naik", "Shilav Shinde", "Gautam Kumar", "Priya Raman", "Arjun Mehta",
+    "Neha Kulkarni", "Rahul Desai", "Anita Joshi", "Vikram Rao", "Meera Iyer",
+]
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+DOMAIN_WORDS = (
+    "release patch hotfix backlog changelog dashboard cutoff cron job promoted "
+    "rescheduled package version gateway database backup environment testing "
+    "validating workaround jira ticket timeline session status monitoring data "
+    "missing platform refresh support hyphenated dev qa search functionality "
+    "enhancements query updates manual backfilling laptop password setup link"
+).split()
+FILLER_WORDS = (
+    "hi please check if there is any today i we the a for of to and on in it "
+    "this that is are was not yet have has can will be do know what about also "
+    "send me still see why issue update quick done okay yes no fine just"
+).split()
+
+
+def parse_size(text: str) -> int:
+    """Parse sizes such as ``5000``, ``10k`` or ``1m``."""
+    text = text.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    if multiplier != 1:
+        text = text[:-1]
+    return int(float(text) * multiplier)
+
+
+def synthetic_vocabulary(size: int) -> List[str]:
+    """Deterministic pseudo-words, ranked from most to least frequent."""
+    consonants = "bcdfghjklmnprstvz"
+    vowels = "aeiou"
+    syllables = [c + v for c in consonants for v in vowels]
+    words: List[str] = []
+    for length in itertools.count(2):
+        for combo in itertools.product(syllables, repeat=length):
+            words.append("".join(combo))
+            if len(words) == size:
+                return words
+    return words
+
+
+def generate_corpus(n_docs: int, seed: int = 7, vocabulary_size: int = 50_000) -> Iterator[str]:
+    """Yield synthetic chat messages in the ``Name, Mon D, H:MM AM: text`` format.
+
+    Message words mix release-dashboard jargon, common filler words and a
+    Zipf-distributed synthetic vocabulary, so posting list lengths follow the
+    long-tailed shape of real chat logs. Release versions and ticket ids add
+    rare exact-match terms. The same seed always yields the same corpus.
+    """
+    rng = random.Random(seed)
+    vocabulary = DOMAIN_WORDS + FILLER_WORDS + synthetic_vocabulary(vocabulary_size)
+    cum_weights = list(itertools.accumulate(1.0 / rank for rank in range(1, len(vocabulary) + 1)))
+    for _ in range(n_docs):
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(4, 30))
+        roll = rng.random()
+        if roll < 0.15:
+            words.insert(rng.randrange(len(words) + 1), f"3.0.{rng.randint(40, 60)}.{rng.randint(0, 99):03d}")
+        elif roll < 0.25:
+            words.insert(rng.randrange(len(words) + 1), f"PNC-{rng.randint(55000, 59999)}")
+        hour = rng.randint(1, 12)
+        stamp = f"{rng.choice(MONTHS)} {rng.randint(1, 28)}, {hour}:{rng.randint(0, 59):02d} {rng.choice(('AM', 'PM'))}"
+        yield f"{rng.choice(SPEAKERS)}, {stamp}: {' '.join(words)}"
+
+
+def sample_queries(documents: Sequence[str], n_queries: int, seed: int = 11) -> List[str]:
+    """Build queries from 1-4 terms of randomly chosen corpus messages."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n_queries):
+        tokens = _tokenize(documents[rng.randrange(len(documents))])
+        k = min(len(tokens), rng.randint(1, 4))
+        queries.append(" ".join(rng.sample(tokens, k)))
+    return queries
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process (0 where unsupported)."""
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def results_digest(results: Sequence[Sequence]) -> str:
+    """Fingerprint of ranked results, for comparing backends and implementations."""
+    digest = hashlib.sha1()
+    for ranked in results:
+        for result in ranked:
+            digest.update(f"{result.text}\x00{result.score:.6f}\x00".encode("utf-8"))
+        digest.update(b"\x01")
+    return digest.hexdigest()
+
+
+def index_state(store: SimpleVectorStore) -> list:
+    """Everything an index build produces, segment by segment, for exact comparison."""
+    return [
+        (
+            segment.documents,
+            segment.postings.vocabulary.terms,
+            segment.lengths, segment.doc_indptr, segment.doc_terms, segment.doc_counts,
+            [(entries.doc_ids, entries.tfs) for entries in segment.postings.lists],
+        )
+        for segment in store._snapshot.segments
+    ]
+
+
+def run_parallel_builds(documents: List[str], backend: str, workers: Sequence[int]) -> List[Dict]:
+    """Time one-shot builds per worker count against a serial build."""
+    serial = SimpleVectorStore(backend=backend)
+    start = time.perf_counter()
+    serial.add_documents(documents)
+    serial_seconds = time.perf_counter() - start
+    expected = index_state(serial)
+    del serial
+
+    curve = []
+    for count in workers:
+        store = SimpleVectorStore(backend=backend)
+        gc.collect()
+        start = time.perf_counter()
+        store.add_documents(documents, workers=count)
+        seconds = time.perf_counter() - start
+        curve.append({
+            "workers": count,
+            "build_seconds": seconds,
+            "speedup": serial_seconds / seconds if seconds else 0.0,
+            "identical": index_state(store) == expected,
+        })
+    return curve
+
+
+def run_case(n_docs: int, backend: str, top_ks: Sequence[int], n_queries: int,
+             batch_size: int, seed: int, workers: Sequence[int] = (), scorer: str = "tfidf",
+             drop_counts: bool = False) -> Dict:
+    """Build one store and measure ingest, memory, query latency and parallel build speedup."""
+    documents = list(generate_corpus(n_docs, seed=seed))
+    queries = sample_queries(documents, n_queries, seed=seed + 1)
+    gc.collect()
+    rss_before = rss_bytes()
+
+    # Queries repeat across the timing runs; measure searches, not cache lookups
+    store = SimpleVectorStore(backend=backend, scorer=scorer, query_cache_size=0)
+    start = time.perf_counter()
+    for offset in range(0, len(documents), batch_size):
+        store.add_documents(documents[offset:offset + batch_size])
+    ingest_seconds = time.perf_counter() - start
+
+    # The first search refreshes IDF and norms (or builds the CSR matrix)
+    start = time.perf_counter()
+    store.search(queries[0], top_k=max(top_ks))
+    first_query_seconds = time.perf_counter() - start
+    if drop_counts:
+        store.drop_counts()
+    gc.collect()
+    index_bytes = max(rss_bytes() - rss_before, 0)
+
+    case = {
+        "documents": n_docs,
+        "backend": store.backend,
+        "scorer": scorer,
+        "corpus_bytes": sum(len(doc.encode("utf-8")) for doc in documents),
+        "vocabulary": len({term for segment in store._snapshot.segments for term in segment.postings}),
+        "segments": store.segment_count,
+        "ingest_seconds": ingest_seconds,
+        "ingest_docs_per_second": n_docs / ingest_seconds if ingest_seconds else 0.0,
+        "first_query_seconds": first_query_seconds,
+        "index_bytes": index_bytes,
+        "memory": store.memory_usage(),
+        "queries": [],
+    }
+
+    for top_k in top_ks:
+        latencies = []
+        results = []
+        for query in queries:
+            start = time.perf_counter()
+            results.append(store.search(query, top_k=top_k))
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+
+        start = time.perf_counter()
+        store.search_many(queries, top_k=top_k)
+        batch_seconds = time.perf_counter() - start
+
+        case["queries"].append({
+            "top_k": top_k,
+            "count": len(queries),
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "mean_ms": statistics.fmean(latencies) * 1000,
+            "batch_queries_per_second": len(queries) / batch_seconds if batch_seconds else 0.0,
+            "results_digest": results_digest(results),
+        })
+
+    if workers:
+        del store
+        case["parallel_build"] = run_parallel_builds(documents, backend, workers)
+    return case
+
+
+def run_isolated(*args) -> Dict:
+    """Run a case in a fresh interpreter so memory readings are not polluted."""
+    # Not a multiprocessing.Pool: its daemonic workers could not start the build pool
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(run_case, *args).result()
+
+
+def environment() -> Dict:
+    info = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": None,
+        "scipy": None,
+    }
+    if NUMPY_AVAILABLE:
+        import numpy
+        info["numpy"] = numpy.__version__
+        try:
+            import scipy
+            info["scipy"] = scipy.__version__
+        except ImportError:
+            pass
+    return info
+
+
+def render_table(cases: List[Dict]) -> None:
+    table = Table(show_header=True, header_style="bold magenta")
+    for column in ("Docs", "Backend", "Scorer", "Ingest docs/s", "First query", "Index MB", "Counted MB",
+                   "top_k", "p50 ms", "p95 ms", "p99 ms", "Batch q/s"):
+        table.add_column(column, justify="right")
+    for case in cases:
+        for row, stats in enumerate(case["queries"]):
+            prefix = [
+                f"{case['documents']:,}", case["backend"], case.get("scorer", "tfidf"),
+                f"{case['ingest_docs_per_second']:,.0f}",
+                f"{case['first_query_seconds']:.3f}s",
+                f"{case['index_bytes'] / 2**20:,.1f}",
+                f"{case['memory']['total'] / 2**20:,.1f}" if "memory" in case else "",
+            ] if row == 0 else [""] * 7
+            table.add_row(
+                *prefix, str(stats["top_k"]),
+                f"{stats['p50_ms']:.3f}", f"{stats['p95_ms']:.3f}", f"{stats['p99_ms']:.3f}",
+                f"{stats['batch_queries_per_second']:,.0f}",
+            )
+    console.print(table)
+
+    curves = [case for case in cases if case.get("parallel_build")]
+    if not curves:
+        return
+    table = Table(show_header=True, header_style="bold magenta", title="Parallel index build")
+    for column in ("Docs", "Backend", "Workers", "Build s", "Speedup", "Identical"):
+        table.add_column(column, justify="right")
+    for case in curves:
+        for point in case["parallel_build"]:
+            table.add_row(
+                f"{case['documents']:,}", case["backend"], str(point["workers"]),
+                f"{point['build_seconds']:.2f}", f"{point['speedup']:.2f}x",
+                "yes" if point["identical"] else "[red]NO[/red]",
+            )
+    console.print(table)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    available = [b for b in SimpleVectorStore.BACKENDS if b == "python" or NUMPY_AVAILABLE]
+    parser = argparse.ArgumentParser(
+        description="Benchmark SimpleVectorStore ingest and search on synthetic chat-log corpora",
+    )
+    parser.add_argument(
+        "--sizes", default="1k,10k,100k",
+        help="Comma-separated corpus sizes, e.g. 1k,10k,100k,1m (default: 1k,10k,100k)",
+    )
+    parser.add_argument(
+        "--backends", default=",".join(available),
+        help=f"Comma-separated store backends (default: {','.join(available)})",
+    )
+    parser.add_argument(
+        "--scorers", default="tfidf",
+        help=f"Comma-separated ranking functions from {','.join(SimpleVectorStore.SCORERS)} (default: tfidf)",
+    )
+    parser.add_argument("--top-k", default="1,10", help="Comma-separated top_k values (default: 1,10)")
+    parser.add_argument("--queries", type=int, default=200, help="Queries timed per case (default: 200)")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="Documents per add_documents call")
+    parser.add_argument("--seed", type=int, default=7, help="Corpus random seed")
+    parser.add_argument(
+        "--workers", default="",
+        help="Comma-separated process counts for a parallel build speedup curve, e.g. 1,2,4,8",
+    )
+    parser.add_argument(
+        "--drop-counts", action="store_true",
+        help="Free per-document term counts after the build (SimpleVectorStore.drop_counts)",
+    )
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    parser.add_argument("--json", action="store_true", help="Print JSON to stdout instead of a table")
+    parser.add_argument(
+        "--in-process", action="store_true",
+        help="Run cases in this process (faster, but index memory readings are unreliable)",
+    )
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(size) for size in args.sizes.split(",") if size.strip()]
+    backends = [backend.strip() for backend in args.backends.split(",") if backend.strip()]
+    scorers = [scorer.strip() for scorer in args.scorers.split(",") if scorer.strip()]
+    for scorer in scorers:
+        if scorer not in SimpleVectorStore.SCORERS:
+            parser.error(f"unknown scorer {scorer!r}")
+    top_ks = [int(k) for k in args.top_k.split(",") if k.strip()]
+    workers = [int(count) for count in args.workers.split(",") if count.strip()]
+    runner = run_case if args.in_process else run_isolated
+
+    cases = []
+    for n_docs in sizes:
+        for backend in backends:
+            for scorer in scorers:
+                if not args.json:
+                    console.print(f"[dim]Benchmarking {n_docs:,} documents with the {backend} backend "
+                                  f"and {scorer} scoring...[/dim]")
+                cases.append(runner(n_docs, backend, top_ks, args.queries, args.batch_size, args.seed,
+                                    workers, scorer, args.drop_counts))
+
+    report = {"environment": environment(), "cases": cases}
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        render_table(cases)
+
+
+if __name__ == "__main__":
+    main()
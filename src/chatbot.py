@@ -8,13 +8,24 @@ import sys
 import json
 import time
 import subprocess
-from typing import List, Dict, Optional
+import threading
+from typing import Callable, List, Dict, Iterator, Optional, Tuple
 import requests
 from colorama import init
 from rich.console import Console
 from rich.panel import Panel
 from rich.text import Text
-from vector_store import SimpleVectorStore
+from context_builder import ContextBuilder
+from dense_store import DenseVectorStore
+from embeddings import EmbeddingCache, OllamaEmbedder
+from facets import FilterLike
+from hybrid import HybridRetriever
+from ingest import corpus_fingerprint, index_is_current, ingest
+from dispatcher import Dispatcher, request_key
+from metrics import ChatMetrics
+from ollama_client import OllamaBusyError, OllamaClient
+from response_cache import ResponseCache, document_id
+from vector_store import SearchResult, SimpleVectorStore
 
 # Initialize colorama and rich console
 init(autoreset=True)
@@ -23,22 +34,56 @@ console = Console()
 class LocalChatbot:
     """A terminal-based chatbot using local Ollama models with RAG (Retrieval-Augmented Generation)"""
 
-    def __init__(self, model_name: str = "llama2", ollama_host: str = "http://localhost:11434", use_rag: bool = True):
+    RETRIEVAL_MODES = ("lexical", "dense", "hybrid")
+
+    def __init__(self, model_name: str = "llama2", ollama_host: str = "http://localhost:11434", use_rag: bool = True,
+                 index_path: Optional[str] = None, client: Optional[OllamaClient] = None,
+                 response_cache: Optional[ResponseCache] = None, corpus_paths: Optional[List[str]] = None,
+                 scorer: str = "tfidf", context_builder: Optional[ContextBuilder] = None,
+                 keep_alive: Optional[str] = "30m", metrics: Optional[ChatMetrics] = None,
+                 dispatcher: Optional[Dispatcher] = None, retrieval: str = "lexical",
+                 embed_model: str = "nomic-embed-text", embedding_cache_path: Optional[str] = None,
+                 retrieval_timeout: float = 0.5):
         self.model_name = model_name
         self.ollama_host = ollama_host
+        # Pooled keep-alive client shared by every call to Ollama
+        self.client = client or OllamaClient(ollama_host)
         self.use_rag = use_rag
+        self.index_path = index_path  # Optional on-disk index shared between processes
+        self.response_cache = response_cache  # Optional cache of answers to repeated questions
+        self.corpus_paths = corpus_paths  # Chat exports to index instead of the built-in conversation
+        self.scorer = scorer  # Ranking function: "tfidf", "bm25" or "bm25+"
+        # Fits retrieved context and history into token budgets behind a stable prompt prefix
+        self.context_builder = context_builder or ContextBuilder()
+        # How long Ollama keeps the model (and its prompt cache) loaded after a request
+        self.keep_alive = keep_alive
+        self.metrics = metrics or ChatMetrics()  # Stage latencies and Ollama timings
+        # Optional fair per-model queue that also coalesces identical generations
+        self.dispatcher = dispatcher
+        # "lexical" ranks with the term index; "dense" with Ollama embeddings of the same messages;
+        # "hybrid" runs both at once and fuses their rankings
+        if retrieval not in self.RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {retrieval!r}; expected one of {self.RETRIEVAL_MODES}")
+        self.retrieval = retrieval
+        self.embed_model = embed_model
+        self.embedding_cache_path = embedding_cache_path  # Optional SQLite file of message embeddings
+        self.retrieval_timeout = retrieval_timeout  # Seconds hybrid retrieval waits for its retrievers
         self.conversation_history: List[Dict[str, str]] = []
-        self.max_history_length = 10  # Keep last 10 exchanges
+        self.max_history_length = 10  # Keep at most 10 exchanges
         
         # Initialize vector store for RAG
         self.vector_store: Optional[SimpleVectorStore] = None
+        self.dense_store: Optional[DenseVectorStore] = None
+        self.hybrid: Optional[HybridRetriever] = None
+        # Serialises index changes, so the lexical and dense stores change together
+        self._write_lock = threading.Lock()
         if self.use_rag:
             self._initialize_vectordb()
 
     def check_ollama_running(self) -> bool:
         """Check if Ollama service is running"""
         try:
-            response = requests.get(f"{self.ollama_host}/api/tags", timeout=3)
+            response = self.client.get("/api/tags", timeout=3)
             return response.status_code == 200
         except (requests.RequestException, requests.Timeout):
             return False
@@ -68,7 +113,7 @@ class LocalChatbot:
         """Check if model exists, pull it if not"""
         try:
             # Check available models
-            response = requests.get(f"{self.ollama_host}/api/tags")
+            response = self.client.get("/api/tags")
             available_models = [model['name'] for model in response.json().get('models', [])]
 
             if self.model_name not in available_models:
@@ -94,10 +139,79 @@ class LocalChatbot:
             console.print(f"[red]Error checking models: {e}[/red]")
             return False
 
+    def model_available(self, model: Optional[str] = None) -> bool:
+        """Check whether the model (default: the chat model) has already been pulled"""
+        model = model or self.model_name
+        response = self.client.get("/api/tags", timeout=3)
+        response.raise_for_status()
+        names = {entry['name'] for entry in response.json().get('models', [])}
+        return model in names or f"{model}:latest" in names
+
+    def pull_model(self, progress: Optional[Callable[[str, Optional[float]], None]] = None,
+                   model: Optional[str] = None) -> None:
+        """Pull the model (default: the chat model) through Ollama's HTTP API, reporting
+        ``(status, fraction done)`` to ``progress``"""
+        with self.client.post("/api/pull", json={"model": model or self.model_name, "stream": True},
+                              stream=True, timeout=(self.client.connect_timeout, 600)) as response:
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code} - {response.text}")
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                update = json.loads(line)
+                if update.get('error'):
+                    raise RuntimeError(update['error'])
+                if progress is not None:
+                    total = update.get('total')
+                    fraction = update.get('completed', 0) / total if total else None
+                    progress(update.get('status', ''), fraction)
+
+    def load_model(self) -> None:
+        """Load the model into memory so the first chat turn does not pay for it"""
+        # A chat request without messages only loads the model
+        payload = {"model": self.model_name, "messages": []}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        response = self.client.post("/api/chat", json=payload, timeout=(self.client.connect_timeout, 600))
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code} - {response.text}")
+
+    def retrieval_only_response(self, user_message: str, filters: FilterLike = None,
+                                reason: str = "The model is still loading.") -> str:
+        """Answer with the retrieved messages alone, for use while the model is unavailable"""
+        results = self.retrieve(user_message, n_results=3, filters=filters)
+        if not results:
+            return f"{reason} No related messages were found in previous conversations; please try again shortly."
+        snippets = self.context_builder.select_snippets(user_message, [result.text for result in results])
+        lines = "\n".join(f"- {snippet}" for snippet in snippets)
+        return f"{reason} Meanwhile, these messages from previous conversations look relevant:\n{lines}"
+
     def _initialize_vectordb(self) -> None:
         """Initialize the lightweight vector store with conversation data."""
         try:
-            store = SimpleVectorStore()
+            # An index built from other exports (or older versions of them) is rebuilt
+            if self.index_path and index_is_current(self.index_path, self.corpus_paths):
+                self.vector_store = SimpleVectorStore.open(self.index_path, scorer=self.scorer)
+                console.print(f"[green]✓ Loaded vector store index from {self.index_path} "
+                              f"({len(self.vector_store.documents)} conversation messages)[/green]")
+                return
+            if self.index_path and os.path.exists(self.index_path):
+                console.print(f"[yellow]{self.index_path} was built from a different corpus; "
+                              f"rebuilding it[/yellow]")
+
+            store = SimpleVectorStore(scorer=self.scorer)
+            if self.corpus_paths:
+                stats = ingest(store, self.corpus_paths)
+                if self.index_path:
+                    store.save(self.index_path, corpus_fingerprint(self.corpus_paths))
+                # The index is read-only from here on; free the per-document counts
+                store.drop_counts()
+                self.vector_store = store
+                console.print(f"[green]✓ Initialized vector store with {stats.indexed} messages "
+                              f"from {', '.join(self.corpus_paths)} "
+                              f"({store.memory_usage()['total'] / 2**20:,.1f} MB)[/green]")
+                return
+
             conversation_documents = [
                 "Sagar Naik: Hi @Gautam Kumar @Shilav Shinde, do we have backlog created for release dashboard. Is the KT done",
                 "Shilav Shinde, Aug 7, 9:12 AM: Hi @Sagar Naik. Waiting for client laptop, not yet received. On last Monday, done the cisco secureIT password setup process.",
@@ -149,6 +263,8 @@ class LocalChatbot:
                 "Shilav Shinde, Oct 29, 10:47 AM: Hi @Sagar Naik. Health Check for Collections and status of release dashboard - Release 3.0.50.041 has started. As of now its in PD promotion stage. Release 3.0.50.040 has been promoted, and the release change logs data is also available. PD and PnC Tags, Tags, Releasechangelogs, tenants collection data are up to date. cc: @Gautam Kumar",
             ]
             store.add_documents(conversation_documents)
+            if self.index_path:
+                store.save(self.index_path)
             self.vector_store = store
             console.print(f"[green]✓ Initialized vector store with {len(conversation_documents)} conversation messages[/green]")
         except Exception as exc:
@@ -157,12 +273,95 @@ class LocalChatbot:
             self.use_rag = False
             self.vector_store = None
 
-    def retrieve_context(self, query: str, n_results: int = 3) -> str:
-        """Retrieve relevant context from the local vector store."""
+    def build_dense_store(self) -> None:
+        """Embed the indexed messages for dense or hybrid retrieval; needs Ollama and the embedding model.
+
+        Until this succeeds, retrieval uses the lexical index.
+        """
+        cache = EmbeddingCache(self.embedding_cache_path) if self.embedding_cache_path else None
+        embedder = OllamaEmbedder(self.client, model=self.embed_model, cache=cache)
+        store = DenseVectorStore(embedder)
+        with self._write_lock:
+            # Under the lexical store's doc ids, which hybrid retrieval fuses on
+            items = self.vector_store.items()
+            store.add_documents([text for _, text in items], doc_ids=[doc_id for doc_id, _ in items])
+            if self.retrieval == "hybrid":
+                hybrid = HybridRetriever({"lexical": self.vector_store, "dense": store},
+                                         timeout=self.retrieval_timeout)
+                self.metrics.track_retriever(hybrid)
+                self.hybrid = hybrid
+            self.dense_store = store
+        console.print(f"[green]✓ Embedded {store.document_count} messages with {self.embed_model} "
+                      f"({embedder.requests} requests to Ollama)[/green]")
+
+    def add_documents(self, docs: List[str]) -> List[Optional[int]]:
+        """Index ``docs`` for retrieval and return their ids (None for documents without words).
+
+        Once dense retrieval is built, the documents are embedded under the
+        same ids. This and the other write methods keep both stores in step.
+        """
+        with self._write_lock:
+            doc_ids = self._lexical_store().add_documents(docs)
+            self._write_dense(lambda store: store.add_documents(docs, doc_ids=doc_ids))
+        return doc_ids
+
+    def delete_document(self, doc_id: int) -> None:
+        """Remove document ``doc_id`` from retrieval; raises KeyError if there is none."""
+        with self._write_lock:
+            self._lexical_store().delete(doc_id)
+            self._write_dense(lambda store: store.delete(doc_id))
+
+    def update_document(self, doc_id: int, text: str) -> None:
+        """Replace the text of document ``doc_id``, keeping its id; raises KeyError if there is none."""
+        with self._write_lock:
+            self._lexical_store().update(doc_id, text)
+            self._write_dense(lambda store: store.update(doc_id, text))
+
+    def _lexical_store(self) -> SimpleVectorStore:
+        if self.vector_store is None:
+            raise RuntimeError("Retrieval is disabled; there is no index to change")
+        return self.vector_store
+
+    def _write_dense(self, write: Callable[[DenseVectorStore], object]) -> None:
+        """Apply ``write`` to the dense store, if any; if it fails, drop back to lexical retrieval."""
+        if self.dense_store is None:
+            return
+        try:
+            write(self.dense_store)
+        except (requests.RequestException, RuntimeError) as exc:
+            console.print(f"[yellow]Could not update the dense index ({exc}); "
+                          f"using lexical retrieval until it is rebuilt[/yellow]")
+            self.hybrid = None
+            self.dense_store = None
+
+    def retrieve(self, query: str, n_results: int = 3, filters: FilterLike = None) -> List[SearchResult]:
+        """Retrieve the most relevant documents from the local vector store.
+
+        ``filters`` restricts retrieval by speaker, time range or mentioned
+        tickets/releases (see ``facets.SearchFilter``). In dense mode, a
+        question that Ollama fails to embed is answered from the lexical
+        index instead. In hybrid mode, both retrievers run concurrently
+        within ``retrieval_timeout`` (see ``hybrid.HybridRetriever``).
+        """
         if not self.use_rag or not self.vector_store:
-            return ""
+            return []
+        with self.metrics.stage("retrieve"):
+            if self.hybrid is not None:
+                return self.hybrid.search(query, top_k=n_results, filters=filters)
+            if self.dense_store is not None:
+                try:
+                    return self.dense_store.search(query, top_k=n_results, filters=filters)
+                except (requests.RequestException, RuntimeError) as exc:
+                    console.print(f"[yellow]Dense retrieval failed, using lexical results: {exc}[/yellow]")
+            return self.vector_store.search(query, top_k=n_results, filters=filters)
+
+    def retrieve_context(self, query: str, n_results: int = 3, filters: FilterLike = None) -> str:
+        """Retrieve relevant context from the local vector store."""
+        return self.format_context(self.retrieve(query, n_results, filters))
 
-        results = self.vector_store.search(query, top_k=n_results)
+    @staticmethod
+    def format_context(results: List[SearchResult]) -> str:
+        """Format retrieved documents as a prompt section."""
         if not results:
             return ""
 
@@ -172,66 +371,179 @@ class LocalChatbot:
         ]
         return "\n\nRelevant context from conversation:\n" + "\n".join(context_lines) + "\n"
 
-    def generate_response(self, user_message: str) -> Optional[str]:
-        """Generate response from the model with RAG context"""
-        try:
-            # Retrieve relevant context from vector database if RAG is enabled
-            context = ""
-            if self.use_rag:
-                context = self.retrieve_context(user_message, n_results=3)
-            
-            # Prepare the user message with context
-            enhanced_message = user_message
-            if context:
-                enhanced_message = f"""Based on the following context from previous conversations, answer the user's question. If the context doesn't contain relevant information, answer based on your general knowledge.
-
-{context}
-
-User question: {user_message}
-
-Please provide a helpful answer based on the context above."""
-            
-            # Prepare the prompt with conversation history
-            messages = self.conversation_history.copy()
-            messages.append({"role": "user", "content": enhanced_message})
-
-            # Make request to Ollama API
-            payload = {
-                "model": self.model_name,
-                "messages": messages,
-                "stream": False
-            }
-
-            response = requests.post(
-                f"{self.ollama_host}/api/chat",
-                json=payload,
-                timeout=60
+    def build_messages(self, user_message: str, history: List[Dict[str, str]],
+                       context_results: Optional[List[SearchResult]] = None) -> List[Dict[str, str]]:
+        """Build the Ollama chat messages for a user turn, including RAG context"""
+        # Retrieve relevant context from vector database if RAG is enabled
+        if context_results is None:
+            context_results = self.retrieve(user_message, n_results=3)
+        with self.metrics.stage("prompt"):
+            return self.context_builder.build(user_message, history, [result.text for result in context_results])
+
+    def chat_payload(self, messages: List[Dict[str, str]], stream: bool) -> Dict:
+        """Request body for Ollama's /api/chat"""
+        payload = {
+            "model": self.model_name,
+            "messages": messages,
+            "stream": stream
+        }
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def record_exchange(self, history: List[Dict[str, str]], user_message: str, ai_response: str) -> None:
+        """Add a completed exchange to a conversation history, in place"""
+        history.append({"role": "user", "content": user_message})
+        history.append({"role": "assistant", "content": ai_response})
+
+        # Trim history if too long. Dropping several exchanges at once keeps the
+        # prompt prefix unchanged for the next few turns, so Ollama can reuse it.
+        if len(history) > self.max_history_length * 2:
+            drop = max(len(history) - self.max_history_length * 2, self.context_builder.history_drop * 2)
+            del history[:drop]
+
+    def prepare_turn(self, user_message: str, history: List[Dict[str, str]], filters: FilterLike = None
+                     ) -> Tuple[Optional[List[Dict[str, str]]], Optional[str], Optional[str]]:
+        """Retrieve context and build the prompt for a turn, consulting the response cache.
+
+        Returns ``(messages, cache_key, cached_response)``. On a cache hit
+        ``messages`` is None and the model does not need to be called.
+        """
+        context_results = self.retrieve(user_message, n_results=3, filters=filters)
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = ResponseCache.make_key(
+                user_message, self.model_name, [document_id(result.text) for result in context_results]
             )
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                self.metrics.turns.inc(outcome="cached")
+                return None, cache_key, cached
+        return self.build_messages(user_message, history, context_results), cache_key, None
+
+    def finish_turn(self, history: List[Dict[str, str]], user_message: str, ai_response: str,
+                    cache_key: Optional[str] = None) -> None:
+        """Record a completed exchange and cache the response for repeated questions"""
+        self.record_exchange(history, user_message, ai_response)
+        self.metrics.turns.inc(outcome="ok")
+        if cache_key is not None and ai_response:
+            self.response_cache.put(cache_key, ai_response)
+
+    def _post_chat(self, payload: Dict) -> Dict:
+        """Send one non-streaming chat request and decode the reply."""
+        with self.metrics.stage("generate"):
+            response = self.client.post("/api/chat", json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code} - {response.text}")
+        with self.metrics.stage("parse"):
+            result = response.json()
+        self.metrics.record_ollama(result)
+        return result
+
+    def _stream_chat(self, payload: Dict) -> Iterator[Dict]:
+        """Yield the decoded NDJSON chunks of one streaming chat request."""
+        parse_seconds = 0.0
+        with self.client.post("/api/chat", json=payload, stream=True) as response:
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code} - {response.text}")
+
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                parse_started = time.perf_counter()
+                chunk = json.loads(line)
+                parse_seconds += time.perf_counter() - parse_started
+                if chunk.get('error'):
+                    raise RuntimeError(chunk['error'])
+                yield chunk
+                if chunk.get('done'):
+                    self.metrics.record_ollama(chunk)
+                    break
+        self.metrics.stage_seconds.observe(parse_seconds, stage="parse")
 
-            if response.status_code == 200:
-                result = response.json()
-                ai_response = result.get('message', {}).get('content', '')
-
-                # Add to conversation history
-                self.conversation_history.append({"role": "user", "content": user_message})
-                self.conversation_history.append({"role": "assistant", "content": ai_response})
+    def generate_response(self, user_message: str, history: Optional[List[Dict[str, str]]] = None,
+                          filters: FilterLike = None, client_id: str = "") -> Optional[str]:
+        """Generate response using Ollama API with RAG context.
 
-                # Trim history if too long
-                if len(self.conversation_history) > self.max_history_length * 2:
-                    self.conversation_history = self.conversation_history[-self.max_history_length * 2:]
+        ``history`` is the conversation to continue and update; it defaults to
+        this chatbot's own ``conversation_history``. ``filters`` restricts the
+        retrieved context. With a ``dispatcher``, ``client_id`` identifies the
+        caller for fair queueing; :class:`OllamaBusyError` is raised if the
+        request cannot get a generation slot.
+        """
+        if history is None:
+            history = self.conversation_history
+        try:
+            messages, cache_key, cached = self.prepare_turn(user_message, history, filters)
+            if cached is not None:
+                self.record_exchange(history, user_message, cached)
+                return cached
 
-                return ai_response
+            # Make request to Ollama API
+            payload = self.chat_payload(messages, stream=False)
+            if self.dispatcher is None:
+                result = self._post_chat(payload)
             else:
-                console.print(f"[red]Error: HTTP {response.status_code} - {response.text}[/red]")
-                return None
-
+                result = self.dispatcher.call(self.model_name, request_key(payload),
+                                              lambda: self._post_chat(payload), client_id)
+            ai_response = result.get('message', {}).get('content', '')
+            self.finish_turn(history, user_message, ai_response, cache_key)
+            return ai_response
+
+        except OllamaBusyError:
+            self.metrics.turns.inc(outcome="error")
+            raise
         except requests.RequestException as e:
             console.print(f"[red]Network error: {e}[/red]")
+            self.metrics.turns.inc(outcome="error")
             return None
         except Exception as e:
             console.print(f"[red]Unexpected error: {e}[/red]")
+            self.metrics.turns.inc(outcome="error")
             return None
 
+    def generate_response_stream(self, user_message: str, history: Optional[List[Dict[str, str]]] = None,
+                                 filters: FilterLike = None, client_id: str = "") -> Iterator[str]:
+        """Stream the model's response token by token with RAG context.
+
+        Consumes Ollama's NDJSON stream as it arrives. The exchange is added to
+        ``history`` (default: ``conversation_history``) only once the stream
+        completes; errors are raised to the caller. With a ``dispatcher``, an
+        identical request already streaming is joined instead of repeated.
+        """
+        if history is None:
+            history = self.conversation_history
+        messages, cache_key, cached = self.prepare_turn(user_message, history, filters)
+        if cached is not None:
+            yield cached
+            self.record_exchange(history, user_message, cached)
+            return
+
+        payload = self.chat_payload(messages, stream=True)
+        chunks: List[str] = []
+        started = time.perf_counter()
+        try:
+            if self.dispatcher is None:
+                stream = self._stream_chat(payload)
+            else:
+                stream = self.dispatcher.stream(self.model_name, request_key(payload),
+                                                lambda: self._stream_chat(payload), client_id)
+            for chunk in stream:
+                token = chunk.get('message', {}).get('content', '')
+                if token:
+                    if not chunks:
+                        self.metrics.first_token_seconds.observe(time.perf_counter() - started)
+                    chunks.append(token)
+                    yield token
+                if chunk.get('done'):
+                    break
+        except Exception:
+            self.metrics.turns.inc(outcome="error")
+            raise
+        self.metrics.stage_seconds.observe(time.perf_counter() - started, stage="generate")
+
+        self.finish_turn(history, user_message, "".join(chunks), cache_key)
+
     def display_welcome(self):
         """Display welcome message and instructions"""
         welcome_text = Text("🤖 Local LLM Chatbot with RAG", style="bold blue")
@@ -276,6 +588,15 @@ Please provide a helpful answer based on the context above."""
                 console.print(f"[yellow]Try running: ollama pull {self.model_name}[/yellow]")
                 return
 
+            if self.use_rag and self.retrieval != "lexical":
+                try:
+                    with console.status(f"[bold green]Embedding messages with {self.embed_model}..."):
+                        self.build_dense_store()
+                except Exception as e:
+                    console.print(f"[yellow]Warning: Could not embed messages with {self.embed_model}: {e}[/yellow]")
+                    console.print(f"[yellow]Try running: ollama pull {self.embed_model}. "
+                                  f"Using lexical retrieval meanwhile...[/yellow]")
+
             # Display welcome message
             self.display_welcome()
 
@@ -338,6 +659,19 @@ Please provide a helpful answer based on the context above."""
             console.print(f"[dim]{traceback.format_exc()}[/dim]")
 
 
+def corpus_paths_from_env() -> List[str]:
+    """Chat export paths listed in RAG_CORPUS_PATH (separated like PATH)"""
+    return [path for path in os.getenv("RAG_CORPUS_PATH", "").split(os.pathsep) if path]
+
+
+def context_builder_from_env() -> ContextBuilder:
+    """Prompt token budgets from RAG_CONTEXT_TOKENS and RAG_HISTORY_TOKENS"""
+    return ContextBuilder(
+        context_tokens=int(os.getenv("RAG_CONTEXT_TOKENS", "600")),
+        history_tokens=int(os.getenv("RAG_HISTORY_TOKENS", "1500"))
+    )
+
+
 def main():
     """Main entry point"""
     import argparse
@@ -359,12 +693,31 @@ Examples:
                        help="Ollama host URL (default: http://localhost:11434)")
     parser.add_argument("--no-rag", action="store_true",
                        help="Disable RAG (Retrieval-Augmented Generation)")
+    parser.add_argument("--index", default=os.getenv("RAG_INDEX_PATH"),
+                       help="Vector store index file; built on first run and memory-mapped afterwards")
+    parser.add_argument("--corpus", action="append",
+                       help="Chat export file or directory to index (repeatable; default: $RAG_CORPUS_PATH "
+                            "or the built-in conversation)")
+    parser.add_argument("--scorer", default=os.getenv("RAG_SCORER", "tfidf"), choices=SimpleVectorStore.SCORERS,
+                       help="Retrieval ranking function (default: $RAG_SCORER or tfidf)")
+    parser.add_argument("--retrieval", default=os.getenv("RAG_RETRIEVAL", "lexical"),
+                       choices=LocalChatbot.RETRIEVAL_MODES,
+                       help="Rank by term index, by Ollama embeddings, or by both fused "
+                            "(default: $RAG_RETRIEVAL or lexical)")
+    parser.add_argument("--embed-model", default=os.getenv("RAG_EMBED_MODEL", "nomic-embed-text"),
+                       help="Ollama embedding model for dense retrieval (default: $RAG_EMBED_MODEL "
+                            "or nomic-embed-text)")
 
     args = parser.parse_args()
 
     # Create and run chatbot
     use_rag = not args.no_rag
-    chatbot = LocalChatbot(model_name=args.model, ollama_host=args.host, use_rag=use_rag)
+    chatbot = LocalChatbot(model_name=args.model, ollama_host=args.host, use_rag=use_rag,
+                           index_path=args.index, corpus_paths=args.corpus or corpus_paths_from_env(),
+                           scorer=args.scorer, context_builder=context_builder_from_env(),
+                           keep_alive=os.getenv("OLLAMA_KEEP_ALIVE", "30m"), retrieval=args.retrieval,
+                           embed_model=args.embed_model, embedding_cache_path=os.getenv("RAG_EMBED_CACHE"),
+                           retrieval_timeout=float(os.getenv("RAG_RETRIEVAL_TIMEOUT", "0.5")))
     chatbot.run()
 
 
@@ -2,9 +2,13 @@
 """Demo script showcasing the simple vector store used by the chatbot."""
 
 import argparse
+import os
+from typing import List, Optional
+
 from rich.console import Console
 from rich.table import Table
 
+from ingest import corpus_fingerprint, index_is_current, ingest
 from vector_store import SimpleVectorStore
 
 console = Console()
@@ -38,34 +42,45 @@ CONVERSATION_DOCS = [
 ]
 
 
-def build_store() -> SimpleVectorStore:
-    store = SimpleVectorStore()
-    store.add_documents(CONVERSATION_DOCS)
+def build_store(index_path: Optional[str] = None, corpus: Optional[List[str]] = None,
+                scorer: str = "tfidf") -> SimpleVectorStore:
+    if index_path and index_is_current(index_path, corpus):
+        return SimpleVectorStore.open(index_path, scorer=scorer)
+    if index_path and os.path.exists(index_path):
+        console.print(f"[yellow]{index_path} was built from a different corpus; rebuilding it[/yellow]")
+    store = SimpleVectorStore(scorer=scorer)
+    if corpus:
+        ingest(store, corpus)
+    else:
+        store.add_documents(CONVERSATION_DOCS)
+    if index_path:
+        store.save(index_path, corpus_fingerprint(corpus) if corpus else None)
     return store
 
 
-def render_results(query: str, top_k: int) -> None:
-    store = build_store()
-    results = store.search(query, top_k=top_k)
-
-    console.print(f"\n[bold cyan]Query:[/bold cyan] [yellow]{query}[/yellow]\n")
-    if not results:
-        console.print("[red]No results found[/red]")
-        return
+def render_results(queries: List[str], top_k: int, index_path: Optional[str] = None,
+                   corpus: Optional[List[str]] = None, scorer: str = "tfidf") -> None:
+    store = build_store(index_path, corpus, scorer)
+    for query, results in zip(queries, store.search_many(queries, top_k=top_k)):
+        console.print(f"\n[bold cyan]Query:[/bold cyan] [yellow]{query}[/yellow]\n")
+        if not results:
+            console.print("[red]No results found[/red]")
+            continue
 
-    table = Table(show_header=True, header_style="bold magenta")
-    table.add_column("Rank", style="dim", width=6, justify="center")
-    table.add_column("Score", width=8)
-    table.add_column("Message", style="green")
+        table = Table(show_header=True, header_style="bold magenta")
+        table.add_column("Rank", style="dim", width=6, justify="center")
+        table.add_column("Score", width=8)
+        table.add_column("Message", style="green")
 
-    for idx, result in enumerate(results, start=1):
-        table.add_row(str(idx), f"{result.score:.3f}", result.text)
+        for idx, result in enumerate(results, start=1):
+            table.add_row(str(idx), f"{result.score:.3f}", result.text)
 
-    console.print(table)
+        console.print(table)
 
 
-def interactive_mode(top_k: int) -> None:
-    store = build_store()
+def interactive_mode(top_k: int, index_path: Optional[str] = None,
+                     corpus: Optional[List[str]] = None, scorer: str = "tfidf") -> None:
+    store = build_store(index_path, corpus, scorer)
     console.print("[bold green]Interactive Mode - Release Dashboard Conversation Search[/bold green]")
     console.print("[dim]Enter queries to search the conversation. Type 'quit' to exit.[/dim]\n")
 
@@ -102,16 +117,31 @@ def main() -> None:
     parser = argparse.ArgumentParser(
         description="Search the Release Dashboard conversation using the lightweight vector store",
     )
-    parser.add_argument("-q", "--query", type=str, help="Query text to search for")
+    parser.add_argument(
+        "-q", "--query", type=str, action="append",
+        help="Query text to search for (repeat to run several queries in one batch)",
+    )
     parser.add_argument("-n", "--results", type=int, default=3, help="Number of results to return")
     parser.add_argument("-i", "--interactive", action="store_true", help="Run in interactive mode")
+    parser.add_argument(
+        "--index", type=str, default=os.getenv("RAG_INDEX_PATH"),
+        help="Index file to memory-map (built from the demo corpus if missing)",
+    )
+    parser.add_argument(
+        "--corpus", action="append",
+        help="Chat export file or directory to search instead of the demo conversation (repeatable)",
+    )
+    parser.add_argument(
+        "--scorer", default=os.getenv("RAG_SCORER", "tfidf"), choices=SimpleVectorStore.SCORERS,
+        help="Ranking function (default: $RAG_SCORER or tfidf)",
+    )
     args = parser.parse_args()
 
     if args.interactive or (not args.query):
-        interactive_mode(args.results)
+        interactive_mode(args.results, args.index, args.corpus, args.scorer)
         return
 
-    render_results(args.query, args.results)
+    render_results(args.query, args.results, args.index, args.corpus, args.scorer)
 
 
 if __name__ == "__main__":
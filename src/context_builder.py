@@ -0,0 +1,173 @@
+"""Token-budgeted prompt assembly for RAG turns.
+
+Retrieved messages can be long (dashboard links alone run to hundreds of
+characters), and every token in the prompt is evaluated by the model on
+every turn. :class:`ContextBuilder` fits the retrieved context and the
+conversation history into fixed token budgets, and orders the prompt so
+that everything before the new question stays byte-identical from one turn
+to the next. Ollama reuses its cached evaluation of an unchanged prompt
+prefix while the model stays loaded (``keep_alive``), so only the new turn
+has to be evaluated.
+"""
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Sequence, Set
+
+from facets import split_message
+
+_WORD_PATTERN = re.compile(r"[\w']+")
+_URL_PATTERN = re.compile(r"https?://\S+")
+_SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+# Rough tokens-per-character ratio of Llama-family tokenizers on English chat text
+CHARS_PER_TOKEN = 4
+
+SYSTEM_PROMPT = (
+    "You are an assistant for the Release Dashboard team. Questions may come with context "
+    "retrieved from previous team conversations. Answer from that context when it is relevant; "
+    "if it does not contain the answer, say so and answer from general knowledge."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of ``text`` without loading a tokenizer."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def shorten_urls(text: str, max_length: int = 80) -> str:
+    """Cut URLs longer than ``max_length`` characters, keeping host, path and leading query."""
+    def shorten(match: "re.Match[str]") -> str:
+        url = match.group(0)
+        return url if len(url) <= max_length else url[:max_length] + "…"
+    return _URL_PATTERN.sub(shorten, text)
+
+
+def _words(text: str) -> Set[str]:
+    return {word.lower() for word in _WORD_PATTERN.findall(text)}
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit - 1)
+    return text[:cut if cut > limit // 2 else limit - 1].rstrip() + "…"
+
+
+def summarize(text: str, query: str, max_tokens: int) -> str:
+    """Shorten a message to ``max_tokens`` by keeping the sentences that share most words with ``query``.
+
+    The ``Speaker, timestamp:`` prefix is always kept and the chosen
+    sentences stay in their original order.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    speaker, timestamp, body = split_message(text)
+    prefix = ""
+    if speaker:
+        prefix = f"{speaker}, {timestamp}: " if timestamp else f"{speaker}: "
+    budget = max_tokens - estimate_tokens(prefix)
+    sentences = [sentence for sentence in _SENTENCE_PATTERN.split(body) if sentence]
+    query_words = _words(query)
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda index: (-len(query_words & _words(sentences[index])), index),
+    )
+    chosen = []
+    used = 0
+    for index in ranked:
+        cost = estimate_tokens(sentences[index]) + 1
+        if used + cost <= budget:
+            chosen.append(index)
+            used += cost
+    if not chosen:
+        # Not even the best sentence fits; cut it down instead
+        return prefix + _truncate(sentences[ranked[0]], budget)
+    kept = " ".join(sentences[index] for index in sorted(chosen))
+    if len(chosen) < len(sentences):
+        kept += " …"
+    return prefix + kept
+
+
+class ContextBuilder:
+    """Builds chat messages for a turn within token budgets.
+
+    The prompt is ``[system prompt, *history, context + question]``. The
+    system prompt and history form a prefix that only changes when an
+    exchange is appended or history is trimmed, so the model's cached
+    evaluation of it carries over between turns.
+
+    Retrieved results are taken in rank order: URLs are shortened, messages
+    longer than ``snippet_tokens`` are reduced to the sentences most related
+    to the question, results whose words overlap an earlier one by at least
+    ``duplicate_threshold`` (Jaccard) are dropped, and results stop once
+    ``context_tokens`` is spent. When history exceeds ``history_tokens``,
+    the oldest exchanges are dropped ``history_drop`` at a time rather than
+    one per turn, which keeps the prefix stable between drops.
+    """
+
+    def __init__(self, context_tokens: int = 600, snippet_tokens: int = 200,
+                 history_tokens: int = 1500, history_drop: int = 3,
+                 duplicate_threshold: float = 0.8, max_url_length: int = 80,
+                 system_prompt: str = SYSTEM_PROMPT) -> None:
+        self.context_tokens = context_tokens
+        self.snippet_tokens = snippet_tokens
+        self.history_tokens = history_tokens
+        self.history_drop = history_drop
+        self.duplicate_threshold = duplicate_threshold
+        self.max_url_length = max_url_length
+        self.system_prompt = system_prompt
+
+    def select_snippets(self, query: str, texts: Sequence[str]) -> List[str]:
+        """Compress, de-duplicate and budget retrieved texts, best first."""
+        snippets: List[str] = []
+        seen: List[Set[str]] = []
+        remaining = self.context_tokens
+        for text in texts:
+            words = _words(text)
+            if any(len(words & other) >= self.duplicate_threshold * len(words | other) for other in seen):
+                continue
+            snippet = summarize(shorten_urls(text, self.max_url_length), query,
+                                min(self.snippet_tokens, remaining))
+            cost = estimate_tokens(snippet) + 1
+            if cost > remaining:
+                break
+            snippets.append(snippet)
+            seen.append(words)
+            remaining -= cost
+            if remaining < 16:
+                break
+        return snippets
+
+    def format_context(self, snippets: Sequence[str]) -> str:
+        if not snippets:
+            return ""
+        return "Relevant context from previous conversations:\n" + "\n".join(f"- {s}" for s in snippets)
+
+    def trim_history(self, history: Sequence[Dict[str, str]]) -> List[Dict[str, str]]:
+        """The most recent history that fits ``history_tokens``, cut at exchange boundaries."""
+        start = 0
+        step = max(1, self.history_drop) * 2
+        sizes = [estimate_tokens(message.get("content", "")) for message in history]
+        while start < len(history) and sum(sizes[start:]) > self.history_tokens:
+            start = min(start + step, len(history))
+        return list(history[start:])
+
+    def build(self, user_message: str, history: Sequence[Dict[str, str]],
+              texts: Sequence[str] = ()) -> List[Dict[str, str]]:
+        """Chat messages for ``user_message`` given history and retrieved texts."""
+        context = self.format_context(self.select_snippets(user_message, texts))
+        content = f"{context}\n\nQuestion: {user_message}" if context else user_message
+        messages = [{"role": "system", "content": self.system_prompt}] if self.system_prompt else []
+        messages.extend(self.trim_history(history))
+        messages.append({"role": "user", "content": content})
+        return messages
+
+    @staticmethod
+    def prompt_tokens(messages: Sequence[Dict[str, str]]) -> int:
+        """Estimated prompt size of ``messages``."""
+        return sum(estimate_tokens(message.get("content", "")) for message in messages)
+
+
+__all__ = ["ContextBuilder", "estimate_tokens", "shorten_urls", "summarize"]
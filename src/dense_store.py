@@ -0,0 +1,407 @@
+"""Dense-embedding retrieval: unit vectors in a float32 matrix, searched through an IVF index."""
+from __future__ import annotations
+
+import math
+import threading
+from array import array
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from facets import FacetIndex, FilterLike, as_filter
+from segments import _tokenize
+from vector_store import SearchResult
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+
+def _normalize(vectors: "np.ndarray") -> "np.ndarray":
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class _IvfState(NamedTuple):
+    """One published version of an :class:`IvfIndex`.
+
+    Rows of ``vectors`` below ``count`` are final. The matrix may have spare
+    rows that a later version fills in, so readers never look past ``count``.
+    """
+
+    count: int
+    vectors: "np.ndarray"
+    centroids: Optional["np.ndarray"]
+    lists: Tuple["np.ndarray", ...]
+
+
+class IvfIndex:
+    """Inverted-file index for maximum inner product search over unit vectors.
+
+    Vectors are rows of one contiguous float32 matrix, grown by doubling.
+    Below ``exhaustive_below`` rows, queries are scored against all of them.
+    From then on the rows are clustered by spherical k-means into about
+    sqrt(n) lists, and a query scores only the rows of its ``nprobe``
+    nearest lists, so it touches O(sqrt(n)) vectors rather than n. New rows
+    join the list of their nearest centroid. The clustering is redone each
+    time the index has grown fourfold since it was last trained, which keeps
+    the lists balanced at O(sqrt(n)) amortised cost per added row.
+
+    ``add`` builds each new version off to the side and publishes it with
+    one assignment, so searches may run while a single writer adds rows.
+    """
+
+    TRAINING_SAMPLE = 64  # sampled rows per list for k-means
+    TRAINING_ITERATIONS = 10
+
+    def __init__(self, nprobe: int = 16, exhaustive_below: int = 4096, seed: int = 0) -> None:
+        if np is None:
+            raise RuntimeError("IvfIndex requires NumPy (pip install numpy)")
+        self.nprobe = nprobe
+        self.exhaustive_below = exhaustive_below
+        self.seed = seed
+        self._state = _IvfState(0, np.zeros((0, 0), dtype=np.float32), None, ())
+        self._trained_at = 0
+
+    def __len__(self) -> int:
+        return self._state.count
+
+    @property
+    def dimension(self) -> int:
+        return self._state.vectors.shape[1]
+
+    @property
+    def list_count(self) -> int:
+        """Number of inverted lists; 0 while queries are answered exhaustively."""
+        return len(self._state.lists)
+
+    def add(self, vectors: "np.ndarray") -> None:
+        """Append ``vectors`` as the next rows; they are normalised to unit length."""
+        vectors = _normalize(vectors)
+        state = self._state
+        if not len(vectors):
+            return
+        matrix = state.vectors
+        if state.count and vectors.shape[1] != matrix.shape[1]:
+            raise ValueError(f"Expected {matrix.shape[1]}-dimensional vectors, got {vectors.shape[1]}")
+        count = state.count + len(vectors)
+        if count > len(matrix):
+            grown = np.empty((max(count, 2 * len(matrix), 256), vectors.shape[1]), dtype=np.float32)
+            if state.count:
+                grown[:state.count] = matrix[:state.count]
+            matrix = grown
+        matrix[state.count:count] = vectors
+
+        if count < self.exhaustive_below:
+            centroids, lists = None, ()
+        elif state.centroids is None or count >= 4 * self._trained_at:
+            centroids = self._train(matrix[:count])
+            lists = self._group(self._assign(centroids, matrix[:count]), 0, len(centroids))
+            self._trained_at = count
+        else:
+            centroids = state.centroids
+            added = self._group(self._assign(centroids, vectors), state.count, len(centroids))
+            lists = tuple(
+                np.concatenate((old, new)) if len(new) else old for old, new in zip(state.lists, added)
+            )
+        self._state = _IvfState(count, matrix, centroids, lists)
+
+    def _train(self, vectors: "np.ndarray") -> "np.ndarray":
+        """Spherical k-means centroids for about sqrt(n) lists."""
+        rng = np.random.default_rng(self.seed)
+        n_lists = max(1, int(math.sqrt(len(vectors))))
+        sample_size = min(len(vectors), n_lists * self.TRAINING_SAMPLE)
+        sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+        for _ in range(self.TRAINING_ITERATIONS):
+            assignment = self._assign(centroids, sample)
+            order = np.argsort(assignment, kind="stable")
+            sizes = np.bincount(assignment, minlength=n_lists)
+            filled = np.flatnonzero(sizes)
+            starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))[filled]
+            # Empty lists keep their previous centroid
+            centroids[filled] = _normalize(np.add.reduceat(sample[order], starts, axis=0))
+        return centroids
+
+    @staticmethod
+    def _assign(centroids: "np.ndarray", vectors: "np.ndarray", chunk: int = 4096) -> "np.ndarray":
+        """Index of the nearest centroid of each vector."""
+        return np.concatenate([
+            np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+            for start in range(0, len(vectors), chunk)
+        ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+    @staticmethod
+    def _group(assignment: "np.ndarray", first_row: int, n_lists: int) -> Tuple["np.ndarray", ...]:
+        """Ascending row ids of each list, for rows numbered from ``first_row``."""
+        order = np.argsort(assignment, kind="stable").astype(np.int32) + first_row
+        bounds = np.cumsum(np.bincount(assignment, minlength=n_lists))[:-1]
+        return tuple(np.split(order, bounds))
+
+    def search(self, queries: "np.ndarray", top_k: int,
+               allowed: Optional[Sequence[int]] = None) -> List[Tuple["np.ndarray", "np.ndarray"]]:
+        """``(rows, scores)`` of the ``top_k`` best inner products for each query.
+
+        ``allowed`` restricts the search to those rows. When they are fewer
+        than the rows the probed lists would hold, they are scored
+        exhaustively, as are all rows when the probed lists come up short.
+        """
+        state = self._state
+        count = state.count
+        queries = _normalize(queries)
+        if not count or top_k <= 0:
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in queries]
+        vectors = state.vectors[:count]
+        mask = None
+        if allowed is not None:
+            allowed = np.asarray(allowed, dtype=np.int64)
+            allowed = allowed[allowed < count]
+            mask = np.zeros(count, dtype=bool)
+            mask[allowed] = True
+
+        n_lists = len(state.lists)
+        probes = min(self.nprobe, n_lists)
+        if not n_lists or (allowed is not None and len(allowed) <= count * probes / n_lists):
+            rows = allowed if allowed is not None else None
+            candidates = vectors if rows is None else vectors[rows]
+            scores = queries @ candidates.T
+            return [self._top(rows, row_scores, top_k) for row_scores in scores]
+
+        results = []
+        nearest = np.argpartition(-(queries @ state.centroids.T), probes - 1, axis=1)[:, :probes]
+        for query, lists in zip(queries, nearest):
+            rows = np.concatenate([state.lists[position] for position in lists])
+            if mask is not None:
+                rows = rows[mask[rows]]
+            if len(rows) < top_k:
+                # Too few rows near the query: fall back to every allowed row
+                rows = allowed if allowed is not None else None
+                candidates = vectors if rows is None else vectors[rows]
+                results.append(self._top(rows, candidates @ query, top_k))
+                continue
+            results.append(self._top(rows, vectors[rows] @ query, top_k))
+        return results
+
+    @staticmethod
+    def _top(rows: Optional["np.ndarray"], scores: "np.ndarray",
+             top_k: int) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Best ``top_k`` of ``scores`` (for ``rows``, or rows 0..n-1 if None), ties by row."""
+        if rows is None:
+            rows = np.arange(len(scores))
+        if len(scores) > top_k:
+            kept = np.argpartition(-scores, top_k - 1)[:top_k]
+            rows, scores = rows[kept], scores[kept]
+        order = np.lexsort((rows, -scores))
+        return rows[order], scores[order]
+
+    def vectors(self, rows: "np.ndarray") -> "np.ndarray":
+        """Copy of the unit vectors of ``rows``."""
+        state = self._state
+        return state.vectors[:state.count][rows]
+
+    def memory_usage(self) -> int:
+        state = self._state
+        lists = sum(ids.nbytes for ids in state.lists)
+        return state.vectors.nbytes + (state.centroids.nbytes if state.centroids is not None else 0) + lists
+
+
+class _DenseView(NamedTuple):
+    """Rows searchable together: an :class:`IvfIndex` and, by row, what they hold.
+
+    ``row_ids`` gives each row's doc id and ``dead`` flags rows deleted
+    since the index was last rebuilt. ``live`` holds the live rows while
+    there are dead ones (None otherwise), for searches to restrict to.
+    """
+
+    index: IvfIndex
+    documents: List[str]
+    row_ids: array
+    dead: bytearray
+    dead_rows: int
+    live: Optional["np.ndarray"]
+    facets: FacetIndex
+
+
+class DenseVectorStore:
+    """Messages ranked by cosine similarity between their embeddings and the query's.
+
+    Embeddings come from ``embedder`` (see ``embeddings.OllamaEmbedder``),
+    so paraphrases match even when they share no words with the message.
+    Documents without a single word are skipped, as in ``SimpleVectorStore``.
+
+    Documents are numbered like ``SimpleVectorStore`` numbers them, unless
+    ``add_documents`` is given their ``doc_ids``; a store kept in step with
+    a lexical one passes the ids the lexical store returned, so both agree
+    through deletes and updates. ``delete`` tombstones a row and ``update``
+    tombstones it and adds the new text under the same id. Once more than
+    ``compact_ratio`` of the rows are tombstoned, the live vectors are
+    indexed again without them.
+
+    Searches use the index version current when they start and take no
+    lock; writes are serialised.
+    """
+
+    def __init__(self, embedder, nprobe: int = 16, exhaustive_below: int = 4096,
+                 compact_ratio: float = 0.25) -> None:
+        self.embedder = embedder
+        self.nprobe = nprobe
+        self.exhaustive_below = exhaustive_below
+        self.compact_ratio = compact_ratio
+        self._view = _DenseView(self._new_index(), [], array("q"), bytearray(), 0, None, FacetIndex())
+        # Doc id -> row of its live version
+        self._rows: Dict[int, int] = {}
+        self._next_id = 0
+        self._facet_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def _new_index(self) -> IvfIndex:
+        return IvfIndex(nprobe=self.nprobe, exhaustive_below=self.exhaustive_below)
+
+    @property
+    def index(self) -> IvfIndex:
+        return self._view.index
+
+    @property
+    def documents(self) -> Sequence[str]:
+        """Texts of the live documents, in order."""
+        view = self._view
+        count = len(view.index)
+        if not view.dead_rows:
+            return view.documents[:count]
+        return [doc for doc, dead in zip(view.documents[:count], view.dead) if not dead]
+
+    @property
+    def document_count(self) -> int:
+        view = self._view
+        return len(view.index) - view.dead_rows
+
+    def add_documents(self, docs: Iterable[str], batch_size: int = 1024,
+                      doc_ids: Optional[Sequence[Optional[int]]] = None) -> List[Optional[int]]:
+        """Embed and index ``docs``; returns their ids (None for documents without words).
+
+        ``doc_ids`` numbers the documents instead; documents whose id is None
+        are skipped. Raises ``ValueError`` for an id that is already indexed.
+        """
+        docs = list(docs)
+        if doc_ids is not None and len(doc_ids) != len(docs):
+            raise ValueError(f"Got {len(doc_ids)} doc ids for {len(docs)} documents")
+        assigned: List[Optional[int]] = []
+        with self._write_lock:
+            for start in range(0, len(docs), batch_size):
+                kept: List[Tuple[str, int]] = []
+                batch_ids = set()
+                for position in range(start, min(start + batch_size, len(docs))):
+                    doc = docs[position]
+                    doc_id = self._next_id + len(kept) if doc_ids is None else doc_ids[position]
+                    if doc_id is None or not _tokenize(doc):
+                        assigned.append(None)
+                        continue
+                    if doc_id in self._rows or doc_id in batch_ids:
+                        raise ValueError(f"Document id {doc_id} is already indexed")
+                    batch_ids.add(doc_id)
+                    kept.append((doc, doc_id))
+                    assigned.append(doc_id)
+                if kept:
+                    self._append(kept, self.embedder.embed([doc for doc, _ in kept]))
+        return assigned
+
+    def delete(self, doc_id: int) -> None:
+        """Remove document ``doc_id``; raises KeyError if there is none."""
+        with self._write_lock:
+            self._tombstone(doc_id)
+            self._compact_if_needed()
+
+    def update(self, doc_id: int, text: str) -> None:
+        """Replace the text of document ``doc_id``, keeping its id.
+
+        Text without words cannot be embedded, so it deletes the document.
+        """
+        with self._write_lock:
+            if doc_id not in self._rows:
+                raise KeyError(f"No document with id {doc_id}")
+            vectors = self.embedder.embed([text]) if _tokenize(text) else None
+            self._tombstone(doc_id)
+            if vectors is not None:
+                self._append([(text, doc_id)], vectors)
+            self._compact_if_needed()
+
+    def _append(self, kept: List[Tuple[str, int]], vectors: "np.ndarray") -> None:
+        view = self._view
+        first_row = len(view.index)
+        # The texts are in place before the index version that makes them searchable
+        for row, (doc, doc_id) in enumerate(kept, first_row):
+            view.documents.append(doc)
+            view.row_ids.append(doc_id)
+            view.dead.append(0)
+            self._rows[doc_id] = row
+            self._next_id = max(self._next_id, doc_id + 1)
+        view.index.add(vectors)
+        with self._facet_lock:
+            view.facets.update(view.documents)
+        if view.live is not None:
+            live = np.concatenate((view.live, np.arange(first_row, first_row + len(kept))))
+            self._view = view._replace(live=live)
+
+    def _tombstone(self, doc_id: int) -> None:
+        """Publish a view with the live row of ``doc_id`` flagged dead."""
+        row = self._rows.pop(doc_id, None)
+        if row is None:
+            raise KeyError(f"No document with id {doc_id}")
+        view = self._view
+        # Searches may still hold the old flags, so they are copied rather than changed
+        dead = bytearray(view.dead)
+        dead[row] = 1
+        live = np.flatnonzero(np.frombuffer(bytes(dead), dtype=np.uint8) == 0)
+        self._view = view._replace(dead=dead, dead_rows=view.dead_rows + 1, live=live)
+
+    def _compact_if_needed(self) -> None:
+        """Index the live rows again, without the tombstoned ones, past ``compact_ratio``."""
+        view = self._view
+        if view.dead_rows <= self.compact_ratio * len(view.index):
+            return
+        live = view.live
+        index = self._new_index()
+        index.add(view.index.vectors(live))
+        facets = FacetIndex()
+        facets.extend(view.facets, live.tolist())
+        row_ids = array("q", (view.row_ids[row] for row in live))
+        self._rows = {doc_id: row for row, doc_id in enumerate(row_ids)}
+        self._view = _DenseView(index, [view.documents[row] for row in live], row_ids,
+                                bytearray(len(row_ids)), 0, None, facets)
+
+    def search(self, query: str, top_k: int = 3, filters: FilterLike = None) -> List[SearchResult]:
+        return self.search_many([query], top_k=top_k, filters=filters)[0]
+
+    def search_many(self, queries: Sequence[str], top_k: int = 3,
+                    filters: FilterLike = None) -> List[List[SearchResult]]:
+        """Best ``top_k`` documents for each query, embedding the queries in one batch."""
+        view = self._view
+        results: List[List[SearchResult]] = [[] for _ in queries]
+        asked = [position for position, query in enumerate(queries) if _tokenize(query)]
+        if not asked or not len(view.index) - view.dead_rows:
+            return results
+        allowed = view.live
+        search_filter = as_filter(filters)
+        if search_filter is not None:
+            with self._facet_lock:
+                allowed = view.facets.select(search_filter)
+            if view.dead_rows:
+                allowed = [row for row in allowed if row < len(view.dead) and not view.dead[row]]
+            if not allowed:
+                return results
+        vectors = self.embedder.embed([queries[position] for position in asked])
+        documents, row_ids = view.documents, view.row_ids
+        for position, (rows, scores) in zip(asked, view.index.search(vectors, top_k, allowed)):
+            results[position] = [
+                SearchResult(documents[row], float(score), row_ids[row]) for row, score in zip(rows, scores)
+            ]
+        return results
+
+    def memory_usage(self) -> dict:
+        """Approximate bytes held by the index (document texts excluded)."""
+        vectors = self.index.memory_usage()
+        return {"vectors": vectors, "total": vectors}
+
+
+__all__ = ["DenseVectorStore", "IvfIndex"]
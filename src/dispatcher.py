@@ -0,0 +1,435 @@
+"""Fair, coalescing dispatch of generation requests to Ollama.
+
+A local model server slows down for everyone when it is handed more
+concurrent generations than it can run, and identical questions asked at
+the same moment are worth generating only once. :class:`FairScheduler`
+caps concurrent generations per model and hands out free slots round-robin
+across clients (browser sessions), so one client's burst cannot starve the
+others. :class:`Dispatcher` (threads) and :class:`AsyncDispatcher`
+(asyncio) add single-flight coalescing on top of it: a request identical
+to one already in flight waits for, or streams along with, that request
+instead of starting another generation.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import (Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterable, Iterator, List,
+                    Optional)
+
+from ollama_client import OllamaBusyError
+
+# Recent queue waits kept per model for the percentiles in ``stats()``
+WAIT_SAMPLES = 1024
+
+
+def request_key(payload: Dict[str, Any]) -> str:
+    """Key under which identical chat requests coalesce; streaming and non-streaming calls share it."""
+    canonical = {key: value for key, value in payload.items() if key != "stream"}
+    return hashlib.sha1(json.dumps(canonical, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class _Ticket:
+    __slots__ = ("model", "client_id", "grant", "enqueued", "granted")
+
+    def __init__(self, model: str, client_id: str, grant: Callable[[], None]) -> None:
+        self.model = model
+        self.client_id = client_id
+        self.grant = grant
+        self.enqueued = time.monotonic()
+        self.granted = False
+
+
+class _ModelQueue:
+    __slots__ = ("active", "waiting", "clients", "granted", "coalesced", "rejected", "timed_out", "waits")
+
+    def __init__(self) -> None:
+        self.active = 0
+        self.waiting = 0
+        # client id -> its waiting tickets; the first client is served next
+        self.clients: "OrderedDict[str, Deque[_Ticket]]" = OrderedDict()
+        self.granted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+
+
+class FairScheduler:
+    """Per-model generation slots, granted round-robin across clients.
+
+    At most ``limit`` generations per model run at once. Further requests
+    wait in one FIFO queue per client; when a slot frees up, the client at
+    the front of the rotation gets it and moves to the back. Once
+    ``max_queue`` requests are waiting for a model, new ones fail fast with
+    :class:`OllamaBusyError`. ``on_wait(model, seconds)`` is called with
+    every granted request's queue wait.
+    """
+
+    def __init__(self, limit: int = 2, max_queue: int = 256,
+                 on_wait: Optional[Callable[[str, float], None]] = None) -> None:
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        self.limit = limit
+        self.max_queue = max_queue
+        self.on_wait = on_wait
+        self._models: Dict[str, _ModelQueue] = {}
+        self._lock = threading.Lock()
+
+    def request(self, model: str, client_id: str, grant: Callable[[], None]) -> _Ticket:
+        """Queue for a slot; ``grant`` is called (possibly right away) once it is assigned."""
+        ticket = _Ticket(model, client_id, grant)
+        with self._lock:
+            queue = self._models.setdefault(model, _ModelQueue())
+            if queue.waiting >= self.max_queue:
+                queue.rejected += 1
+                raise OllamaBusyError(f"{queue.waiting} requests already waiting for {model}")
+            queue.clients.setdefault(client_id, deque()).append(ticket)
+            queue.waiting += 1
+            granted = self._grant_next(queue)
+        self._notify(granted)
+        return ticket
+
+    def release(self, model: str) -> None:
+        """Free a slot taken by a granted request."""
+        with self._lock:
+            queue = self._models[model]
+            queue.active -= 1
+            granted = self._grant_next(queue)
+        self._notify(granted)
+
+    def cancel(self, ticket: _Ticket, timed_out: bool = False) -> bool:
+        """Withdraw a waiting request; returns False if it was granted meanwhile."""
+        with self._lock:
+            if ticket.granted:
+                return False
+            queue = self._models[ticket.model]
+            if timed_out:
+                queue.timed_out += 1
+            tickets = queue.clients.get(ticket.client_id)
+            if tickets is not None and ticket in tickets:
+                tickets.remove(ticket)
+                if not tickets:
+                    del queue.clients[ticket.client_id]
+                queue.waiting -= 1
+            return True
+
+    def record_coalesced(self, model: str) -> None:
+        with self._lock:
+            self._models.setdefault(model, _ModelQueue()).coalesced += 1
+
+    def _grant_next(self, queue: _ModelQueue) -> List[_Ticket]:
+        granted = []
+        now = time.monotonic()
+        while queue.active < self.limit and queue.clients:
+            client_id, tickets = queue.clients.popitem(last=False)
+            ticket = tickets.popleft()
+            if tickets:
+                queue.clients[client_id] = tickets
+            queue.waiting -= 1
+            queue.active += 1
+            queue.granted += 1
+            queue.waits.append(now - ticket.enqueued)
+            ticket.granted = True
+            granted.append(ticket)
+        return granted
+
+    def _notify(self, tickets: Iterable[_Ticket]) -> None:
+        for ticket in tickets:
+            if self.on_wait is not None:
+                self.on_wait(ticket.model, time.monotonic() - ticket.enqueued)
+            ticket.grant()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-model active and waiting counts, totals and recent queue wait percentiles."""
+        with self._lock:
+            snapshot = {model: (queue.active, queue.waiting, len(queue.clients), queue.granted,
+                                queue.coalesced, queue.rejected, queue.timed_out, sorted(queue.waits))
+                        for model, queue in self._models.items()}
+        stats = {}
+        for model, (active, waiting, clients, granted, coalesced, rejected, timed_out,
+                    waits) in snapshot.items():
+            stats[model] = {
+                "limit": self.limit,
+                "active": active,
+                "waiting": waiting,
+                "waiting_clients": clients,
+                "granted": granted,
+                "coalesced": coalesced,
+                "rejected": rejected,
+                "timed_out": timed_out,
+                "wait_p50_ms": _percentile(waits, 50) * 1000,
+                "wait_p95_ms": _percentile(waits, 95) * 1000,
+                "wait_max_ms": (waits[-1] if waits else 0.0) * 1000,
+            }
+        return stats
+
+    def depth(self) -> int:
+        """Requests waiting across all models."""
+        with self._lock:
+            return sum(queue.waiting for queue in self._models.values())
+
+    def active(self) -> int:
+        """Generations running across all models."""
+        with self._lock:
+            return sum(queue.active for queue in self._models.values())
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class _Flight:
+    """Output of one in-flight request, replayed to every caller that joined it."""
+
+    def __init__(self) -> None:
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.cond = threading.Condition()
+
+    def publish(self, chunk: Any) -> None:
+        with self.cond:
+            self.chunks.append(chunk)
+            self.cond.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        with self.cond:
+            self.error = error
+            self.done = True
+            self.cond.notify_all()
+
+    def follow(self) -> Iterator[Any]:
+        position = 0
+        while True:
+            with self.cond:
+                while position == len(self.chunks) and not self.done:
+                    self.cond.wait()
+                chunks = self.chunks[position:]
+                done, error = self.done, self.error
+            position += len(chunks)
+            yield from chunks
+            if done and position == len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class Dispatcher:
+    """Thread-based dispatcher used by the Flask server.
+
+    ``call`` runs ``fn`` for a non-streaming request, and ``stream`` iterates
+    ``fn()`` for a streaming one, each within a model slot from
+    ``scheduler``. With ``coalesce``, a request whose ``key`` matches one in
+    flight gets that request's result or chunks (from the first chunk)
+    instead. A streaming generation runs in its own thread, so it completes
+    for the other callers even if the first one disconnects. ``max_wait``
+    bounds the time spent queueing for a slot.
+    """
+
+    def __init__(self, scheduler: FairScheduler, coalesce: bool = True,
+                 max_wait: Optional[float] = None) -> None:
+        self.scheduler = scheduler
+        self.coalesce = coalesce
+        self.max_wait = max_wait
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, model: str, key: str):
+        if not self.coalesce:
+            return _Flight(), True
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.scheduler.record_coalesced(model)
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            return flight, True
+
+    def _land(self, key: str, flight: _Flight, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(error)
+
+    @contextmanager
+    def slot(self, model: str, client_id: str = ""):
+        """Hold one of ``model``'s generation slots for the duration of the block."""
+        granted = threading.Event()
+        ticket = self.scheduler.request(model, client_id, granted.set)
+        if not granted.wait(self.max_wait) and self.scheduler.cancel(ticket, timed_out=True):
+            raise OllamaBusyError(f"Timed out after {self.max_wait:g}s waiting for {model}")
+        try:
+            yield
+        finally:
+            self.scheduler.release(model)
+
+    def call(self, model: str, key: str, fn: Callable[[], Any], client_id: str = "") -> Any:
+        flight, leader = self._join(model, key)
+        if not leader:
+            return next(iter(flight.follow()))
+        try:
+            with self.slot(model, client_id):
+                result = fn()
+        except BaseException as exc:
+            self._land(key, flight, exc)
+            raise
+        flight.publish(result)
+        self._land(key, flight)
+        return result
+
+    def stream(self, model: str, key: str, fn: Callable[[], Iterable[Any]],
+               client_id: str = "") -> Iterator[Any]:
+        flight, leader = self._join(model, key)
+        if leader:
+            threading.Thread(target=self._produce, args=(model, key, fn, client_id, flight),
+                             name="ollama-stream", daemon=True).start()
+        return flight.follow()
+
+    def _produce(self, model: str, key: str, fn: Callable[[], Iterable[Any]], client_id: str,
+                 flight: _Flight) -> None:
+        try:
+            with self.slot(model, client_id):
+                for chunk in fn():
+                    flight.publish(chunk)
+        except BaseException as exc:
+            self._land(key, flight, exc)
+            return
+        self._land(key, flight)
+
+
+class _AsyncFlight:
+    def __init__(self) -> None:
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+
+    def publish(self, chunk: Any) -> None:
+        self.chunks.append(chunk)
+        self._wake()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.error = error
+        self.done = True
+        self._wake()
+
+    def _wake(self) -> None:
+        # Wake current followers; later waits use a fresh event
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[Any]:
+        position = 0
+        while True:
+            changed = self.changed
+            while position < len(self.chunks):
+                position += 1
+                yield self.chunks[position - 1]
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            if changed is self.changed:
+                await changed.wait()
+
+
+class AsyncDispatcher:
+    """asyncio counterpart of :class:`Dispatcher` for the ASGI server.
+
+    ``fn`` is a coroutine function for ``call`` and an async iterator
+    factory for ``stream``. Streaming generations run as tasks, so they
+    complete for joined callers even if the first caller disconnects.
+    """
+
+    def __init__(self, scheduler: FairScheduler, coalesce: bool = True,
+                 max_wait: Optional[float] = None) -> None:
+        self.scheduler = scheduler
+        self.coalesce = coalesce
+        self.max_wait = max_wait
+        self._flights: Dict[str, _AsyncFlight] = {}
+        self._tasks: set = set()
+
+    def _join(self, model: str, key: str):
+        if not self.coalesce:
+            return _AsyncFlight(), True
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.scheduler.record_coalesced(model)
+            return flight, False
+        flight = self._flights[key] = _AsyncFlight()
+        return flight, True
+
+    def _land(self, key: str, flight: _AsyncFlight, error: Optional[BaseException] = None) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        flight.finish(error)
+
+    async def _acquire(self, model: str, client_id: str) -> None:
+        granted = asyncio.get_running_loop().create_future()
+        ticket = self.scheduler.request(
+            model, client_id, lambda: granted.done() or granted.set_result(None))
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            timed_out = isinstance(exc, asyncio.TimeoutError)
+            if self.scheduler.cancel(ticket, timed_out):
+                if timed_out:
+                    raise OllamaBusyError(f"Timed out after {self.max_wait:g}s waiting for {model}") from None
+                raise
+            # Granted just as we gave up: hand the slot back
+            self.scheduler.release(model)
+            raise
+
+    async def call(self, model: str, key: str, fn: Callable[[], Awaitable[Any]],
+                   client_id: str = "") -> Any:
+        flight, leader = self._join(model, key)
+        if not leader:
+            async for result in flight.follow():
+                return result
+            raise RuntimeError("Coalesced request finished without a result")
+        try:
+            await self._acquire(model, client_id)
+            try:
+                result = await fn()
+            finally:
+                self.scheduler.release(model)
+        except BaseException as exc:
+            self._land(key, flight, exc)
+            raise
+        flight.publish(result)
+        self._land(key, flight)
+        return result
+
+    def stream(self, model: str, key: str, fn: Callable[[], AsyncIterator[Any]],
+               client_id: str = "") -> AsyncIterator[Any]:
+        flight, leader = self._join(model, key)
+        if leader:
+            task = asyncio.ensure_future(self._produce(model, key, fn, client_id, flight))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return flight.follow()
+
+    async def _produce(self, model: str, key: str, fn: Callable[[], AsyncIterator[Any]],
+                       client_id: str, flight: _AsyncFlight) -> None:
+        try:
+            await self._acquire(model, client_id)
+            try:
+                async for chunk in fn():
+                    flight.publish(chunk)
+            finally:
+                self.scheduler.release(model)
+        except BaseException as exc:
+            self._land(key, flight, exc)
+            return
+        self._land(key, flight)
+
+
+__all__ = ["AsyncDispatcher", "Dispatcher", "FairScheduler", "request_key"]
@@ -0,0 +1,128 @@
+"""Dense text embeddings from Ollama's ``/api/embed``, cached on disk."""
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from ollama_client import OllamaClient
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+
+def content_key(model: str, text: str) -> bytes:
+    """Cache key of ``text`` embedded by ``model``."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """SQLite file of embedding vectors keyed by model and content hash.
+
+    Vectors are stored as raw float32 bytes. Re-indexing the same messages,
+    or restarting the server, then costs a lookup per batch instead of a
+    call to the model. Editing a message changes its hash, so the stale
+    vector is simply never asked for again.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)")
+        self._db.commit()
+
+    def get_many(self, keys: Sequence[bytes]) -> Dict[bytes, bytes]:
+        """Stored float32 bytes for whichever of ``keys`` are cached."""
+        found: Dict[bytes, bytes] = {}
+        with self._lock:
+            # Stay well under SQLite's limit on bound parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                )
+                found.update(rows)
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, items: Dict[bytes, bytes]) -> None:
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", items.items())
+            self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class OllamaEmbedder:
+    """Embed texts with an Ollama embedding model, ``batch_size`` texts per request.
+
+    Texts already in ``cache`` are not sent; duplicates within a call are
+    sent once. Vectors come back as rows of a float32 matrix, in input order.
+    """
+
+    def __init__(self, client: OllamaClient, model: str = "nomic-embed-text", batch_size: int = 64,
+                 cache: Optional[EmbeddingCache] = None, timeout: float = 120.0) -> None:
+        if np is None:
+            raise RuntimeError("OllamaEmbedder requires NumPy (pip install numpy)")
+        self.client = client
+        self.model = model
+        self.batch_size = batch_size
+        self.cache = cache
+        self.timeout = timeout
+        self.dimension: Optional[int] = None
+        self.requests = 0
+
+    def embed(self, texts: Sequence[str]) -> "np.ndarray":
+        """Embedding of each text as one row of an ``(len(texts), dimension)`` float32 matrix."""
+        keys = [content_key(self.model, text) for text in texts]
+        known = self.cache.get_many(list(dict.fromkeys(keys))) if self.cache is not None and keys else {}
+        missing = {key: text for key, text in zip(keys, texts) if key not in known}
+
+        pending = list(missing.items())
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            vectors = self._request([text for _, text in batch])
+            fetched = {key: vector.tobytes() for (key, _), vector in zip(batch, vectors)}
+            if self.cache is not None:
+                self.cache.put_many(fetched)
+            known.update(fetched)
+
+        if not keys:
+            return np.zeros((0, self.dimension or 0), dtype=np.float32)
+        matrix = np.frombuffer(b"".join(known[key] for key in keys), dtype=np.float32)
+        matrix = matrix.reshape(len(keys), -1)
+        if self.dimension is None:
+            self.dimension = matrix.shape[1]
+        return matrix
+
+    def _request(self, texts: List[str]) -> "np.ndarray":
+        response = self.client.post("/api/embed", json={"model": self.model, "input": texts},
+                                    timeout=self.timeout)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code} - {response.text}")
+        self.requests += 1
+        vectors = np.asarray(response.json().get("embeddings", []), dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(texts):
+            raise RuntimeError(f"Expected {len(texts)} embeddings from {self.model}, got {len(vectors)}")
+        if self.dimension is None:
+            self.dimension = vectors.shape[1]
+        elif vectors.shape[1] != self.dimension:
+            raise RuntimeError(f"{self.model} returned {vectors.shape[1]}-dimensional embeddings, "
+                               f"expected {self.dimension}")
+        return vectors
+
+
+__all__ = ["EmbeddingCache", "OllamaEmbedder", "content_key"]
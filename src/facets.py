@@ -0,0 +1,310 @@
+"""Structured metadata and facet indexes for filtered retrieval.
+
+Chat messages carry their speaker and timestamp in a ``Speaker, Mon D, H:MM
+AM: text`` prefix and mention ticket ids (``PNC-55366``) and release numbers
+(``3.0.50.036``, "release 040") in free text. :class:`FacetIndex` extracts
+these once per document into sorted doc id arrays, so a :class:`SearchFilter`
+resolves to candidate documents before any scoring happens.
+
+Exports do not include the year, so timestamps are ordered within a year:
+the sort key is minutes since Jan 1, 00:00.
+"""
+from __future__ import annotations
+
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+# "Shilav Shinde, Sep 23, 12:24 PM: text" or "Sagar Naik: text"
+MESSAGE_PATTERN = re.compile(
+    r"^(?P<speaker>[^,:@\n]{1,80}?)"
+    r"(?:, (?P<timestamp>[A-Z][a-z]{2} \d{1,2}, \d{1,2}:\d{2} [AP]M))?"
+    r": (?P<body>.*)$",
+    re.DOTALL,
+)
+_DATE_PATTERN = re.compile(
+    r"^(?P<month>[A-Za-z]{3})[a-z]*\.? (?P<day>\d{1,2})"
+    r"(?:,? (?P<hour>\d{1,2}):(?P<minute>\d{2}) ?(?P<meridiem>[AaPp][Mm]))?$"
+)
+_TICKET_PATTERN = re.compile(r"\b[A-Z][A-Z0-9]{1,9}-\d+\b")
+_VERSION_PATTERN = re.compile(r"(?<![\w.])\d+(?:\.\d+){2,}(?![\w.]*\d)")
+_RELEASE_NUMBER_PATTERN = re.compile(r"\b(?:release|patch|hotfix)\s+(\d{1,3})(?!\w|\.\d)", re.IGNORECASE)
+
+MONTHS = {name: number for number, name in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), start=1)}
+MINUTES_PER_DAY = 24 * 60
+NO_TIMESTAMP = -1
+
+
+def split_message(text: str) -> Tuple[Optional[str], Optional[str], str]:
+    """Split a chat line into ``(speaker, timestamp, body)``; missing parts are None."""
+    text = text.strip()
+    match = MESSAGE_PATTERN.match(text)
+    if match is None:
+        return None, None, text
+    return match["speaker"].strip(), match["timestamp"], match["body"].strip()
+
+
+def _minutes(month: int, day: int, hour: int = 0, minute: int = 0) -> int:
+    return ((month - 1) * 31 + day - 1) * MINUTES_PER_DAY + hour * 60 + minute
+
+
+def parse_time_range(text: str) -> Tuple[int, int]:
+    """Parse ``Sep 20``, ``Sep 20, 3:05 PM`` or an ISO date into ``(first, last)`` minute keys.
+
+    A date alone covers the whole day; a date with a time covers one minute.
+    Raises ``ValueError`` for anything else.
+    """
+    text = text.strip()
+    match = _DATE_PATTERN.match(text)
+    if match is not None and match["month"].lower() in MONTHS:
+        month, day = MONTHS[match["month"].lower()], int(match["day"])
+        if not 1 <= day <= 31 or (match["hour"] is not None and (
+                not 1 <= int(match["hour"]) <= 12 or int(match["minute"]) > 59)):
+            raise ValueError(f"Invalid date {text!r}")
+        if match["hour"] is None:
+            start = _minutes(month, day)
+            return start, start + MINUTES_PER_DAY - 1
+        hour = int(match["hour"]) % 12 + (12 if match["meridiem"].lower() == "pm" else 0)
+        key = _minutes(month, day, hour, int(match["minute"]))
+        return key, key
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"Unrecognised date {text!r}; expected e.g. 'Sep 20' or 'Sep 20, 3:05 PM'") from None
+    if len(text) <= 10:
+        start = _minutes(parsed.month, parsed.day)
+        return start, start + MINUTES_PER_DAY - 1
+    key = _minutes(parsed.month, parsed.day, parsed.hour, parsed.minute)
+    return key, key
+
+
+def timestamp_key(timestamp: Optional[str]) -> int:
+    """Sort key of a message timestamp, or ``NO_TIMESTAMP``."""
+    if not timestamp:
+        return NO_TIMESTAMP
+    try:
+        return parse_time_range(timestamp)[0]
+    except ValueError:
+        return NO_TIMESTAMP
+
+
+def normalize_mention(value: str) -> str:
+    """Canonical form of a ticket id or release number used as a filter value."""
+    value = value.strip()
+    if value.isdigit():
+        return str(int(value))
+    return value.upper()
+
+
+def extract_mentions(text: str) -> List[str]:
+    """Ticket ids and release keys mentioned in ``text``, without duplicates.
+
+    A version such as ``3.0.50.035.001`` is indexed under itself, each
+    dotted prefix of at least three parts and its release number (``35``),
+    so a filter on ``3.0.50.035`` or ``035`` matches its hotfixes too.
+    """
+    keys: Dict[str, None] = {}
+    for ticket in _TICKET_PATTERN.findall(text):
+        keys[ticket.upper()] = None
+    for version in _VERSION_PATTERN.findall(text):
+        parts = version.split(".")
+        for end in range(3, len(parts) + 1):
+            keys[".".join(parts[:end])] = None
+        if len(parts) >= 4:
+            keys[str(int(parts[3]))] = None
+    for number in _RELEASE_NUMBER_PATTERN.findall(text):
+        keys[str(int(number))] = None
+    return list(keys)
+
+
+@dataclass
+class DocumentMetadata:
+    speaker: Optional[str] = None
+    timestamp: Optional[str] = None
+    mentions: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_text(cls, text: str) -> "DocumentMetadata":
+        speaker, timestamp, _ = split_message(text)
+        return cls(speaker=speaker, timestamp=timestamp, mentions=extract_mentions(text))
+
+
+@dataclass
+class SearchFilter:
+    """Restricts a search to documents matching every given field.
+
+    ``speaker`` matches a full name or any part of it, case-insensitively.
+    ``after`` and ``before`` are exclusive bounds such as ``"Sep 20"`` (the
+    whole day) or ``"Sep 20, 3:05 PM"``; messages without a timestamp never
+    match a time bound. Every ticket id or release number in ``mentions``
+    must be mentioned.
+    """
+
+    speaker: Optional[str] = None
+    after: Optional[str] = None
+    before: Optional[str] = None
+    mentions: Sequence[str] = ()
+
+    def __post_init__(self) -> None:
+        # Validate bounds eagerly so bad input fails before any search runs
+        for bound in (self.after, self.before):
+            if bound is not None:
+                parse_time_range(bound)
+        if isinstance(self.mentions, str):
+            self.mentions = (self.mentions,)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.speaker or self.after or self.before or self.mentions)
+
+    def key(self) -> Tuple[Any, ...]:
+        """Hashable form of the filter; filters that select the same documents by name share it."""
+        speaker = self.speaker.strip().lower() if self.speaker else None
+        mentions = tuple(sorted({normalize_mention(mention) for mention in self.mentions}))
+        return (speaker, self.after, self.before, mentions)
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> Optional["SearchFilter"]:
+        """Build a filter from a JSON object, or None for no filtering; raises ``ValueError``."""
+        if not data:
+            return None
+        if not isinstance(data, dict):
+            raise ValueError("filters must be an object")
+        unknown = set(data) - {"speaker", "after", "before", "mentions"}
+        if unknown:
+            raise ValueError(f"Unknown filter fields: {', '.join(sorted(unknown))}")
+        mentions = data.get("mentions") or ()
+        if isinstance(mentions, str):
+            mentions = (mentions,)
+        elif not isinstance(mentions, (list, tuple)):
+            raise ValueError("mentions must be a string or list")
+        search_filter = cls(
+            speaker=str(data["speaker"]) if data.get("speaker") else None,
+            after=str(data["after"]) if data.get("after") else None,
+            before=str(data["before"]) if data.get("before") else None,
+            mentions=tuple(str(mention) for mention in mentions),
+        )
+        return None if search_filter.is_empty else search_filter
+
+
+FilterLike = Union[SearchFilter, Dict[str, Any], None]
+
+
+def as_filter(filters: FilterLike) -> Optional[SearchFilter]:
+    if isinstance(filters, SearchFilter):
+        return None if filters.is_empty else filters
+    return SearchFilter.from_dict(filters)
+
+
+class FacetIndex:
+    """Speaker, timestamp and mention indexes over documents numbered by position.
+
+    ``speakers`` and ``mentions`` map keys to sorted doc id arrays and
+    ``timestamps`` holds one key per document. Metadata is extracted once,
+    as documents are added (:meth:`add`, :meth:`update`); :meth:`extend`
+    renumbers another index's entries instead of parsing the text again.
+    A ``(key, doc id)`` ordering for range lookups is built on the first
+    time-bounded select after a change.
+
+    The tables may also be read-only views of an index file (see
+    ``index_file.MappedIndex``), which only need ``get`` and indexing.
+    """
+
+    def __init__(self, speakers: Optional[Dict[str, Sequence[int]]] = None,
+                 mentions: Optional[Dict[str, Sequence[int]]] = None,
+                 timestamps: Optional[Sequence[int]] = None) -> None:
+        self.speakers = speakers if speakers is not None else {}
+        self.mentions = mentions if mentions is not None else {}
+        self.timestamps = timestamps if timestamps is not None else array("q")
+        self.n_docs = len(self.timestamps)
+        # (keys, doc ids) sorted together, assigned at once so concurrent readers see both
+        self._time_order: Optional[Tuple[List[int], List[int]]] = None
+
+    def add(self, text: str) -> int:
+        """Index one document as the next doc id and return the id."""
+        doc_id = self.n_docs
+        metadata = DocumentMetadata.from_text(text)
+        if metadata.speaker:
+            full_name = metadata.speaker.lower()
+            for key in dict.fromkeys([full_name, *full_name.split()]):
+                self.speakers.setdefault(key, array("l")).append(doc_id)
+        for key in metadata.mentions:
+            self.mentions.setdefault(key, array("l")).append(doc_id)
+        self.timestamps.append(timestamp_key(metadata.timestamp))
+        self.n_docs += 1
+        self._time_order = None
+        return doc_id
+
+    def update(self, documents: Sequence[str]) -> None:
+        """Index documents appended since the last update."""
+        for doc_id in range(self.n_docs, len(documents)):
+            self.add(documents[doc_id])
+
+    def extend(self, other: "FacetIndex", rows: Optional[Sequence[int]] = None) -> None:
+        """Append the documents of ``other``, or only its sorted ``rows``, after these ones."""
+        offset = self.n_docs
+        remap: Optional[array] = None
+        if rows is None:
+            self.timestamps.extend(other.timestamps)
+            self.n_docs += other.n_docs
+        else:
+            # Old doc id -> new doc id, or -1 for documents left out
+            remap = array("l", [-1]) * other.n_docs
+            for new_id, row in enumerate(rows, offset):
+                remap[row] = new_id
+            self.timestamps.extend(map(other.timestamps.__getitem__, rows))
+            self.n_docs += len(rows)
+        for own, theirs in ((self.speakers, other.speakers), (self.mentions, other.mentions)):
+            for key, doc_ids in theirs.items():
+                if remap is None:
+                    renumbered = array("l", map(offset.__add__, doc_ids))
+                else:
+                    renumbered = array("l", (remap[doc_id] for doc_id in doc_ids if remap[doc_id] >= 0))
+                if renumbered:
+                    own.setdefault(key, array("l")).extend(renumbered)
+        self._time_order = None
+
+    def _time_range(self, first: int, last: int) -> List[int]:
+        time_order = self._time_order
+        if time_order is None:
+            order = sorted(
+                (key, doc_id) for doc_id, key in enumerate(self.timestamps) if key != NO_TIMESTAMP
+            )
+            time_order = self._time_order = ([key for key, _ in order], [doc_id for _, doc_id in order])
+        keys, doc_ids = time_order
+        start = bisect_left(keys, first)
+        end = bisect_right(keys, last)
+        return sorted(doc_ids[start:end])
+
+    def select(self, search_filter: SearchFilter) -> List[int]:
+        """Sorted ids of the documents matching every field of ``search_filter``."""
+        candidates: List[Sequence[int]] = []
+        if search_filter.speaker:
+            candidates.append(self.speakers.get(search_filter.speaker.strip().lower(), ()))
+        for mention in search_filter.mentions:
+            candidates.append(self.mentions.get(normalize_mention(mention), ()))
+        if search_filter.after or search_filter.before:
+            first = parse_time_range(search_filter.after)[1] + 1 if search_filter.after else 0
+            last = parse_time_range(search_filter.before)[0] - 1 if search_filter.before else 2 ** 62
+            candidates.append(self._time_range(first, last))
+        if not candidates:
+            return list(range(self.n_docs))
+
+        candidates.sort(key=len)
+        selected = candidates[0]
+        for other in candidates[1:]:
+            if not selected:
+                break
+            members = set(other)
+            selected = [doc_id for doc_id in selected if doc_id in members]
+        return list(selected)
+
+
+__all__ = [
+    "DocumentMetadata", "FacetIndex", "SearchFilter", "as_filter", "extract_mentions",
+    "parse_time_range", "split_message",
+]
@@ -0,0 +1,139 @@
+"""Hybrid retrieval: several retrievers queried concurrently and fused by reciprocal rank."""
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from facets import FilterLike
+from vector_store import SearchResult
+
+OUTCOMES = ("ok", "timeout", "error")
+
+
+class HybridRetriever:
+    """Query several retrievers in parallel and merge their rankings.
+
+    ``retrievers`` maps a name to a store with ``search(query, top_k,
+    filters)``, such as ``SimpleVectorStore`` and ``DenseVectorStore``. Each
+    is asked for ``candidates`` results. The lists are merged with
+    reciprocal rank fusion: a document scores ``weight / (rrf_k + rank)``
+    from each list it appears in, so a document ranked well by both
+    retrievers beats one ranked first by only one. Rank-based fusion needs
+    no calibration between TF-IDF, BM25 and cosine scores. Documents are
+    matched by ``doc_id``, so the stores must number documents alike.
+
+    Every retriever has its own thread pool, so a retriever that hangs only
+    holds up its own later calls. A search waits at most ``timeout``
+    seconds. Retrievers still running at that point are left out of the
+    fused ranking (which is empty if none has finished). Calls that have
+    not started by then are cancelled; running ones finish in the background.
+
+    ``on_timing(stage, seconds)`` is called with the duration of every
+    retriever call, even a late one, and of each fusion (stage ``fuse``).
+    ``on_outcome(retriever, outcome)`` is called once per call with ``ok``,
+    ``timeout`` or ``error``; ``stats()`` keeps the same counts.
+    """
+
+    def __init__(self, retrievers: Dict[str, Any], weights: Optional[Dict[str, float]] = None,
+                 timeout: float = 0.5, candidates: int = 20, rrf_k: int = 60,
+                 workers_per_retriever: int = 4) -> None:
+        self.retrievers = dict(retrievers)
+        self.weights = {name: (weights or {}).get(name, 1.0) for name in self.retrievers}
+        self.timeout = timeout
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.on_timing: Optional[Callable[[str, float], None]] = None
+        self.on_outcome: Optional[Callable[[str, str], None]] = None
+        self._pools = {
+            name: ThreadPoolExecutor(max_workers=workers_per_retriever, thread_name_prefix=f"retrieve-{name}")
+            for name in self.retrievers
+        }
+        self._counts = {name: dict.fromkeys(OUTCOMES, 0) for name in self.retrievers}
+        self._lock = threading.Lock()
+
+    def search(self, query: str, top_k: int = 3, filters: FilterLike = None) -> List[SearchResult]:
+        return self.search_timed(query, top_k, filters)[0]
+
+    def search_timed(self, query: str, top_k: int = 3, filters: FilterLike = None
+                     ) -> Tuple[List[SearchResult], Dict[str, Optional[float]]]:
+        """Fused results, with the seconds each stage took (None for retrievers left out)."""
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        depth = max(top_k, self.candidates)
+        futures: Dict[Future, str] = {
+            self._pools[name].submit(self._call, name, store, query, depth, filters): name
+            for name, store in self.retrievers.items()
+        }
+        rankings: Dict[str, List[SearchResult]] = {}
+        timings: Dict[str, Optional[float]] = dict.fromkeys(self.retrievers)
+        pending = set(futures)
+        while pending:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures[future]
+                try:
+                    rankings[name], timings[name] = future.result()
+                except Exception:
+                    self._count(name, "error")
+                else:
+                    self._count(name, "ok")
+        for future in pending:
+            # A call still queued behind a busy retriever would only delay later searches
+            future.cancel()
+            self._count(futures[future], "timeout")
+
+        fuse_started = time.perf_counter()
+        results = self.fuse(rankings, top_k)
+        timings["fuse"] = time.perf_counter() - fuse_started
+        if self.on_timing is not None:
+            self.on_timing("fuse", timings["fuse"])
+        return results, timings
+
+    def fuse(self, rankings: Dict[str, List[SearchResult]], top_k: int) -> List[SearchResult]:
+        """Reciprocal rank fusion of each retriever's ranking, best first."""
+        scores: Dict[int, float] = {}
+        first_seen: Dict[int, Tuple[int, SearchResult]] = {}
+        for name, results in rankings.items():
+            weight = self.weights[name]
+            for rank, result in enumerate(results, start=1):
+                scores[result.doc_id] = scores.get(result.doc_id, 0.0) + weight / (self.rrf_k + rank)
+                # Ties go to the document ranked higher by any retriever
+                best = first_seen.get(result.doc_id)
+                if best is None or rank < best[0]:
+                    first_seen[result.doc_id] = (rank, result)
+        order = sorted(scores, key=lambda doc_id: (-scores[doc_id], first_seen[doc_id][0], doc_id))
+        return [
+            SearchResult(first_seen[doc_id][1].text, scores[doc_id], doc_id) for doc_id in order[:top_k]
+        ]
+
+    def _call(self, name: str, store: Any, query: str, top_k: int,
+              filters: FilterLike) -> Tuple[List[SearchResult], float]:
+        started = time.perf_counter()
+        try:
+            return store.search(query, top_k=top_k, filters=filters), time.perf_counter() - started
+        finally:
+            if self.on_timing is not None:
+                self.on_timing(name, time.perf_counter() - started)
+
+    def _count(self, name: str, outcome: str) -> None:
+        with self._lock:
+            self._counts[name][outcome] += 1
+        if self.on_outcome is not None:
+            self.on_outcome(name, outcome)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Calls per retriever by outcome: ``ok``, ``timeout`` or ``error``."""
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._counts.items()}
+
+    def close(self) -> None:
+        for pool in self._pools.values():
+            pool.shutdown(wait=False)
+
+
+__all__ = ["HybridRetriever"]
@@ -0,0 +1,358 @@
+"""Compact, memory-mapped on-disk format for ``SimpleVectorStore`` indexes.
+
+The file is a small header followed by 8-byte aligned sections. The header
+holds the counts below and an optional 32-byte fingerprint of the corpus the
+index was built from (see ``ingest.corpus_fingerprint``), so a reader can
+tell a stale index from a current one without reading the sections::
+
+    term_offsets  int64[V + 1]   byte offsets of each term in term_blob
+    term_blob     utf-8          vocabulary, sorted so lookups can bisect
+    idf           float64[V]
+    post_indptr   int64[V + 1]   term-major postings (CSR, one row per term)
+    post_docs     int32[nnz]
+    post_tf       float64[nnz]
+    doc_norms     float64[N]
+    doc_lengths   int32[N]       token count of each document
+    row_indptr    int32[N + 1]   document-major, L2-normalised TF-IDF rows
+    row_cols      int32[nnz]
+    row_data      float64[nnz]
+    doc_offsets   int64[N + 1]   byte offsets of each document in doc_blob
+    doc_blob      utf-8
+    speaker_offsets, speaker_blob, speaker_indptr, speaker_docs
+    mention_offsets, mention_blob, mention_indptr, mention_docs
+                                 facet keys (sorted, like the vocabulary)
+                                 and the sorted doc ids of each, as CSR
+    timestamps    int64[N]       message time key per document, or -1
+
+Sections are read through ``memoryview`` casts over a read-only ``mmap``, so
+opening an index costs O(1) regardless of corpus size and every process that
+opens the same file shares its pages through the OS page cache. Only the
+standard library is needed; NumPy arrays are zero-copy views when available.
+"""
+from __future__ import annotations
+
+import itertools
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from facets import FacetIndex
+
+MAGIC = b"SVSINDEX"
+VERSION = 4
+
+_SECTIONS = (
+    ("term_offsets", "q"),
+    ("term_blob", "B"),
+    ("idf", "d"),
+    ("post_indptr", "q"),
+    ("post_docs", "i"),
+    ("post_tf", "d"),
+    ("doc_norms", "d"),
+    ("doc_lengths", "i"),
+    ("row_indptr", "i"),
+    ("row_cols", "i"),
+    ("row_data", "d"),
+    ("doc_offsets", "q"),
+    ("doc_blob", "B"),
+    ("speaker_offsets", "q"),
+    ("speaker_blob", "B"),
+    ("speaker_indptr", "q"),
+    ("speaker_docs", "i"),
+    ("mention_offsets", "q"),
+    ("mention_blob", "B"),
+    ("mention_indptr", "q"),
+    ("mention_docs", "i"),
+    ("timestamps", "q"),
+)
+_HEADER = struct.Struct("<8sQQQQ32s")
+_SECTION_ENTRY = struct.Struct("<QQ")
+_ALIGN = 8
+
+
+def _blob(strings: List[str]) -> Tuple[array, bytes]:
+    offsets = array("q", [0])
+    chunks = []
+    for text in strings:
+        encoded = text.encode("utf-8")
+        chunks.append(encoded)
+        offsets.append(offsets[-1] + len(encoded))
+    return offsets, b"".join(chunks)
+
+
+def _facet_sections(prefix: str, doc_ids: Mapping[str, Sequence[int]]) -> Dict[str, object]:
+    keys = sorted(doc_ids)
+    offsets, blob = _blob(keys)
+    indptr = array("q", [0])
+    docs = array("i")
+    for key in keys:
+        docs.extend(list(doc_ids[key]))
+        indptr.append(len(docs))
+    return {f"{prefix}_offsets": offsets, f"{prefix}_blob": blob,
+            f"{prefix}_indptr": indptr, f"{prefix}_docs": docs}
+
+
+def write_index(
+    path: Union[str, Path],
+    documents: List[str],
+    postings: Mapping[str, Sequence[Tuple[int, float]]],
+    idf: Mapping[str, float],
+    doc_norms: Sequence[float],
+    doc_lengths: Sequence[int],
+    corpus_fingerprint: Optional[str] = None,
+    facets: Optional[FacetIndex] = None,
+) -> None:
+    """Serialise an index in the layout described in the module docstring.
+
+    ``corpus_fingerprint`` is a 64-digit hex digest recorded in the header.
+    ``facets`` indexes ``documents`` by position; it is built here if not given.
+    """
+    if sys.byteorder != "little":
+        raise ValueError("Index files can only be written on little-endian hosts")
+
+    terms = sorted(idf)
+
+    post_indptr = array("q", [0])
+    post_docs = array("i")
+    post_tf = array("d")
+    for term in terms:
+        entries = postings[term]
+        post_docs.extend([doc_id for doc_id, _ in entries])
+        post_tf.extend([tf for _, tf in entries])
+        post_indptr.append(len(post_docs))
+    if len(post_docs) >= 2 ** 31:
+        raise ValueError(f"Index has too many postings for the version {VERSION} format")
+
+    # Transpose the postings into document-major rows, columns in term order
+    row_sizes = [0] * len(documents)
+    for doc_id in post_docs:
+        row_sizes[doc_id] += 1
+    row_indptr = array("i", [0])
+    row_indptr.extend(itertools.accumulate(row_sizes))
+    fill = list(row_indptr[:-1])
+    row_cols = array("i", bytes(4 * len(post_docs)))
+    row_data = array("d", bytes(8 * len(post_docs)))
+    for term_id, term in enumerate(terms):
+        term_idf = idf[term]
+        for position in range(post_indptr[term_id], post_indptr[term_id + 1]):
+            doc_id = post_docs[position]
+            slot = fill[doc_id]
+            fill[doc_id] = slot + 1
+            row_cols[slot] = term_id
+            row_data[slot] = (post_tf[position] * term_idf) / doc_norms[doc_id]
+
+    if facets is None:
+        facets = FacetIndex()
+        facets.update(documents)
+
+    term_offsets, term_blob = _blob(terms)
+    doc_offsets, doc_blob = _blob(documents)
+    sections = {
+        "term_offsets": term_offsets,
+        "term_blob": term_blob,
+        "idf": array("d", (idf[term] for term in terms)),
+        "post_indptr": post_indptr,
+        "post_docs": post_docs,
+        "post_tf": post_tf,
+        "doc_norms": array("d", doc_norms),
+        "doc_lengths": array("i", doc_lengths),
+        "row_indptr": row_indptr,
+        "row_cols": row_cols,
+        "row_data": row_data,
+        "doc_offsets": doc_offsets,
+        "doc_blob": doc_blob,
+        **_facet_sections("speaker", facets.speakers),
+        **_facet_sections("mention", facets.mentions),
+        "timestamps": array("q", facets.timestamps),
+    }
+
+    offset = _HEADER.size + _SECTION_ENTRY.size * len(_SECTIONS)
+    table = []
+    payloads = []
+    for name, _ in _SECTIONS:
+        section = sections[name]
+        payload = section if isinstance(section, bytes) else section.tobytes()
+        offset += -offset % _ALIGN
+        table.append((offset, len(payload)))
+        payloads.append((offset, payload))
+        offset += len(payload)
+
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as handle:
+        fingerprint = bytes.fromhex(corpus_fingerprint) if corpus_fingerprint else bytes(32)
+        handle.write(_HEADER.pack(MAGIC, VERSION, len(documents), len(terms), len(post_docs), fingerprint))
+        for entry in table:
+            handle.write(_SECTION_ENTRY.pack(*entry))
+        for start, payload in payloads:
+            handle.write(b"\0" * (start - handle.tell()))
+            handle.write(payload)
+    # Readers that already mapped the old file keep their pages; new readers see the new one.
+    tmp_path.replace(path)
+
+
+def _read_header(view, path: Path) -> tuple:
+    if len(view) < _HEADER.size:
+        raise ValueError(f"{path} is not a vector store index")
+    magic, version, *fields = _HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a vector store index")
+    if version != VERSION:
+        raise ValueError(f"Unsupported index version {version} in {path}")
+    n_docs, n_terms, nnz, fingerprint = fields
+    return n_docs, n_terms, nnz, fingerprint.hex() if any(fingerprint) else None
+
+
+def read_corpus_fingerprint(path: Union[str, Path]) -> Optional[str]:
+    """Corpus fingerprint recorded in an index file, or None; raises ``ValueError`` for other files."""
+    path = Path(path)
+    with open(path, "rb") as handle:
+        return _read_header(handle.read(_HEADER.size), path)[3]
+
+
+class _StringTable(Sequence):
+    """Sequence of utf-8 strings decoded on access from an offsets array and a blob."""
+
+    def __init__(self, offsets: memoryview, blob: memoryview) -> None:
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return str(self._blob[self._offsets[index]:self._offsets[index + 1]], "utf-8")
+
+
+class _Vocabulary:
+    """Sorted term table with ``dict``-style ``get`` lookups by binary search."""
+
+    def __init__(self, terms: _StringTable) -> None:
+        self._terms = terms
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def get(self, term: str, default: Optional[int] = None) -> Optional[int]:
+        position = bisect_left(self._terms, term)
+        if position < len(self._terms) and self._terms[position] == term:
+            return position
+        return default
+
+
+class _TermValues:
+    """Read-only ``term -> value`` mapping over a per-term array."""
+
+    def __init__(self, vocabulary: _Vocabulary, values: memoryview) -> None:
+        self._vocabulary = vocabulary
+        self._values = values
+
+    def get(self, term: str, default=None):
+        term_id = self._vocabulary.get(term)
+        return default if term_id is None else self._values[term_id]
+
+    def __getitem__(self, term: str):
+        term_id = self._vocabulary.get(term)
+        if term_id is None:
+            raise KeyError(term)
+        return self._values[term_id]
+
+
+class _Postings:
+    """Read-only ``term -> [(doc id, term frequency)]`` mapping over the CSR postings."""
+
+    def __init__(self, vocabulary: _Vocabulary, indptr: memoryview, docs: memoryview, tfs: memoryview) -> None:
+        self._vocabulary = vocabulary
+        self._indptr = indptr
+        self._docs = docs
+        self._tfs = tfs
+
+    def get(self, term: str, default=None):
+        term_id = self._vocabulary.get(term)
+        if term_id is None:
+            return default
+        start, end = self._indptr[term_id], self._indptr[term_id + 1]
+        return list(zip(self._docs[start:end], self._tfs[start:end]))
+
+
+class _DocIdLists:
+    """Read-only ``key -> sorted doc ids`` mapping over a sorted key table and CSR doc ids."""
+
+    def __init__(self, keys: _Vocabulary, indptr: memoryview, docs: memoryview) -> None:
+        self._keys = keys
+        self._indptr = indptr
+        self._docs = docs
+
+    def get(self, key: str, default=None):
+        position = self._keys.get(key)
+        if position is None:
+            return default
+        return self._docs[self._indptr[position]:self._indptr[position + 1]]
+
+
+class MappedIndex:
+    """Read-only view of an index file written by :func:`write_index`."""
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        with open(self.path, "rb") as handle:
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        self.n_docs, self.n_terms, self.nnz, self.corpus_fingerprint = _read_header(view, self.path)
+        if sys.byteorder != "little":
+            raise ValueError("Index files can only be read on little-endian hosts")
+
+        self._sections: Dict[str, memoryview] = {}
+        for position, (name, typecode) in enumerate(_SECTIONS):
+            start, size = _SECTION_ENTRY.unpack_from(view, _HEADER.size + position * _SECTION_ENTRY.size)
+            section = view[start:start + size]
+            self._sections[name] = section if typecode == "B" else section.cast(typecode)
+
+        self.vocabulary = _Vocabulary(_StringTable(self._sections["term_offsets"], self._sections["term_blob"]))
+        self.documents = _StringTable(self._sections["doc_offsets"], self._sections["doc_blob"])
+        self.idf = _TermValues(self.vocabulary, self._sections["idf"])
+        self.postings = _Postings(
+            self.vocabulary,
+            self._sections["post_indptr"],
+            self._sections["post_docs"],
+            self._sections["post_tf"],
+        )
+        self.doc_norms = self._sections["doc_norms"]
+        self.doc_lengths = self._sections["doc_lengths"]
+        self.facets = FacetIndex(
+            speakers=self._doc_id_lists("speaker"),
+            mentions=self._doc_id_lists("mention"),
+            timestamps=self._sections["timestamps"],
+        )
+
+    def _doc_id_lists(self, prefix: str) -> _DocIdLists:
+        sections = self._sections
+        keys = _Vocabulary(_StringTable(sections[f"{prefix}_offsets"], sections[f"{prefix}_blob"]))
+        return _DocIdLists(keys, sections[f"{prefix}_indptr"], sections[f"{prefix}_docs"])
+
+    def csr_index(self):
+        """Zero-copy :class:`~sparse_index.CsrIndex` over the document-major rows."""
+        import numpy as np
+        from sparse_index import CsrIndex
+
+        return CsrIndex(
+            self.vocabulary,
+            np.frombuffer(self._sections["row_indptr"], dtype=np.int32),
+            np.frombuffer(self._sections["row_cols"], dtype=np.int32),
+            np.frombuffer(self._sections["row_data"], dtype=np.float64),
+        )
+
+
+__all__ = ["MappedIndex", "read_corpus_fingerprint", "write_index"]
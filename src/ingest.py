@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""Streaming ingestion of chat exports into the vector store.
+
+Loaders are generators, so exports are read one line or record at a time
+and fed to ``SimpleVectorStore.add_documents`` in bounded batches; no file is
+loaded whole. The index itself is built in memory, though, and so is the set
+of message digests used to drop duplicates, so memory still grows with the
+number of messages indexed:
+
+    python src/ingest.py exports/ history.jsonl --index data/chat.index
+
+Supported inputs are plain text (one message per line), JSON Lines, CSV and
+directories containing such files; any of them may be gzip-compressed.
+"""
+
+import argparse
+import csv
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, IO, Iterable, Iterator, List, Optional, Sequence, Union
+
+from rich.console import Console
+
+from facets import split_message
+from index_file import read_corpus_fingerprint
+from vector_store import SimpleVectorStore
+
+console = Console()
+
+_WHITESPACE = re.compile(r"\s+")
+
+TEXT_FIELDS = ("text", "message", "content", "body")
+SPEAKER_FIELDS = ("speaker", "author", "user", "name", "from")
+TIMESTAMP_FIELDS = ("timestamp", "time", "date", "ts")
+SUFFIX_FORMATS = {
+    ".txt": "text", ".log": "text", ".md": "text",
+    ".jsonl": "jsonl", ".ndjson": "jsonl", ".json": "jsonl",
+    ".csv": "csv", ".tsv": "csv",
+}
+
+PathLike = Union[str, Path]
+
+
+@dataclass
+class ChatMessage:
+    """One chat message; ``text`` is the line stored in the vector store."""
+
+    body: str
+    speaker: Optional[str] = None
+    timestamp: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        if self.speaker and self.timestamp:
+            return f"{self.speaker}, {self.timestamp}: {self.body}"
+        if self.speaker:
+            return f"{self.speaker}: {self.body}"
+        return self.body
+
+
+@dataclass
+class IngestStats:
+    read: int = 0
+    duplicates: int = 0
+    empty: int = 0
+    indexed: int = 0
+    batches: int = 0
+
+
+def parse_message(line: str) -> ChatMessage:
+    """Split a ``Speaker, Mon D, H:MM AM: text`` line into its parts.
+
+    Lines without the speaker prefix are kept whole as the message body.
+    """
+    speaker, timestamp, body = split_message(line)
+    return ChatMessage(body=body, speaker=speaker, timestamp=timestamp)
+
+
+def _first(record: Dict, fields: Sequence[str]) -> Optional[str]:
+    for field in fields:
+        value = record.get(field)
+        if value not in (None, ""):
+            return str(value)
+    return None
+
+
+def message_from_record(record: Dict) -> Optional[ChatMessage]:
+    """Build a message from a JSON/CSV record with text and optional speaker/timestamp."""
+    text = _first(record, TEXT_FIELDS)
+    if text is None:
+        return None
+    speaker = _first(record, SPEAKER_FIELDS)
+    if speaker is None:
+        return parse_message(text)
+    return ChatMessage(body=text.strip(), speaker=speaker.strip(), timestamp=_first(record, TIMESTAMP_FIELDS))
+
+
+def _open_text(path: Path) -> IO[str]:
+    if path.suffix == ".gz":
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8", errors="replace", newline="")
+    return open(path, encoding="utf-8", errors="replace", newline="")
+
+
+def _format(path: Path) -> Optional[str]:
+    suffixes = [suffix.lower() for suffix in path.suffixes if suffix.lower() != ".gz"]
+    return SUFFIX_FORMATS.get(suffixes[-1] if suffixes else "")
+
+
+def iter_text(path: PathLike) -> Iterator[ChatMessage]:
+    """Yield one message per non-empty line of a plain text export."""
+    with _open_text(Path(path)) as handle:
+        for line in handle:
+            if line.strip():
+                yield parse_message(line)
+
+
+def iter_jsonl(path: PathLike) -> Iterator[ChatMessage]:
+    """Yield messages from JSON Lines; each line is a string or an object."""
+    with _open_text(Path(path)) as handle:
+        for number, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as exc:
+                console.print(f"[yellow]Skipping {path}:{number}: {exc}[/yellow]")
+                continue
+            if isinstance(record, str):
+                yield parse_message(record)
+            elif isinstance(record, dict):
+                message = message_from_record(record)
+                if message is not None:
+                    yield message
+
+
+def iter_csv(path: PathLike) -> Iterator[ChatMessage]:
+    """Yield messages from a CSV/TSV export with a header row."""
+    path = Path(path)
+    delimiter = "\t" if ".tsv" in (suffix.lower() for suffix in path.suffixes) else ","
+    with _open_text(path) as handle:
+        for record in csv.DictReader(handle, delimiter=delimiter):
+            message = message_from_record({key.strip().lower(): value for key, value in record.items() if key})
+            if message is not None:
+                yield message
+
+
+LOADERS = {"text": iter_text, "jsonl": iter_jsonl, "csv": iter_csv}
+
+
+def iter_path(path: PathLike) -> Iterator[ChatMessage]:
+    """Yield messages from a file, or from every supported file under a directory.
+
+    Files named explicitly are read as plain text unless their suffix says
+    otherwise; inside directories, files with unknown suffixes are skipped.
+    """
+    for file in _source_files(Path(path)):
+        yield from LOADERS[_format(file) or "text"](file)
+
+
+def _source_files(path: Path) -> Iterator[Path]:
+    if path.is_dir():
+        for child in sorted(path.rglob("*")):
+            if child.is_file() and not child.name.startswith(".") and _format(child):
+                yield child
+        return
+    yield path
+
+
+def iter_sources(sources: Iterable[PathLike]) -> Iterator[ChatMessage]:
+    for source in sources:
+        yield from iter_path(source)
+
+
+def corpus_fingerprint(sources: Iterable[PathLike]) -> str:
+    """Hex digest of the files ``sources`` name: their paths, sizes and modification times.
+
+    Adding, removing, replacing or editing an export changes it, without
+    reading any file contents.
+    """
+    digest = hashlib.sha256()
+    for source in sources:
+        for file in _source_files(Path(source)):
+            try:
+                stat = file.stat()
+            except OSError:
+                digest.update(f"{file.resolve()}\0missing\n".encode("utf-8"))
+                continue
+            digest.update(f"{file.resolve()}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def index_is_current(index_path: PathLike, sources: Optional[Sequence[PathLike]] = None) -> bool:
+    """Whether the index file at ``index_path`` can be opened instead of rebuilt.
+
+    The file must be an index in the current format and, with ``sources``,
+    have been saved with their current :func:`corpus_fingerprint`.
+    """
+    try:
+        fingerprint = read_corpus_fingerprint(index_path)
+    except (OSError, ValueError):
+        return False
+    return not sources or fingerprint == corpus_fingerprint(sources)
+
+
+def _fingerprint(text: str) -> bytes:
+    normalized = _WHITESPACE.sub(" ", text).strip().lower()
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest()
+
+
+def deduplicate(messages: Iterable[ChatMessage], stats: Optional[IngestStats] = None,
+                existing: Iterable[str] = ()) -> Iterator[ChatMessage]:
+    """Drop repeated messages (same text up to whitespace and case).
+
+    Only a 64-bit digest per distinct message is remembered, so memory grows
+    by a few dozen bytes per unique message rather than with the text.
+    Messages equal to one of ``existing`` are dropped as well.
+    """
+    seen = {_fingerprint(text) for text in existing}
+    for message in messages:
+        key = _fingerprint(message.text)
+        if key in seen:
+            if stats is not None:
+                stats.duplicates += 1
+            continue
+        seen.add(key)
+        yield message
+
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def ingest(store: SimpleVectorStore, sources: Iterable[PathLike], batch_size: int = 1000,
+           dedupe: bool = True, workers: int = 1) -> IngestStats:
+    """Stream messages from ``sources`` into ``store`` in batches of ``batch_size``.
+
+    With ``workers`` > 1 each batch is tokenised by a pool of processes, so
+    batches should be large (tens of thousands of messages) to pay off.
+
+    With ``dedupe`` messages already in the store are skipped too, so
+    re-ingesting an export into an existing index only adds new messages.
+    """
+    stats = IngestStats()
+
+    def counted(messages: Iterable[ChatMessage]) -> Iterator[ChatMessage]:
+        for message in messages:
+            stats.read += 1
+            if not message.body:
+                stats.empty += 1
+                continue
+            yield message
+
+    messages = counted(iter_sources(sources))
+    if dedupe:
+        messages = deduplicate(messages, stats, existing=store.documents)
+    for batch in batched(messages, batch_size):
+        doc_ids = store.add_documents([message.text for message in batch], workers=workers)
+        indexed = sum(doc_id is not None for doc_id in doc_ids)
+        # Messages without a single word are rejected by the store
+        stats.indexed += indexed
+        stats.empty += len(batch) - indexed
+        stats.batches += 1
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Index chat exports (text, JSONL, CSV or directories of them) into the vector store",
+    )
+    parser.add_argument("sources", nargs="+", help="Files or directories to ingest")
+    parser.add_argument(
+        "--index", default=os.getenv("RAG_INDEX_PATH"),
+        help="Index file to write (default: $RAG_INDEX_PATH)",
+    )
+    parser.add_argument("--append", action="store_true", help="Add to the existing index instead of replacing it")
+    parser.add_argument(
+        "--batch-size", type=int,
+        help="Messages per add_documents call (default: 1000, or 50000 with --workers)",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Processes used to tokenise each batch (default: 1; the merged index is identical)",
+    )
+    parser.add_argument("--no-dedupe", action="store_true", help="Keep repeated messages")
+    parser.add_argument("--backend", default="python", choices=SimpleVectorStore.BACKENDS)
+    parser.add_argument(
+        "--no-counts", action="store_true",
+        help="Don't keep per-document term counts while building (less memory; norms may differ in the last bit)",
+    )
+    args = parser.parse_args(argv)
+
+    if not args.index:
+        parser.error("--index is required (or set RAG_INDEX_PATH)")
+    for source in args.sources:
+        if not os.path.exists(source):
+            parser.error(f"{source} does not exist")
+
+    if args.append and os.path.exists(args.index):
+        store = SimpleVectorStore.open(args.index, backend=args.backend)
+    else:
+        store = SimpleVectorStore(backend=args.backend, keep_counts=not args.no_counts)
+
+    with console.status("[bold green]Ingesting chat exports..."):
+        batch_size = args.batch_size or (50_000 if args.workers > 1 else 1000)
+        stats = ingest(store, args.sources, batch_size=batch_size, dedupe=not args.no_dedupe,
+                       workers=args.workers)
+        # An appended index holds more than these sources, so it is not stamped as built from them
+        store.save(args.index, corpus_fingerprint=None if args.append else corpus_fingerprint(args.sources))
+
+    console.print(
+        f"[green]✓ Indexed {stats.indexed} messages into {args.index}[/green] "
+        f"[dim]({stats.read} read, {stats.duplicates} duplicates, {stats.empty} empty, "
+        f"{len(store.documents)} in index, {store.memory_usage()['total'] / 2**20:,.1f} MB in memory)[/dim]"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""In-process latency histograms and counters in Prometheus text format.
+
+A dependency-free subset of the Prometheus client: counters, gauges read
+at scrape time, and fixed-bucket histograms with optional labels. Observing
+a value costs a bisect and a locked increment, cheap enough to leave on
+for every request.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Seconds; spans sub-millisecond retrieval to multi-minute generations
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing total per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+                for key, value in values]
+
+
+class Gauge(_Metric):
+    """Value read from a callback when metrics are rendered.
+
+    ``kind="counter"`` exposes a running total kept elsewhere (such as
+    cache hit counts) as a counter.
+    """
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], Optional[float]],
+                 kind: str = "gauge") -> None:
+        super().__init__(name, documentation)
+        self.read = read
+        self.kind = kind
+
+    def samples(self) -> List[str]:
+        value = self.read()
+        return [] if value is None else [f"{self.name} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    """Fixed-bucket distribution per label combination."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label combination: [count per bucket (+Inf last)], sum
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Named metrics rendered together in the Prometheus text exposition format."""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], Optional[float]],
+              kind: str = "gauge") -> Gauge:
+        return self.register(Gauge(name, documentation, read, kind))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+class ChatMetrics:
+    """Metrics for the chat hot path, shared by the chatbot and web servers.
+
+    ``stage`` labels are ``retrieve``, ``prompt``, ``generate`` (the Ollama
+    request, until the last streamed token) and ``parse`` (decoding the
+    response). Hybrid retrieval adds ``retrieve_<retriever>`` for each
+    retriever's call and ``retrieve_fuse`` for merging their rankings. Ollama's own ``eval_count``, ``eval_duration``,
+    ``prompt_eval_count``, ``prompt_eval_duration`` and ``load_duration``
+    are recorded from each completed response.
+    """
+
+    def __init__(self, registry: Optional[Registry] = None) -> None:
+        self.registry = registry or Registry()
+        registry = self.registry
+        self.stage_seconds = registry.histogram(
+            "rag_stage_seconds", "Time spent in each stage of a chat turn.", ("stage",))
+        self.turns = registry.counter(
+            "rag_chat_turns_total", "Chat turns by outcome (ok, cached, error).", ("outcome",))
+        self.first_token_seconds = registry.histogram(
+            "rag_first_token_seconds", "Time from sending a streaming request to its first token.")
+        self.eval_seconds = registry.histogram(
+            "ollama_eval_seconds", "Ollama-reported time generating response tokens.")
+        self.prompt_eval_seconds = registry.histogram(
+            "ollama_prompt_eval_seconds", "Ollama-reported time evaluating the prompt.")
+        self.load_seconds = registry.histogram(
+            "ollama_load_seconds", "Ollama-reported time loading the model.")
+        self.eval_tokens = registry.counter(
+            "ollama_eval_tokens_total", "Response tokens generated by Ollama.")
+        self.prompt_eval_tokens = registry.counter(
+            "ollama_prompt_eval_tokens_total", "Prompt tokens evaluated by Ollama (cached prefixes excluded).")
+        self.http_seconds = registry.histogram(
+            "rag_http_request_seconds", "Web request latency until the response starts.",
+            ("method", "route", "status"))
+        self.queue_wait_seconds = registry.histogram(
+            "ollama_queue_wait_seconds", "Time generations waited for a slot on their model.", ("model",))
+        self.retriever_calls = registry.counter(
+            "rag_retriever_calls_total", "Hybrid retrieval calls by retriever and outcome (ok, timeout, error).",
+            ("retriever", "outcome"))
+
+    def track_scheduler(self, scheduler) -> None:
+        """Record queue waits from a :class:`dispatcher.FairScheduler` and expose its depth."""
+        scheduler.on_wait = lambda model, seconds: self.queue_wait_seconds.observe(seconds, model=model)
+        registry = self.registry
+        registry.gauge("ollama_generations_active", "Generations holding a model slot.", scheduler.active)
+        registry.gauge("ollama_generations_waiting", "Generations queued for a model slot.", scheduler.depth)
+        registry.gauge("ollama_coalesced_requests_total",
+                       "Requests served by joining an identical generation already in flight.",
+                       lambda: sum(model["coalesced"] for model in scheduler.stats().values()),
+                       kind="counter")
+        registry.gauge("ollama_rejected_requests_total",
+                       "Requests turned away because their model's queue was full or the wait timed out.",
+                       lambda: sum(model["rejected"] + model["timed_out"] for model in scheduler.stats().values()),
+                       kind="counter")
+
+    def track_retriever(self, retriever) -> None:
+        """Record stage timings and call outcomes from a :class:`hybrid.HybridRetriever`."""
+        retriever.on_timing = lambda stage, seconds: self.stage_seconds.observe(seconds, stage=f"retrieve_{stage}")
+        retriever.on_outcome = lambda name, outcome: self.retriever_calls.inc(retriever=name, outcome=outcome)
+
+    def stage(self, name: str):
+        """Context manager timing one stage of a turn."""
+        return self.stage_seconds.time(stage=name)
+
+    def record_ollama(self, result: Dict) -> None:
+        """Record the timing fields of a final (``done``) Ollama chat response."""
+        # Ollama reports durations in nanoseconds
+        if "eval_duration" in result:
+            self.eval_seconds.observe(result["eval_duration"] / 1e9)
+        if "prompt_eval_duration" in result:
+            self.prompt_eval_seconds.observe(result["prompt_eval_duration"] / 1e9)
+        if "load_duration" in result:
+            self.load_seconds.observe(result["load_duration"] / 1e9)
+        if result.get("eval_count"):
+            self.eval_tokens.inc(result["eval_count"])
+        if result.get("prompt_eval_count"):
+            self.prompt_eval_tokens.inc(result["prompt_eval_count"])
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+__all__ = ["ChatMetrics", "Counter", "Gauge", "Histogram", "LATENCY_BUCKETS", "Registry"]
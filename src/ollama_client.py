@@ -0,0 +1,180 @@
+"""Pooled HTTP clients (sync and asyncio) for the Ollama REST API."""
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - optional dependency for the ASGI server
+    httpx = None
+
+Timeout = Union[float, Tuple[float, float]]
+
+
+class OllamaClient:
+    """Keep-alive connection pool shared by every call to one Ollama host.
+
+    A single ``requests.Session`` is mounted with an ``HTTPAdapter`` whose pool
+    holds up to ``pool_size`` connections, so status polls and chat turns
+    reuse TCP connections instead of opening a new one per request. The
+    session is safe to share across Flask worker threads.
+
+    Failed connections and 502/503/504 responses are retried ``retries``
+    times with exponential backoff. Read timeouts are never retried, because
+    that would start a second generation on the server.
+    """
+
+    def __init__(
+        self,
+        host: str = "http://localhost:11434",
+        pool_size: int = 10,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 60.0,
+        retries: int = 2,
+        backoff_factor: float = 0.5,
+    ) -> None:
+        self.host = host.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _timeout(self, timeout: Optional[Timeout]) -> Timeout:
+        if timeout is None:
+            return (self.connect_timeout, self.read_timeout)
+        if isinstance(timeout, tuple):
+            return timeout
+        return (self.connect_timeout, timeout)
+
+    def get(self, path: str, timeout: Optional[Timeout] = None) -> requests.Response:
+        """GET ``path``; a bare number as ``timeout`` sets only the read timeout."""
+        return self.session.get(f"{self.host}{path}", timeout=self._timeout(timeout))
+
+    def post(
+        self,
+        path: str,
+        json: Any = None,
+        stream: bool = False,
+        timeout: Optional[Timeout] = None,
+    ) -> requests.Response:
+        """POST a JSON body to ``path``; a bare number as ``timeout`` sets only the read timeout."""
+        return self.session.post(
+            f"{self.host}{path}", json=json, stream=stream, timeout=self._timeout(timeout)
+        )
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class OllamaBusyError(RuntimeError):
+    """Raised when the queue of requests waiting for a generation slot is full."""
+
+
+class AsyncOllamaClient:
+    """asyncio client for Ollama with bounded concurrency and a wait queue.
+
+    Backed by a pooled ``httpx.AsyncClient``, so hundreds of waiting chat
+    requests cost a coroutine each rather than a thread each. At most
+    ``max_concurrency`` generations run against Ollama at once; further
+    requests wait in FIFO order for a free slot. Once ``max_queue`` requests
+    are waiting, new ones fail fast with :class:`OllamaBusyError`. With
+    ``max_concurrency=None`` the client sets no limit of its own, for callers
+    that queue requests themselves (``dispatcher.FairScheduler``).
+    """
+
+    def __init__(
+        self,
+        host: str = "http://localhost:11434",
+        max_concurrency: Optional[int] = 4,
+        max_queue: int = 256,
+        pool_size: int = 10,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 60.0,
+    ) -> None:
+        if httpx is None:
+            raise RuntimeError("AsyncOllamaClient requires httpx (pip install httpx)")
+        self.host = host.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.waiting = 0
+        self.active = 0
+        self._slots = asyncio.Semaphore(max_concurrency) if max_concurrency is not None else None
+        self._client = httpx.AsyncClient(
+            base_url=self.host,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        )
+
+    async def _acquire(self) -> None:
+        if self._slots is None:
+            self.active += 1
+            return
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            raise OllamaBusyError(f"{self.waiting} requests already waiting for Ollama")
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def _release(self) -> None:
+        self.active -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    async def get(self, path: str, timeout: Optional[float] = None) -> "httpx.Response":
+        """GET ``path``; status probes do not take a generation slot."""
+        if timeout is None:
+            return await self._client.get(path)
+        return await self._client.get(path, timeout=timeout)
+
+    async def chat(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Non-streaming ``/api/chat`` call, run within a generation slot."""
+        await self._acquire()
+        try:
+            response = await self._client.post("/api/chat", json={**payload, "stream": False})
+        finally:
+            self._release()
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code} - {response.text}")
+        return response.json()
+
+    async def chat_stream(self, payload: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """Streaming ``/api/chat`` call yielding parsed NDJSON chunks, within a generation slot."""
+        await self._acquire()
+        try:
+            async with self._client.stream("POST", "/api/chat", json={**payload, "stream": True}) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    raise RuntimeError(f"HTTP {response.status_code} - {body.decode(errors='replace')}")
+                async for line in response.aiter_lines():
+                    if line:
+                        yield json.loads(line)
+        finally:
+            self._release()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+__all__ = ["AsyncOllamaClient", "OllamaBusyError", "OllamaClient"]
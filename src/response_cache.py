@@ -0,0 +1,134 @@
+"""LRU/TTL cache of model responses for repeated questions."""
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+_WORD_PATTERN = re.compile(r"[\w']+")
+
+
+def document_id(text: str) -> str:
+    """Stable identifier for a retrieved document, derived from its content."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Cache of LLM responses keyed on question, retrieved context and model.
+
+    The key combines the normalised question (lower-cased words), the model
+    name, and the content-derived IDs of the retrieved context documents. If
+    the corpus changes so that a question retrieves different documents, the
+    old entry is no longer reachable and ages out of the LRU. Conversation
+    history is deliberately not part of the key.
+
+    Entries live in memory with LRU eviction beyond ``max_entries`` and
+    expire ``ttl_seconds`` after they were stored. When ``path`` is given,
+    entries are also written through to a SQLite file, so a restarted server
+    starts warm. The file keeps the ``max_entries`` most recently stored
+    entries that have not expired, so it stays as bounded as memory.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600.0,
+                 path: Optional[str] = None) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, created REAL NOT NULL, response TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+            self._trim()
+            self._db.commit()
+
+    @staticmethod
+    def make_key(question: str, model: str, document_ids: Iterable[str]) -> str:
+        normalized = " ".join(_WORD_PATTERN.findall(question.lower()))
+        material = json.dumps([normalized, model, list(document_ids)])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT created, response FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1])
+                    self._store(key, entry)
+            if entry is None or now - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    self._forget(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, response: str) -> None:
+        entry = (time.time(), response)
+        with self._lock:
+            self._store(key, entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, created, response) VALUES (?, ?, ?)",
+                    (key, entry[0], response),
+                )
+                self._trim()
+                self._db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _store(self, key: str, entry: Tuple[float, str]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _trim(self) -> None:
+        """Delete expired rows and all but the newest ``max_entries`` from the file."""
+        self._db.execute(
+            "DELETE FROM responses WHERE created < ? OR key NOT IN "
+            "(SELECT key FROM responses ORDER BY created DESC, rowid DESC LIMIT ?)",
+            (time.time() - self.ttl_seconds, self.max_entries),
+        )
+
+    def _forget(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+
+
+__all__ = ["ResponseCache", "document_id"]
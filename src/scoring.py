@@ -0,0 +1,264 @@
+"""Pluggable ranking functions for ``SimpleVectorStore``.
+
+The store's built-in ranking is TF-IDF cosine similarity. A :class:`Scorer`
+replaces it with another function of the same postings; :class:`Bm25Scorer`
+implements Okapi BM25 and BM25+ with MaxScore early termination.
+"""
+from __future__ import annotations
+
+import heapq
+import math
+from array import array
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:  # pragma: no cover
+    from segments import Snapshot
+
+Postings = Sequence[Tuple[int, float]]
+
+
+def _columns(postings: Postings) -> Tuple[Sequence[int], Sequence[float]]:
+    """Doc ids and term frequencies of ``postings`` as two sequences."""
+    doc_ids = getattr(postings, "doc_ids", None)
+    if doc_ids is not None:
+        return doc_ids, postings.tfs
+    return [doc_id for doc_id, _ in postings], [tf for _, tf in postings]
+
+
+class Scorer:
+    """Ranks documents for a bag of query terms.
+
+    ``prepare`` derives the corpus statistics a scorer needs from a
+    :class:`~segments.Snapshot`. The store computes them once per snapshot,
+    caches them there and passes them back to ``top_k``, so a scorer
+    instance holds no corpus state and can serve concurrent searches.
+
+    ``top_k`` ranks the rows of one segment (``segment`` is its position in
+    ``stats.snapshot.segments`` for the default ``prepare``). It receives
+    the query's term counts (in query order) and, for each term the segment
+    knows, its postings restricted to the candidate rows (``full_postings``
+    holds the unrestricted lists when a filter applies). Unfiltered postings
+    may still hold deleted rows, flagged in the segment's ``dead``. It
+    returns ``(row, score)`` pairs, best first, ties by row.
+    """
+
+    name = "custom"
+
+    def prepare(self, snapshot: "Snapshot") -> Any:
+        """Corpus statistics for ``snapshot``; by default only ``stats.snapshot``."""
+        return _Stats(snapshot)
+
+    def top_k(self, stats: Any, segment: int, query_terms: Dict[str, int],
+              postings: Dict[str, Postings], top_k: int,
+              full_postings: Optional[Dict[str, Postings]] = None) -> List[Tuple[int, float]]:
+        raise NotImplementedError
+
+
+class _Stats:
+    __slots__ = ("snapshot",)
+
+    def __init__(self, snapshot: "Snapshot") -> None:
+        self.snapshot = snapshot
+
+
+class _Bm25Stats(_Stats):
+    """Per-snapshot BM25 state: lengths and normalisers by segment, and term bounds."""
+
+    __slots__ = ("n_docs", "lengths", "normalizers", "terms")
+
+    def __init__(self, snapshot: "Snapshot") -> None:
+        super().__init__(snapshot)
+        self.n_docs = snapshot.document_count
+        self.lengths = [segment.document_lengths() for segment in snapshot.segments]
+        self.normalizers: List[array] = []
+        # (segment, term) -> (idf, maximum contribution in that segment)
+        self.terms: Dict[Tuple[int, str], Tuple[float, float]] = {}
+
+
+class Bm25Scorer(Scorer):
+    """Okapi BM25, or BM25+ when ``delta`` > 0.
+
+    ``prepare`` collects each segment's document lengths and computes their
+    length normalisers from the average length of the live documents. IDF
+    and the per-segment maximum contribution of a term are computed on
+    first use and cached with the other statistics of the snapshot.
+
+    Top-k uses MaxScore: query terms are ordered by their maximum possible
+    contribution, and terms whose combined maximum cannot lift a document
+    above the current k-th score are only probed (by binary search) for
+    documents found through the other terms. Results are identical to
+    scoring every matching document.
+    """
+
+    # Below this many postings an exhaustive pass is cheaper than MaxScore's bookkeeping
+    EXHAUSTIVE_POSTINGS = 2048
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, delta: float = 0.0) -> None:
+        self.k1 = k1
+        self.b = b
+        self.delta = delta
+        self.name = "bm25+" if delta else "bm25"
+
+    def prepare(self, snapshot: "Snapshot") -> _Bm25Stats:
+        stats = _Bm25Stats(snapshot)
+        total = 0
+        for segment, lengths in zip(snapshot.segments, stats.lengths):
+            total += sum(lengths)
+            if segment.dead_rows:
+                total -= sum(length for length, dead in zip(lengths, segment.dead) if dead)
+        average = (total / stats.n_docs) if stats.n_docs else 1.0
+        scale = self.k1 * self.b / (average or 1.0)
+        base = self.k1 * (1.0 - self.b)
+        stats.normalizers = [array("d", (base + scale * length for length in lengths))
+                             for lengths in stats.lengths]
+        return stats
+
+    def _idf(self, n_docs: int, doc_freq: int) -> float:
+        return math.log(1.0 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def _impact(self, idf: float, tf: float, length: int, normalizer: float) -> float:
+        # Postings store count / length; recover the raw count
+        count = round(tf * length)
+        return idf * (count * (self.k1 + 1.0) / (count + normalizer) + self.delta)
+
+    def _stats(self, stats: _Bm25Stats, segment: int, term: str, postings: Postings) -> Tuple[float, float]:
+        """``(idf, maximum contribution)`` of a term over a segment's full postings."""
+        key = (segment, term)
+        cached = stats.terms.get(key)
+        if cached is None:
+            idf = self._idf(stats.n_docs, stats.snapshot.document_frequency(term))
+            lengths, normalizers = stats.lengths[segment], stats.normalizers[segment]
+            upper = max((self._impact(idf, tf, lengths[row], normalizers[row]) for row, tf in postings),
+                        default=0.0)
+            cached = stats.terms[key] = (idf, upper)
+        return cached
+
+    def top_k(self, stats: _Bm25Stats, segment: int, query_terms: Dict[str, int],
+              postings: Dict[str, Postings], top_k: int,
+              full_postings: Optional[Dict[str, Postings]] = None) -> List[Tuple[int, float]]:
+        terms = [term for term in query_terms if postings.get(term)]
+        if not terms or top_k <= 0:
+            return []
+        full_postings = full_postings or postings
+        weights = {}
+        for term in terms:
+            idf, upper = self._stats(stats, segment, term, full_postings[term])
+            weights[term] = (query_terms[term] * idf, query_terms[term] * upper)
+
+        ranked = stats.snapshot.segments[segment]
+        deleted = ranked.dead if ranked.dead_rows else None
+        columns = (stats.lengths[segment], stats.normalizers[segment], deleted)
+        if sum(len(postings[term]) for term in terms) <= self.EXHAUSTIVE_POSTINGS:
+            return self._exhaustive(terms, weights, postings, top_k, *columns)
+        return self._max_score(terms, weights, postings, top_k, *columns)
+
+    def _score(self, contributions: Dict[str, float], terms: Sequence[str]) -> float:
+        # Sum in query order, so every strategy produces bit-identical scores
+        return sum(contributions[term] for term in terms if term in contributions)
+
+    def _exhaustive(self, terms: Sequence[str], weights: Dict[str, Tuple[float, float]],
+                    postings: Dict[str, Postings], top_k: int, lengths: Sequence[int],
+                    normalizers: Sequence[float], deleted: Optional[bytearray]) -> List[Tuple[int, float]]:
+        contributions: Dict[int, Dict[str, float]] = {}
+        for term in terms:
+            weight = weights[term][0]
+            for doc_id, tf in postings[term]:
+                if deleted is not None and deleted[doc_id]:
+                    continue
+                contributions.setdefault(doc_id, {})[term] = self._impact(
+                    weight, tf, lengths[doc_id], normalizers[doc_id])
+        scored = (
+            (self._score(parts, terms), -doc_id) for doc_id, parts in contributions.items()
+        )
+        return [(-neg_id, score) for score, neg_id in heapq.nlargest(top_k, scored) if score > 0]
+
+    def _max_score(self, terms: Sequence[str], weights: Dict[str, Tuple[float, float]],
+                   postings: Dict[str, Postings], top_k: int, lengths: Sequence[int],
+                   normalizers: Sequence[float], deleted: Optional[bytearray]) -> List[Tuple[int, float]]:
+        order = sorted(terms, key=lambda term: weights[term][1])
+        columns = [_columns(postings[term]) for term in order]
+        ids = [doc_ids for doc_ids, _ in columns]
+        tfs = [term_tfs for _, term_tfs in columns]
+        bounds = [weights[term][1] for term in order]
+        # prefix[i]: the most terms 0..i can add to any document
+        prefix = [sum(bounds[:i + 1]) for i in range(len(order))]
+        cursors = [0] * len(order)
+        heap: List[Tuple[float, int]] = []
+        threshold = 0.0
+        essential = 0
+
+        while True:
+            # Terms before ``essential`` cannot reach the threshold on their own
+            candidate = None
+            for i in range(essential, len(order)):
+                if cursors[i] < len(ids[i]):
+                    doc_id = ids[i][cursors[i]]
+                    if candidate is None or doc_id < candidate:
+                        candidate = doc_id
+            if candidate is None:
+                break
+
+            contributions: Dict[str, float] = {}
+            partial = 0.0
+            for i in range(essential, len(order)):
+                doc_ids = ids[i]
+                if cursors[i] < len(doc_ids) and doc_ids[cursors[i]] == candidate:
+                    value = self._impact(weights[order[i]][0], tfs[i][cursors[i]],
+                                         lengths[candidate], normalizers[candidate])
+                    contributions[order[i]] = value
+                    partial += value
+                    cursors[i] += 1
+            if deleted is not None and deleted[candidate]:
+                continue
+
+            pruned = False
+            for i in range(essential - 1, -1, -1):
+                if len(heap) == top_k and (partial + prefix[i]) * (1 + 1e-9) <= threshold:
+                    pruned = True
+                    break
+                doc_ids = ids[i]
+                position = bisect_left(doc_ids, candidate, cursors[i])
+                cursors[i] = position
+                if position < len(doc_ids) and doc_ids[position] == candidate:
+                    value = self._impact(weights[order[i]][0], tfs[i][position],
+                                         lengths[candidate], normalizers[candidate])
+                    contributions[order[i]] = value
+                    partial += value
+            if pruned:
+                continue
+
+            score = self._score(contributions, terms)
+            if score <= 0:
+                continue
+            if len(heap) < top_k:
+                heapq.heappush(heap, (score, -candidate))
+            elif score > threshold:
+                heapq.heapreplace(heap, (score, -candidate))
+            else:
+                continue
+            if len(heap) == top_k:
+                threshold = heap[0][0]
+                while essential < len(order) and prefix[essential] * (1 + 1e-9) <= threshold:
+                    essential += 1
+
+        return [(-neg_id, score) for score, neg_id in sorted(heap, reverse=True)]
+
+
+SCORERS: Dict[str, Callable[[], Optional[Scorer]]] = {
+    "tfidf": lambda: None,
+    "bm25": Bm25Scorer,
+    "bm25+": lambda: Bm25Scorer(delta=1.0),
+}
+
+
+def make_scorer(scorer) -> Optional[Scorer]:
+    """Resolve a scorer name or instance; ``None`` means the built-in TF-IDF cosine."""
+    if scorer is None or isinstance(scorer, Scorer):
+        return scorer
+    if scorer not in SCORERS:
+        raise ValueError(f"Unknown scorer {scorer!r}; expected one of {tuple(SCORERS)}")
+    return SCORERS[scorer]()
+
+
+__all__ = ["Bm25Scorer", "SCORERS", "Scorer", "make_scorer"]
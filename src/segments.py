@@ -0,0 +1,388 @@
+"""Immutable index segments and the snapshots that publish them.
+
+``SimpleVectorStore`` keeps its index as a list of :class:`Segment`
+objects. Each segment covers a run of documents with its own vocabulary,
+postings (numbered by local row), document lengths and tombstones. A
+:class:`Snapshot` ties the segments together, in document order, with the
+doc id map and a generation number.
+
+Nothing published is modified afterwards. Writers add documents in a new
+segment built off to the side, delete by copying a segment's tombstones,
+and merge by writing one segment in place of several. Each change then
+swaps in a new snapshot with a single assignment. A search that picked up
+a snapshot therefore sees one consistent index for its whole duration,
+without taking a lock.
+
+Statistics that depend on the whole corpus (IDF, norms, BM25 length
+normalisers) are derived at most once per snapshot and cached on it.
+"""
+from __future__ import annotations
+
+import itertools
+import math
+import re
+import sys
+import threading
+from array import array
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from facets import FacetIndex, SearchFilter
+from vocabulary import TermPostings
+
+_TOKEN_PATTERN = re.compile(r"[\w']+")
+
+
+def _tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class Segment:
+    """A run of documents indexed on their own, numbered by local row.
+
+    While a writer builds it, ``append`` and ``merge_shard`` add documents.
+    Once published in a snapshot it is read-only: deletes return a copy with
+    more tombstones (see ``with_deleted``) and ``merge`` writes a new segment.
+    Copies that keep the rows keep the ``uid`` the doc id map refers to.
+    """
+
+    __slots__ = ("uid", "documents", "postings", "lengths", "doc_indptr", "doc_terms", "doc_counts",
+                 "row_ids", "dead", "dead_rows", "dead_df", "facets")
+
+    _uids = itertools.count(1)
+
+    def __init__(self, keep_counts: bool = True) -> None:
+        self.uid = next(Segment._uids)
+        self.documents: Sequence[str] = []
+        # term -> [(row, term frequency)]; a term's document frequency is the
+        # length of its postings, less the deleted rows counted in ``dead_df``
+        self.postings = TermPostings()
+        # Token count per row
+        self.lengths: Sequence[int] = array("l")
+        # Raw term counts, one CSR row of (term id, count) per document, unless dropped
+        self.doc_indptr: Optional[array] = array("l", [0]) if keep_counts else None
+        self.doc_terms: Optional[array] = array("i") if keep_counts else None
+        self.doc_counts: Optional[array] = array("i") if keep_counts else None
+        self.row_ids = array("i")
+        self.dead = bytearray()
+        self.dead_rows = 0
+        self.dead_df = array("i")
+        # Speaker, timestamp and mention lookups by row, built as rows are added
+        self.facets = FacetIndex()
+
+    @classmethod
+    def mapped(cls, index) -> "Segment":
+        """Read-only segment over a :class:`~index_file.MappedIndex`."""
+        segment = cls(keep_counts=False)
+        segment.documents = index.documents
+        segment.postings = index.postings
+        segment.lengths = index.doc_lengths
+        segment.row_ids = array("i", range(len(index.documents)))
+        segment.dead = bytearray(len(index.documents))
+        segment.facets = index.facets
+        return segment
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @property
+    def live(self) -> int:
+        return len(self.documents) - self.dead_rows
+
+    @property
+    def keep_counts(self) -> bool:
+        return self.doc_indptr is not None
+
+    def append(self, doc: str, tokens: List[str], doc_id: int) -> int:
+        """Index one document as the next row and return the row."""
+        postings = self.postings
+        lists = postings.lists
+        counts = Counter(tokens)
+        row = len(self.documents)
+        length = len(tokens)
+        self.documents.append(doc)
+        self.lengths.append(length)
+        self.row_ids.append(doc_id)
+        self.dead.append(0)
+        self.facets.add(doc)
+        term_ids = [postings.intern(term) for term in counts]
+        for term_id, count in zip(term_ids, counts.values()):
+            lists[term_id].append(row, count / length)
+        if self.doc_indptr is not None:
+            self.doc_terms.extend(term_ids)
+            self.doc_counts.extend(counts.values())
+            self.doc_indptr.append(len(self.doc_terms))
+        return row
+
+    def merge_shard(self, docs: Sequence[str], first_id: int, kept: array, terms: List[str],
+                    doc_indptr: array, doc_terms: array, doc_counts: array, post_indptr: array,
+                    post_docs: array, post_tfs: array, facets: FacetIndex) -> List[Optional[int]]:
+        """Append a shard counted by ``vector_store._count_shard``.
+
+        Shards merged in order match a serial build. Returns the doc id of
+        each document in ``docs`` (numbered from ``first_id``), or None for
+        documents without tokens.
+        """
+        offset = len(self.documents)
+        doc_ids: List[Optional[int]] = [None] * len(docs)
+        # Shard-local term ids -> segment ids, interned in the shard's first-appearance order
+        term_ids = [self.postings.intern(term) for term in terms]
+        for local_id, position in enumerate(kept):
+            self.documents.append(docs[position])
+            self.lengths.append(sum(doc_counts[doc_indptr[local_id]:doc_indptr[local_id + 1]]))
+            doc_ids[position] = first_id + local_id
+        self.row_ids.extend(range(first_id, first_id + len(kept)))
+        self.dead.extend(bytes(len(kept)))
+        self.facets.extend(facets)
+        if self.doc_indptr is not None:
+            base = self.doc_indptr[-1]
+            self.doc_terms.extend(map(term_ids.__getitem__, doc_terms))
+            self.doc_counts.extend(doc_counts)
+            self.doc_indptr.extend(base + end for end in doc_indptr[1:])
+
+        rows = array("i", [row + offset for row in post_docs]) if offset else post_docs
+        lists = self.postings.lists
+        for local_id, term_id in enumerate(term_ids):
+            start, end = post_indptr[local_id], post_indptr[local_id + 1]
+            lists[term_id].extend(rows[start:end], post_tfs[start:end])
+        return doc_ids
+
+    def _copy(self) -> "Segment":
+        copy = Segment.__new__(Segment)
+        for name in Segment.__slots__:
+            setattr(copy, name, getattr(self, name))
+        return copy
+
+    def with_deleted(self, rows: Iterable[int]) -> "Segment":
+        """Copy of the segment with tombstones on ``rows`` as well."""
+        copy = self._copy()
+        copy.dead = bytearray(self.dead)
+        copy.dead_df = array("i", self.dead_df)
+        if len(copy.dead_df) < len(self.postings):
+            copy.dead_df.extend(itertools.repeat(0, len(self.postings) - len(copy.dead_df)))
+        for row in rows:
+            if copy.dead[row]:
+                continue
+            for term_id in self.term_ids(row):
+                copy.dead_df[term_id] += 1
+            copy.dead[row] = 1
+            copy.dead_rows += 1
+        return copy
+
+    def without_counts(self) -> "Segment":
+        """Copy of the segment without the per-document term counts."""
+        copy = self._copy()
+        copy.doc_indptr = copy.doc_terms = copy.doc_counts = None
+        return copy
+
+    def term_ids(self, row: int) -> Sequence[int]:
+        """Ids of the distinct terms of ``row``."""
+        if self.doc_indptr is not None:
+            return self.doc_terms[self.doc_indptr[row]:self.doc_indptr[row + 1]]
+        ids = self.postings.vocabulary.ids
+        return [ids[term] for term in dict.fromkeys(_tokenize(self.documents[row]))]
+
+    def doc_freq(self, term: str) -> int:
+        """Number of live rows containing ``term``."""
+        postings = self.postings.get(term)
+        if not postings:
+            return 0
+        if not self.dead_rows:
+            return len(postings)
+        term_id = self.postings.vocabulary.ids[term]
+        return len(postings) - (self.dead_df[term_id] if term_id < len(self.dead_df) else 0)
+
+    def doc_freqs(self) -> Iterator[int]:
+        """Live document frequency of every term, by term id."""
+        dead_df = itertools.chain(self.dead_df, itertools.repeat(0))
+        return (len(postings) - dead for postings, dead in zip(self.postings.lists, dead_df))
+
+    def document_lengths(self) -> Sequence[int]:
+        """Token counts by row, deleted rows included."""
+        return self.lengths
+
+    def norms(self, idf: Sequence[float]) -> array:
+        """TF-IDF norm of every row for ``idf`` (indexed by term id)."""
+        if self.doc_indptr is None:
+            # Accumulate term-at-a-time from the postings
+            squares = [0.0] * len(self.documents)
+            for postings, term_idf in zip(self.postings.lists, idf):
+                for row, tf in postings:
+                    weight = tf * term_idf
+                    squares[row] += weight * weight
+            return array("d", (math.sqrt(total) or 1.0 for total in squares))
+
+        norms = array("d")
+        indptr, doc_terms, doc_counts = self.doc_indptr, self.doc_terms, self.doc_counts
+        for row, length in enumerate(self.lengths):
+            start, end = indptr[row], indptr[row + 1]
+            weights = [(count / length) * idf[term_id]
+                       for term_id, count in zip(doc_terms[start:end], doc_counts[start:end])]
+            norms.append(math.sqrt(sum(value * value for value in weights)) or 1.0)
+        return norms
+
+    def select(self, search_filter: SearchFilter) -> List[int]:
+        """Sorted live rows matching ``search_filter``."""
+        rows = self.facets.select(search_filter)
+        if self.dead_rows:
+            dead = self.dead
+            rows = [row for row in rows if not dead[row]]
+        return rows
+
+    @classmethod
+    def merge(cls, segments: Sequence["Segment"], keep_counts: bool) -> "Segment":
+        """One segment holding the live rows of ``segments``, in order.
+
+        Terms that only deleted rows used are dropped. Postings and facets
+        are copied with their rows renumbered, which keeps them sorted.
+        """
+        merged = cls(keep_counts=keep_counts)
+        postings = merged.postings
+        lists = postings.lists
+        documents: List[str] = []
+        for segment in segments:
+            dead = segment.dead
+            offset = len(documents)
+            if segment.dead_rows:
+                keep = [row for row, flag in enumerate(dead) if not flag]
+                documents.extend(map(segment.documents.__getitem__, keep))
+                merged.lengths.extend(map(segment.lengths.__getitem__, keep))
+                merged.row_ids.extend(map(segment.row_ids.__getitem__, keep))
+                merged.facets.extend(segment.facets, keep)
+                # Old row -> merged row
+                remap = array("i", [0]) * len(segment)
+                for new_row, row in enumerate(keep, offset):
+                    remap[row] = new_row
+            else:
+                documents.extend(segment.documents)
+                merged.lengths.extend(segment.lengths)
+                merged.row_ids.extend(segment.row_ids)
+                merged.facets.extend(segment.facets)
+
+            term_map = array("i", [0]) * len(segment.postings)
+            source = segment.postings
+            for term_id, (term, plist, doc_freq) in enumerate(
+                    zip(source.vocabulary.terms, source.lists, segment.doc_freqs())):
+                if not doc_freq:
+                    continue  # only deleted rows use this term
+                new_id = term_map[term_id] = postings.intern(term)
+                target = lists[new_id]
+                if doc_freq != len(plist):
+                    for row, tf in plist:
+                        if not dead[row]:
+                            target.append(remap[row], tf)
+                elif segment.dead_rows:
+                    target.extend(map(remap.__getitem__, plist.doc_ids), plist.tfs)
+                elif offset:
+                    target.extend(map(offset.__add__, plist.doc_ids), plist.tfs)
+                else:
+                    target.extend(plist.doc_ids, plist.tfs)
+
+            if not keep_counts:
+                continue
+            indptr, doc_terms, doc_counts = segment.doc_indptr, segment.doc_terms, segment.doc_counts
+            if not segment.dead_rows:
+                base = merged.doc_indptr[-1]
+                merged.doc_terms.extend(map(term_map.__getitem__, doc_terms))
+                merged.doc_counts.extend(doc_counts)
+                merged.doc_indptr.extend(map(base.__add__, indptr[1:]))
+                continue
+            for row in keep:
+                start, end = indptr[row], indptr[row + 1]
+                merged.doc_terms.extend(map(term_map.__getitem__, doc_terms[start:end]))
+                merged.doc_counts.extend(doc_counts[start:end])
+                merged.doc_indptr.append(len(merged.doc_terms))
+        merged.documents = documents
+        merged.dead = bytearray(len(documents))
+        return merged
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Approximate bytes held by each part of the segment."""
+        counts = (self.doc_indptr, self.doc_terms, self.doc_counts) if self.doc_indptr is not None else ()
+        return {
+            "documents": sys.getsizeof(self.documents) + sum(map(sys.getsizeof, self.documents)),
+            "vocabulary": self.postings.vocabulary.nbytes(),
+            "postings": self.postings.nbytes(),
+            "doc_lengths": sys.getsizeof(self.lengths),
+            "doc_counts": sum(map(sys.getsizeof, counts)),
+            "doc_ids": sys.getsizeof(self.row_ids),
+            "tombstones": sys.getsizeof(self.dead) + sys.getsizeof(self.dead_df),
+        }
+
+
+class Snapshot:
+    """The index at one point in time: segments in document order and the doc id map.
+
+    ``locations`` maps a doc id to ``uid << 32 | row`` of its live row, or
+    -1 once it is deleted. ``cache`` holds statistics derived from this
+    snapshot; entries are computed at most once each (see :meth:`derived`)
+    and never change.
+    """
+
+    __slots__ = ("segments", "locations", "generation", "cache", "_positions", "_derive_lock")
+
+    def __init__(self, segments: Sequence[Segment] = (), locations: Optional[array] = None,
+                 generation: int = 0) -> None:
+        self.segments: Tuple[Segment, ...] = tuple(segments)
+        self.locations = locations if locations is not None else array("q")
+        self.generation = generation
+        self.cache: Dict[Any, Any] = {}
+        self._positions = {segment.uid: position for position, segment in enumerate(self.segments)}
+        self._derive_lock = threading.Lock()
+
+    @property
+    def document_count(self) -> int:
+        return sum(segment.live for segment in self.segments)
+
+    @property
+    def deleted_rows(self) -> int:
+        return sum(segment.dead_rows for segment in self.segments)
+
+    def documents(self) -> Sequence[str]:
+        """Texts of the live documents, in order."""
+        if len(self.segments) == 1 and not self.segments[0].dead_rows:
+            return self.segments[0].documents
+        return [
+            doc for segment in self.segments
+            for doc, dead in zip(segment.documents, segment.dead) if not dead
+        ]
+
+    def items(self) -> List[Tuple[int, str]]:
+        """``(doc_id, text)`` of the live documents, in order."""
+        return [
+            (doc_id, doc) for segment in self.segments
+            for doc_id, doc, dead in zip(segment.row_ids, segment.documents, segment.dead) if not dead
+        ]
+
+    def locate(self, doc_id: int) -> Tuple[int, int]:
+        """``(segment position, row)`` of a live document; raises KeyError if there is none."""
+        location = self.locations[doc_id] if 0 <= doc_id < len(self.locations) else -1
+        if location < 0:
+            raise KeyError(f"No document with id {doc_id}")
+        return self._positions[location >> 32], location & 0xFFFFFFFF
+
+    def document_frequency(self, term: str) -> int:
+        """Number of live documents containing ``term``."""
+        return sum(segment.doc_freq(term) for segment in self.segments)
+
+    def derived(self, key: Any, build: Callable[[Snapshot], Any]) -> Any:
+        """Cached ``build(self)`` under ``key``.
+
+        Searches that find the entry missing wait for a single build rather
+        than each repeating it; once cached, lookups take no lock.
+        """
+        value = self.cache.get(key)
+        if value is None:
+            with self._derive_lock:
+                value = self.cache.get(key)
+                if value is None:
+                    value = self.cache[key] = build(self)
+        return value
+
+
+def location(segment: Segment, row: int) -> int:
+    """Doc id map entry for ``row`` of ``segment``."""
+    return segment.uid << 32 | row
+
+
+__all__ = ["Segment", "Snapshot", "location"]
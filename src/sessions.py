@@ -0,0 +1,107 @@
+"""Per-client conversation state for the web server."""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+class ChatSession:
+    """Conversation history for one browser session."""
+
+    __slots__ = ("session_id", "history", "lock", "last_seen", "size")
+
+    def __init__(self, session_id: str) -> None:
+        self.session_id = session_id
+        self.history: List[Dict[str, str]] = []
+        # Serialises turns of the same session so its history is never interleaved
+        self.lock = threading.Lock()
+        self.last_seen = time.monotonic()
+        self.size = 0
+
+
+class SessionStore:
+    """Thread-safe session map with LRU, idle-TTL and memory-cap eviction.
+
+    Sessions are kept in least-recently-used order. Expired sessions are
+    dropped from the front whenever the store is touched. The oldest sessions
+    are also evicted when either ``max_sessions`` or the total history size
+    (``max_chars`` characters of message content) would be exceeded.
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: float = 3600.0,
+                 max_chars: int = 20_000_000) -> None:
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_chars = max_chars
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._total_chars = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> ChatSession:
+        """Return the session for ``session_id``, creating it if needed."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = ChatSession(session_id)
+                self._sessions[session_id] = session
+                self._evict_over_capacity(keep=session_id)
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_seen = now
+            return session
+
+    def update(self, session: ChatSession) -> None:
+        """Re-account a session's memory after its history changed."""
+        size = sum(len(message["content"]) for message in session.history)
+        with self._lock:
+            if self._sessions.get(session.session_id) is not session:
+                return
+            self._total_chars += size - session.size
+            session.size = size
+            self._evict_over_capacity(keep=session.session_id)
+
+    def clear(self, session_id: str) -> None:
+        """Forget a session's history."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._total_chars -= session.size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "history_chars": self._total_chars,
+                "evictions": self.evictions,
+            }
+
+    def _drop_oldest(self) -> None:
+        _, session = self._sessions.popitem(last=False)
+        self._total_chars -= session.size
+        self.evictions += 1
+
+    def _evict_expired(self, now: float) -> None:
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_seen <= self.ttl_seconds:
+                break
+            self._drop_oldest()
+
+    def _evict_over_capacity(self, keep: Optional[str] = None) -> None:
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self._total_chars > self.max_chars
+        ):
+            if next(iter(self._sessions)) == keep:
+                self._sessions.move_to_end(keep)
+            self._drop_oldest()
+
+
+__all__ = ["ChatSession", "SessionStore"]
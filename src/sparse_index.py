@@ -0,0 +1,184 @@
+"""Compressed sparse row (CSR) TF-IDF matrix used by the NumPy store backend."""
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+try:
+    from scipy import sparse
+except ImportError:  # pragma: no cover - optional dependency
+    sparse = None
+
+NUMPY_AVAILABLE = np is not None
+
+
+class CsrIndex:
+    """Corpus stored as a vocabulary map plus a CSR matrix of unit-length rows.
+
+    Row ``i`` holds the L2-normalised TF-IDF weights of document ``i``, so the
+    cosine score of every document against a normalised query is a single
+    sparse matrix-vector product. SciPy is used for the product when it is
+    installed; otherwise the same product is evaluated with ``np.add.reduceat``.
+    """
+
+    def __init__(self, vocabulary: Dict[str, int], indptr, indices, data) -> None:
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self._matrix = None
+        if sparse is not None:
+            self._matrix = sparse.csr_matrix(
+                (data, indices, indptr), shape=(self.n_docs, len(vocabulary))
+            )
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return self.indptr.nbytes + self.indices.nbytes + self.data.nbytes
+
+    @classmethod
+    def from_postings(
+        cls,
+        postings: Dict[str, List[Tuple[int, float]]],
+        idf: Dict[str, float],
+        n_docs: int,
+    ) -> "CsrIndex":
+        """Build the matrix from term -> [(doc id, term frequency)] postings."""
+        vocabulary: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        values: List[float] = []
+        for term, entries in postings.items():
+            col = vocabulary.setdefault(term, len(vocabulary))
+            term_idf = idf[term]
+            for doc_id, tf in entries:
+                rows.append(doc_id)
+                cols.append(col)
+                values.append(tf * term_idf)
+
+        row_ids = np.asarray(rows, dtype=np.int64)
+        data = np.asarray(values, dtype=np.float64)
+        norms = np.sqrt(np.bincount(row_ids, weights=data * data, minlength=n_docs))
+        norms[norms == 0] = 1.0
+        data /= norms[row_ids]
+
+        order = np.argsort(row_ids, kind="stable")
+        indptr = np.zeros(n_docs + 1, dtype=np.int64)
+        np.cumsum(np.bincount(row_ids, minlength=n_docs), out=indptr[1:])
+        indices = np.asarray(cols, dtype=np.int32)[order]
+        return cls(vocabulary, indptr, indices, data[order])
+
+    def query_vector(self, q_vec: Dict[str, float], q_norm: float):
+        """Dense, normalised query vector over the vocabulary, or ``None`` if no term is known."""
+        vector = np.zeros(len(self.vocabulary), dtype=np.float64)
+        found = False
+        for term, weight in q_vec.items():
+            col = self.vocabulary.get(term)
+            if col is not None:
+                vector[col] = weight / q_norm
+                found = True
+        return vector if found else None
+
+    def scores(self, vector):
+        """Cosine score of every document against one normalised query vector."""
+        if self._matrix is not None:
+            return self._matrix @ vector
+        return np.add.reduceat(self.data * vector[self.indices], self.indptr[:-1])
+
+    def score_batch(self, queries: Sequence[Tuple[Dict[str, float], float]], rows: Optional[Sequence[int]] = None):
+        """Score ``(q_vec, q_norm)`` queries together.
+
+        Returns one ``(doc_ids, scores)`` pair per query, holding only the
+        documents that share a term with it. With SciPy the whole batch is a
+        single sparse matrix-matrix product. ``rows`` (sorted doc ids)
+        restricts scoring to those documents; with SciPy only their rows
+        take part in the product (without SciPy, all rows are scored and
+        the rest dropped).
+        """
+        if self._matrix is None:
+            batch = self._score_batch_dense(queries)
+            if rows is None:
+                return batch
+            keep = np.asarray(rows, dtype=np.int64)
+            restricted = []
+            for doc_ids, scores in batch:
+                mask = np.isin(doc_ids, keep, assume_unique=True)
+                restricted.append((doc_ids[mask], scores[mask]))
+            return restricted
+
+        rows = None if rows is None else np.asarray(rows, dtype=np.int64)
+        matrix = self._matrix if rows is None else self._matrix[rows]
+        query_matrix = self._query_matrix(queries)
+        product = (matrix @ query_matrix).tocsc()
+        batch = []
+        for col in range(len(queries)):
+            doc_ids = product.indices[product.indptr[col]:product.indptr[col + 1]]
+            scores = product.data[product.indptr[col]:product.indptr[col + 1]]
+            if rows is not None:
+                doc_ids = rows[doc_ids]
+            batch.append((doc_ids, scores))
+        return batch
+
+    def _score_batch_dense(self, queries: Sequence[Tuple[Dict[str, float], float]]):
+        batch = []
+        for q_vec, q_norm in queries:
+            vector = self.query_vector(q_vec, q_norm)
+            if vector is None:
+                batch.append((np.empty(0, dtype=np.int64), np.empty(0)))
+                continue
+            scores = self.scores(vector)
+            doc_ids = np.flatnonzero(scores)
+            batch.append((doc_ids, scores[doc_ids]))
+        return batch
+
+    def _query_matrix(self, queries: Sequence[Tuple[Dict[str, float], float]]):
+        """Normalised queries as the columns of a sparse (vocabulary x queries) matrix."""
+        rows: List[int] = []
+        values: List[float] = []
+        indptr = [0]
+        for q_vec, q_norm in queries:
+            for term, weight in q_vec.items():
+                col = self.vocabulary.get(term)
+                if col is not None:
+                    rows.append(col)
+                    values.append(weight / q_norm)
+            indptr.append(len(rows))
+        return sparse.csc_matrix(
+            (values, rows, indptr), shape=(len(self.vocabulary), len(queries))
+        )
+
+
+def top_k_indices(scores, top_k: int, doc_ids=None, exclude=None) -> Sequence[Tuple[int, float]]:
+    """Highest positive scores as ``(doc id, score)``, ties broken by doc id.
+
+    ``scores`` is indexed by doc id unless ``doc_ids`` gives the id of each entry.
+    Doc ids flagged non-zero in the ``exclude`` byte buffer are skipped.
+    """
+    if top_k <= 0:
+        return []
+    positive = scores > 0
+    if exclude is not None:
+        flags = np.frombuffer(exclude, dtype=np.uint8)
+        ids = np.arange(len(scores)) if doc_ids is None else doc_ids
+        positive &= flags[ids] == 0
+    candidates = np.flatnonzero(positive) if doc_ids is None else doc_ids[positive]
+    candidate_scores = scores[positive]
+    if len(candidates) > top_k:
+        # Keep everything tied with the k-th best so tie-breaking stays by doc id.
+        kth = np.partition(candidate_scores, len(candidates) - top_k)[len(candidates) - top_k]
+        keep = candidate_scores >= kth
+        candidates = candidates[keep]
+        candidate_scores = candidate_scores[keep]
+    order = np.lexsort((candidates, -candidate_scores))[:top_k]
+    return [(int(candidates[i]), float(candidate_scores[i])) for i in order]
+
+
+__all__ = ["CsrIndex", "NUMPY_AVAILABLE", "top_k_indices"]
@@ -0,0 +1,203 @@
+"""Background startup of the shared chatbot for the web servers.
+
+Loading the index, starting Ollama and pulling the model can take from
+seconds to many minutes. :class:`StartupPipeline` runs these steps in a
+daemon thread as soon as the server boots, so requests never wait on them.
+``status()`` reports progress for ``/api/status``. Once the index is ready,
+callers can serve retrieval-only answers until ``model_ready`` is set.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from chatbot import LocalChatbot
+
+STEPS = ("index", "ollama", "model", "warm", "embed")
+# Overall state and progress message while each step is unfinished
+PENDING_STATES = {
+    "index": ("indexing", "Loading the conversation index"),
+    "ollama": ("waiting_for_ollama", "Waiting for the Ollama server"),
+    "model": ("pulling_model", "Downloading the model"),
+    "warm": ("loading_model", "Loading the model"),
+    "embed": ("embedding", "Embedding the conversation index"),
+}
+
+
+class StartupPipeline:
+    """Builds the chatbot and prepares Ollama in the background.
+
+    Steps run in order:
+
+    - ``index``: construct the chatbot, loading or building its index.
+    - ``ollama``: wait for the Ollama server, starting it once if allowed.
+    - ``model``: pull the model if it is missing.
+    - ``warm``: load the model into memory.
+    - ``embed``: for dense or hybrid retrieval, pull the embedding model if needed
+      and embed the indexed messages. The chatbot is ready before this
+      step, and retrieves lexically until it completes.
+
+    If Ollama is unreachable or a step fails, the Ollama steps are retried
+    every ``retry_seconds``. Meanwhile the index stays usable.
+    """
+
+    def __init__(self, build_chatbot: Callable[[], LocalChatbot], start_ollama: bool = True,
+                 retry_seconds: float = 10.0) -> None:
+        self.build_chatbot = build_chatbot
+        self.start_ollama = start_ollama
+        self.retry_seconds = retry_seconds
+        self.chatbot: Optional[LocalChatbot] = None
+        self.index_ready = threading.Event()
+        self.model_ready = threading.Event()
+        self.error: Optional[str] = None
+        self._steps: Dict[str, Dict[str, Any]] = {
+            name: {"name": name, "state": "pending", "seconds": None, "detail": ""} for name in STEPS
+        }
+        self._progress: Optional[float] = None
+        self._attempts = 0
+        self._started_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the pipeline once; later calls do nothing."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._started_at = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name="chatbot-startup", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop retrying; a step already in progress runs to completion."""
+        self._stop.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the model is ready; returns False on timeout."""
+        return self.model_ready.wait(timeout)
+
+    def _pending_step(self) -> Optional[Dict[str, Any]]:
+        if self.model_ready.is_set():
+            return None
+        return next((self._steps[name] for name in STEPS if self._steps[name]["state"] != "done"), None)
+
+    @property
+    def state(self) -> str:
+        step = self._pending_step()
+        if step is None:
+            return "ready"
+        if step["name"] == "index" and step["state"] == "failed":
+            return "failed"
+        return PENDING_STATES[step["name"]][0]
+
+    def message(self) -> str:
+        """One-line human-readable progress."""
+        step = self._pending_step()
+        if step is None:
+            return "Ready."
+        if step["name"] == "index" and step["state"] == "failed":
+            return f"Startup failed: {self.error}"
+        detail = f" ({step['detail']})" if step["detail"] else ""
+        return f"{PENDING_STATES[step['name']][1]}{detail}."
+
+    def status(self) -> Dict[str, Any]:
+        """Snapshot of startup progress for ``/api/status``; never blocks."""
+        with self._lock:
+            steps: List[Dict[str, Any]] = [dict(self._steps[name]) for name in STEPS]
+        return {
+            "state": self.state,
+            "ready": self.model_ready.is_set(),
+            "index_ready": self.index_ready.is_set(),
+            "ollama_ready": steps[STEPS.index("ollama")]["state"] == "done",
+            "message": self.message(),
+            "progress": self._progress,
+            "attempts": self._attempts,
+            "error": self.error,
+            "elapsed_seconds": (time.monotonic() - self._started_at) if self._started_at else 0.0,
+            "steps": steps,
+        }
+
+    def _update(self, name: str, **fields: Any) -> None:
+        with self._lock:
+            self._steps[name].update(fields)
+
+    def _step(self, name: str, action: Callable[[], None]) -> None:
+        started = time.monotonic()
+        self._update(name, state="running", detail="")
+        try:
+            action()
+        except Exception as exc:
+            self.error = f"{name}: {exc}"
+            self._update(name, state="failed", detail=str(exc), seconds=time.monotonic() - started)
+            raise
+        self._update(name, state="done", seconds=time.monotonic() - started)
+
+    def _run(self) -> None:
+        try:
+            self._step("index", self._build_index)
+        except Exception:
+            return
+        while not self._stop.is_set():
+            self._attempts += 1
+            try:
+                self._step("ollama", self._wait_for_ollama)
+                self._step("model", self._pull_model)
+                self._step("warm", self.chatbot.load_model)
+            except Exception:
+                self._stop.wait(self.retry_seconds)
+                continue
+            self.error = None
+            self.model_ready.set()
+            break
+        while not self._stop.is_set():
+            try:
+                self._step("embed", self._embed)
+            except Exception:
+                self._stop.wait(self.retry_seconds)
+                continue
+            self.error = None
+            return
+
+    def _build_index(self) -> None:
+        self.chatbot = self.build_chatbot()
+        self.index_ready.set()
+
+    def _wait_for_ollama(self) -> None:
+        chatbot = self.chatbot
+        if chatbot.check_ollama_running():
+            return
+        if self.start_ollama and self._attempts == 1:
+            self._update("ollama", detail="starting ollama serve")
+            if chatbot.start_ollama_service():
+                return
+        raise RuntimeError(f"Ollama is not reachable at {chatbot.ollama_host}")
+
+    def _pull_model(self) -> None:
+        chatbot = self.chatbot
+        if chatbot.model_available():
+            return
+
+        def progress(status: str, fraction: Optional[float]) -> None:
+            self._progress = fraction
+            detail = f"{status} {fraction:.0%}" if fraction is not None else status
+            self._update("model", detail=detail)
+
+        try:
+            chatbot.pull_model(progress)
+        finally:
+            self._progress = None
+
+    def _embed(self) -> None:
+        chatbot = self.chatbot
+        if not chatbot.use_rag or chatbot.retrieval == "lexical" or chatbot.dense_store is not None:
+            return
+        if not chatbot.model_available(chatbot.embed_model):
+            self._update("embed", detail=f"pulling {chatbot.embed_model}")
+            chatbot.pull_model(model=chatbot.embed_model)
+        self._update("embed", detail=f"{len(chatbot.vector_store.documents):,} messages")
+        chatbot.build_dense_store()
+
+
+__all__ = ["STEPS", "StartupPipeline"]
@@ -1,99 +1,752 @@
 """Simple in-memory vector store for semantic search."""
 from __future__ import annotations
 
+import heapq
+import itertools
 import math
-import re
-from collections import Counter
+import multiprocessing
+import shutil
+import sys
+import threading
+from array import array
+from collections import Counter, OrderedDict
 from dataclasses import dataclass
-from typing import Iterable, List, Tuple
+from pathlib import Path
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
-_TOKEN_PATTERN = re.compile(r"[\w']+")
+from facets import DocumentMetadata, FacetIndex, FilterLike, SearchFilter, as_filter
+from index_file import MappedIndex, write_index
+from scoring import SCORERS, Scorer, make_scorer
+from segments import Segment, Snapshot, _tokenize, location
+from sparse_index import NUMPY_AVAILABLE, CsrIndex, top_k_indices
+from vocabulary import TermValues
 
 
-def _tokenize(text: str) -> List[str]:
-    return _TOKEN_PATTERN.findall(text.lower())
+def _count_shard(docs: Sequence[str]) -> tuple:
+    """Tokenise and count one shard of documents in a worker process.
 
+    Returns flat arrays rather than Counters and tuples, because pickling
+    millions of small objects back to the parent would cost more than the
+    counting itself. Local term ids number terms in order of first
+    appearance, and local doc ids number the shard's non-empty documents,
+    which the returned facet index covers as well.
+    """
+    kept = array("l")
+    facets = FacetIndex()
+    vocabulary: dict[str, int] = {}
+    terms: List[str] = []
+    doc_indptr = array("l", [0])
+    doc_terms = array("l")
+    doc_counts = array("i")
+    post_docs: List[List[int]] = []
+    post_tfs: List[List[float]] = []
+    for position, doc in enumerate(docs):
+        tokens = _tokenize(doc)
+        if not tokens:
+            continue
+        counts = Counter(tokens)
+        length = sum(counts.values())
+        local_id = len(kept)
+        kept.append(position)
+        facets.add(doc)
+        for term, count in counts.items():
+            term_id = vocabulary.get(term)
+            if term_id is None:
+                term_id = vocabulary[term] = len(terms)
+                terms.append(term)
+                post_docs.append([])
+                post_tfs.append([])
+            doc_terms.append(term_id)
+            doc_counts.append(count)
+            post_docs[term_id].append(local_id)
+            post_tfs[term_id].append(count / length)
+        doc_indptr.append(len(doc_terms))
+
+    post_indptr = array("l", [0])
+    post_indptr.extend(itertools.accumulate(map(len, post_docs)))
+    return (
+        kept, terms, doc_indptr, doc_terms, doc_counts, post_indptr,
+        array("i", itertools.chain.from_iterable(post_docs)),
+        array("d", itertools.chain.from_iterable(post_tfs)),
+        facets,
+    )
+
+
+def _restrict(postings: Sequence[Tuple[int, float]], allowed: List[int],
+              allowed_set: set) -> List[Tuple[int, float]]:
+    """Postings of the ``allowed`` (sorted) documents, in doc id order.
+
+    Few candidates are looked up by binary search in the doc-id-ordered
+    postings instead of scanning the whole list.
+    """
+    if len(allowed) * max(len(postings).bit_length(), 1) < len(postings):
+        # Array-backed postings bisect their doc ids without building tuples
+        doc_ids = getattr(postings, "doc_ids", None)
+        found = []
+        for doc_id in allowed:
+            if doc_ids is None:
+                position = bisect_left(postings, (doc_id,))
+            else:
+                position = bisect_left(doc_ids, doc_id)
+            if position < len(postings) and postings[position][0] == doc_id:
+                found.append(postings[position])
+        return found
+    return [entry for entry in postings if entry[0] in allowed_set]
+
+
+class _TfidfState:
+    """TF-IDF weights derived from one snapshot.
+
+    IDF is kept over each segment's vocabulary, with document frequencies
+    summed across segments. Each segment also gets its document norms
+    (python backend) or a CSR matrix of normalised weights (numpy backend).
+    """
+
+    __slots__ = ("idf", "norms", "matrices")
+
+    def __init__(self, idf: List[TermValues], norms: Optional[List[Sequence[float]]],
+                 matrices: Optional[List[CsrIndex]]) -> None:
+        self.idf = idf
+        self.norms = norms
+        self.matrices = matrices
+
+    @classmethod
+    def build(cls, snapshot: Snapshot, matrices: bool) -> "_TfidfState":
+        n_docs = snapshot.document_count
+        segments = snapshot.segments
+        if len(segments) == 1:
+            doc_freqs = [segments[0].doc_freqs()]
+        else:
+            totals: Dict[str, int] = {}
+            for segment in segments:
+                for term, doc_freq in zip(segment.postings.vocabulary.terms, segment.doc_freqs()):
+                    totals[term] = totals.get(term, 0) + doc_freq
+            doc_freqs = [map(totals.__getitem__, segment.postings.vocabulary.terms) for segment in segments]
+
+        def weight(doc_freq: int) -> float:
+            # Terms left only in deleted documents weigh 1.0 in queries, as unseen terms do
+            return math.log((n_docs + 1) / (doc_freq + 1)) + 1.0 if doc_freq else 1.0
+
+        idf = [
+            TermValues(segment.postings.vocabulary, array("d", map(weight, freqs)))
+            for segment, freqs in zip(segments, doc_freqs)
+        ]
+        if matrices:
+            return cls(idf, None, [
+                CsrIndex.from_postings(segment.postings, values, len(segment))
+                for segment, values in zip(segments, idf)
+            ])
+        return cls(idf, [segment.norms(values.values) for segment, values in zip(segments, idf)], None)
+
+    def term_idf(self, term: str) -> float:
+        """IDF of a query term; every segment that knows the term agrees on it."""
+        for values in self.idf:
+            value = values.get(term)
+            if value is not None:
+                return value
+        return 1.0
+
+
+class _QueryCache:
+    """LRU map from (query token bag, top_k, filter) to the results for one index generation.
+
+    All entries belong to one generation, and the first lookup from a newer
+    one drops them. Searches still running on an older snapshot neither
+    read nor fill the cache.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.generation = 0
+        self._entries: "OrderedDict[Tuple[Any, ...], List[SearchResult]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, generation: int, key: Tuple[Any, ...]) -> Optional[List[SearchResult]]:
+        with self._lock:
+            if generation > self.generation:
+                if self._entries:
+                    self._entries.clear()
+                    self.invalidations += 1
+                self.generation = generation
+            results = self._entries.get(key) if generation == self.generation else None
+            if results is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return results
+
+    def put(self, generation: int, key: Tuple[Any, ...], results: List[SearchResult]) -> None:
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = results
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
 
-@dataclass
+
+@dataclass(frozen=True)
 class SearchResult:
+    """One ranked document. Frozen, because cached results are shared between searches."""
+
     text: str
     score: float
+    doc_id: int = -1
 
 
 class SimpleVectorStore:
-    """Lightweight TF-IDF based vector store with cosine similarity."""
+    """Lightweight TF-IDF based vector store with cosine similarity.
+
+    The index is a list of immutable segments published through snapshots
+    (see ``segments``). ``add_documents`` indexes a batch into a new
+    segment, costing O(tokens added), and swaps in a snapshot that includes
+    it. Searches pick up the current snapshot and never take a lock, so
+    they run undisturbed while another thread writes, and never see a
+    half-applied change. Writers are serialised among themselves.
+
+    Small segments are merged as they accumulate: the newest two merge
+    while neither holds more than ``MERGE_FACTOR`` times the other's live
+    documents, so each document is copied O(log n) times. Segments smaller
+    than ``MERGE_FLOOR`` count as that size, which folds single-document
+    updates into one small tail segment, while a large batch is never
+    copied just to absorb a small older segment. Beyond ``MAX_SEGMENTS``,
+    the smallest neighbouring pair is merged. Searches rank each segment
+    and merge the top results. IDF values and document norms depend
+    on the whole corpus, so they are derived once per snapshot, lazily, by
+    the first search that needs them, or by the writer before publishing
+    with ``prepare_on_write=True``. Scores are identical to rebuilding the
+    whole index after every call.
+
+    ``backend="numpy"`` scores queries with a sparse matrix-vector product
+    over a CSR matrix of pre-normalised weights (see ``sparse_index``).
+    Scores agree with the pure Python backend to within ~1e-12. When NumPy
+    is not installed the store falls back to the pure Python backend.
+
+    ``save`` writes the index to a compact binary file and ``open`` maps it
+    back read-only (see ``index_file``), so processes can share one index
+    without re-tokenising the corpus. Changing an opened store first loads
+    it into memory.
+
+    ``add_documents(docs, workers=N)`` tokenises and counts shards of the
+    batch in a pool of ``N`` processes and merges them in order, producing
+    exactly the same index as a serial build.
+
+    Searches take optional ``filters`` (a :class:`~facets.SearchFilter` or
+    an equivalent dict) on speaker, time range and mentioned tickets or
+    releases. Filters resolve to candidate documents through facet indexes
+    before scoring, so only those documents are scored; their scores are the
+    same as in an unfiltered search.
+
+    ``scorer`` selects the ranking function: ``"tfidf"`` (the default
+    cosine similarity above), ``"bm25"``, ``"bm25+"`` or a
+    :class:`~scoring.Scorer` instance. Alternative scorers read the same
+    postings, so switching needs no re-indexing; they rank through the
+    postings (with early termination) whatever the backend.
+
+    Terms are interned in a vocabulary and referenced by id; postings, IDF
+    and norms are flat arrays (see ``vocabulary``). Each document's raw term
+    counts are kept as well, as rows of term ids, so norms are summed in
+    the same order as a per-document rebuild. With ``keep_counts=False``
+    (or after ``drop_counts()``) they are not kept and norms are computed
+    from the postings instead, which may change scores in the last floating
+    point bit. ``memory_usage()`` reports the bytes held by each structure.
+
+    Documents keep the id ``add_documents`` returns for them (it is also
+    ``SearchResult.doc_id``). ``delete(doc_id)`` marks the document with a
+    tombstone and subtracts it from the document frequencies, so IDF and
+    BM25 statistics cover live documents only; searches skip tombstoned
+    rows. ``update(doc_id, text)`` tombstones the old version and adds the
+    new text under the same id in a segment at the tail. Merges drop
+    tombstoned rows, and a segment whose tombstones exceed ``compact_ratio``
+    of its rows is rewritten without them; ``compact()`` merges everything
+    into one segment. Scores are the same as a fresh index of the live
+    documents. ``save`` compacts first, and an opened index numbers its
+    documents from 0.
 
-    def __init__(self) -> None:
-        self._documents: List[str] = []
-        self._token_counts: List[Counter[str]] = []
-        self._doc_vectors: List[Tuple[dict[str, float], float]] = []
-        self._idf: dict[str, float] = {}
+    Results are memoised in an LRU cache of ``query_cache_size`` entries
+    (0 disables it), keyed by the query's bag of tokens, ``top_k`` and the
+    filter. Queries that differ only in case, punctuation or word order
+    share an entry, and may then get the scores of the first ordering
+    searched, which can differ from a fresh search in the last floating
+    point bit. Each change to the documents bumps ``generation``, which
+    empties the cache. ``query_cache_stats()`` reports hits, misses and
+    evictions.
+    """
+
+    BACKENDS = ("python", "numpy")
+    SCORERS = tuple(SCORERS)
+    # The newest segments merge while their sizes are within this factor of each other
+    MERGE_FACTOR = 2
+    MERGE_FLOOR = 256
+    MAX_SEGMENTS = 16
+
+    def __init__(self, backend: str = "python", scorer: Union[str, Scorer, None] = "tfidf",
+                 keep_counts: bool = True, compact_ratio: float = 0.25,
+                 prepare_on_write: bool = False, query_cache_size: int = 256) -> None:
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}; expected one of {self.BACKENDS}")
+        self.backend = backend if NUMPY_AVAILABLE else "python"
+        self.scorer = make_scorer(scorer)
+        self.keep_counts = keep_counts
+        self.compact_ratio = compact_ratio
+        self.prepare_on_write = prepare_on_write
+        self._snapshot = Snapshot()
+        self._mapped: Optional[MappedIndex] = None
+        # Serialises writers; searches never take it
+        self._write_lock = threading.RLock()
+        self._query_cache = _QueryCache(query_cache_size) if query_cache_size > 0 else None
+
+    @property
+    def generation(self) -> int:
+        """Bumped by every change to the documents."""
+        return self._snapshot.generation
+
+    @property
+    def documents(self) -> Sequence[str]:
+        """Texts of the live documents, in order."""
+        return self._snapshot.documents()
 
     @property
-    def documents(self) -> List[str]:
-        return self._documents
+    def document_count(self) -> int:
+        """Number of live documents."""
+        return self._snapshot.document_count
+
+    @property
+    def deleted_rows(self) -> int:
+        """Tombstoned rows not yet dropped by a merge."""
+        return self._snapshot.deleted_rows
+
+    @property
+    def segment_count(self) -> int:
+        return len(self._snapshot.segments)
+
+    def document(self, doc_id: int) -> str:
+        """Text of the live document ``doc_id``; raises KeyError if there is none."""
+        snapshot = self._snapshot
+        position, row = snapshot.locate(doc_id)
+        return snapshot.segments[position].documents[row]
 
-    def add_documents(self, docs: Iterable[str]) -> None:
+    def items(self) -> List[Tuple[int, str]]:
+        """``(doc_id, text)`` of the live documents, in the order of ``documents``."""
+        return self._snapshot.items()
+
+    def document_frequency(self, term: str) -> int:
+        """Number of live documents containing ``term``."""
+        return self._snapshot.document_frequency(term)
+
+    @classmethod
+    def open(cls, path: Union[str, Path], backend: str = "python",
+             scorer: Union[str, Scorer, None] = "tfidf", query_cache_size: int = 256) -> "SimpleVectorStore":
+        """Memory-map an index written by :meth:`save`."""
+        index = MappedIndex(path)
+        store = cls(backend=backend, scorer=scorer, query_cache_size=query_cache_size)
+        store._mapped = index
+        segment = Segment.mapped(index)
+        locations = array("q", (location(segment, row) for row in range(len(segment))))
+        snapshot = Snapshot([segment], locations)
+        matrices = [index.csr_index()] if store.backend == "numpy" and store.scorer is None else None
+        snapshot.cache["tfidf"] = _TfidfState([index.idf], [index.doc_norms], matrices)
+        store._snapshot = snapshot
+        return store
+
+    def save(self, path: Union[str, Path], corpus_fingerprint: Optional[str] = None) -> None:
+        """Write the index to ``path`` in the format read by :meth:`open`.
+
+        ``corpus_fingerprint`` (see ``ingest.corpus_fingerprint``) is recorded
+        in the file so a later start can tell whether its corpus has changed.
+        An opened store is copied with the fingerprint it was saved with.
+        """
+        with self._write_lock:
+            if self._mapped is not None:
+                if Path(path).resolve() != self._mapped.path.resolve():
+                    shutil.copyfile(self._mapped.path, path)
+                return
+            self.compact()
+            snapshot = self._snapshot
+            if not snapshot.segments:
+                segment = Segment()
+                write_index(path, segment.documents, segment.postings,
+                            TermValues(segment.postings.vocabulary), array("d"), segment.lengths,
+                            corpus_fingerprint, segment.facets)
+                return
+            state = snapshot.cache.get("tfidf")
+            if state is None or state.norms is None:
+                state = _TfidfState.build(snapshot, matrices=False)
+            segment = snapshot.segments[0]
+            write_index(path, segment.documents, segment.postings, state.idf[0], state.norms[0],
+                        segment.lengths, corpus_fingerprint, segment.facets)
+
+    def add_documents(self, docs: Iterable[str], workers: int = 1) -> List[Optional[int]]:
+        """Index ``docs`` and return their ids (None for documents without tokens)."""
+        with self._write_lock:
+            if self._mapped is not None:
+                self._load_mapped()
+            snapshot = self._snapshot
+            segment = Segment(self.keep_counts)
+            doc_ids = self._fill(segment, docs, len(snapshot.locations), workers)
+            if not len(segment):
+                return doc_ids
+            locations = array("q", snapshot.locations)
+            locations.extend(location(segment, row) for row in range(len(segment)))
+            self._publish([*snapshot.segments, segment], locations)
+            return doc_ids
+
+    def _fill(self, segment: Segment, docs: Iterable[str], first_id: int,
+              workers: int) -> List[Optional[int]]:
+        """Index ``docs`` into the new ``segment``, numbering ids from ``first_id``."""
+        if workers > 1:
+            docs = list(docs)
+            # Two shards per worker keeps the pool busy when shards finish unevenly,
+            # without multiplying the per-term merge work in this process
+            shard_size = max(2000, -(-len(docs) // (workers * 2)))
+            shards = [docs[start:start + shard_size] for start in range(0, len(docs), shard_size)]
+            if len(shards) > 1:
+                doc_ids: List[Optional[int]] = []
+                with multiprocessing.Pool(min(workers, len(shards))) as pool:
+                    for shard, counted in zip(shards, pool.imap(_count_shard, shards)):
+                        doc_ids.extend(segment.merge_shard(shard, first_id + len(segment), *counted))
+                return doc_ids
+
+        doc_ids = []
         for doc in docs:
             tokens = _tokenize(doc)
             if not tokens:
+                doc_ids.append(None)
                 continue
-            counts = Counter(tokens)
-            self._documents.append(doc)
-            self._token_counts.append(counts)
-        self._recompute_vectors()
-
-    def _recompute_vectors(self) -> None:
-        if not self._token_counts:
-            self._idf = {}
-            self._doc_vectors = []
-            return
-
-        total_docs = len(self._token_counts)
-        doc_freq: Counter[str] = Counter()
-        for counts in self._token_counts:
-            doc_freq.update(counts.keys())
-
-        self._idf = {
-            term: math.log((total_docs + 1) / (freq + 1)) + 1.0
-            for term, freq in doc_freq.items()
-        }
+            doc_id = first_id + len(segment)
+            segment.append(doc, tokens, doc_id)
+            doc_ids.append(doc_id)
+        return doc_ids
 
-        self._doc_vectors = []
-        for counts in self._token_counts:
-            length = sum(counts.values()) or 1
-            vector = {
-                term: (counts[term] / length) * self._idf.get(term, 1.0)
-                for term in counts
-            }
-            norm = math.sqrt(sum(value * value for value in vector.values())) or 1.0
-            self._doc_vectors.append((vector, norm))
+    def delete(self, doc_id: int) -> None:
+        """Remove document ``doc_id``; raises KeyError if there is none."""
+        with self._write_lock:
+            if self._mapped is not None:
+                self._load_mapped()
+            segments, locations = self._tombstone(doc_id)
+            self._publish(segments, locations)
 
-    def search(self, query: str, top_k: int = 3) -> List[SearchResult]:
-        if not self._doc_vectors:
-            return []
+    def update(self, doc_id: int, text: str) -> None:
+        """Replace the text of document ``doc_id``, keeping its id.
 
-        tokens = _tokenize(query)
-        if not tokens:
-            return []
+        Text without tokens cannot be indexed, so it deletes the document.
+        """
+        with self._write_lock:
+            if self._mapped is not None:
+                self._load_mapped()
+            segments, locations = self._tombstone(doc_id)
+            tokens = _tokenize(text)
+            if tokens:
+                delta = Segment(self.keep_counts)
+                locations[doc_id] = location(delta, delta.append(text, tokens, doc_id))
+                segments.append(delta)
+            self._publish(segments, locations)
+
+    def _tombstone(self, doc_id: int) -> Tuple[List[Segment], array]:
+        """Segments and doc id map of the current snapshot with ``doc_id`` deleted."""
+        snapshot = self._snapshot
+        position, row = snapshot.locate(doc_id)
+        segments = list(snapshot.segments)
+        segments[position] = segments[position].with_deleted([row])
+        locations = array("q", snapshot.locations)
+        locations[doc_id] = -1
+        return segments, locations
+
+    def _publish(self, segments: List[Segment], locations: array) -> None:
+        """Merge ``segments`` as the policy requires and swap in the new snapshot."""
+        for position, segment in enumerate(segments):
+            if segment.dead_rows > self.compact_ratio * len(segment):
+                segments[position] = self._merge([segment], locations)
+        segments = [segment for segment in segments if len(segment)]
+        while len(segments) > 1 and self._similar(segments[-2], segments[-1]):
+            segments[-2:] = [self._merge(segments[-2:], locations)]
+        while len(segments) > self.MAX_SEGMENTS:
+            # Batches of uneven sizes can leave runs of dissimilar segments; merge the smallest neighbours
+            position = min(range(len(segments) - 1),
+                           key=lambda index: segments[index].live + segments[index + 1].live)
+            segments[position:position + 2] = [self._merge(segments[position:position + 2], locations)]
+        snapshot = Snapshot(segments, locations, self._snapshot.generation + 1)
+        if self.prepare_on_write:
+            self._prepare(snapshot)
+        self._snapshot = snapshot
+
+    def _similar(self, older: Segment, newer: Segment) -> bool:
+        """Whether neither segment holds more than ``MERGE_FACTOR`` times the other's live documents."""
+        older_size = max(older.live, self.MERGE_FLOOR)
+        newer_size = max(newer.live, self.MERGE_FLOOR)
+        return older_size <= newer_size * self.MERGE_FACTOR and newer_size <= older_size * self.MERGE_FACTOR
+
+    def _merge(self, segments: Sequence[Segment], locations: array) -> Segment:
+        """Merge ``segments`` into one, pointing their doc ids at the new rows."""
+        merged = Segment.merge(segments, self.keep_counts and all(segment.keep_counts for segment in segments))
+        for row, doc_id in enumerate(merged.row_ids):
+            locations[doc_id] = location(merged, row)
+        return merged
+
+    def compact(self) -> None:
+        """Merge every segment into one, without the deleted documents."""
+        with self._write_lock:
+            snapshot = self._snapshot
+            if self._mapped is not None or (len(snapshot.segments) < 2 and not snapshot.deleted_rows):
+                return
+            locations = array("q", snapshot.locations)
+            merged = self._merge(snapshot.segments, locations)
+            compacted = Snapshot([merged] if len(merged) else [], locations, snapshot.generation)
+            if self.prepare_on_write:
+                self._prepare(compacted)
+            self._snapshot = compacted
+
+    def drop_counts(self) -> None:
+        """Free the per-document term counts once the index is built.
+
+        Current norms are kept; later changes recompute them from the
+        postings (see the class docstring).
+        """
+        with self._write_lock:
+            snapshot = self._snapshot
+            state = self._tfidf(snapshot) if self.scorer is None else None
+            self.keep_counts = False
+            dropped = Snapshot([segment.without_counts() for segment in snapshot.segments],
+                               snapshot.locations, snapshot.generation)
+            if state is not None:
+                dropped.cache["tfidf"] = state
+            self._snapshot = dropped
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Approximate bytes held by each part of the index, plus their ``total``.
+
+        A memory-mapped index reports its file size as ``mapped``; those
+        pages are shared between processes and paged in on demand.
+        """
+        snapshot = self._snapshot
+        state = snapshot.cache.get("tfidf")
+        if self._mapped is not None:
+            usage = {"mapped": self._mapped.path.stat().st_size}
+        else:
+            usage = dict.fromkeys(("documents", "vocabulary", "postings", "idf", "doc_lengths",
+                                   "doc_counts", "doc_norms", "doc_ids", "tombstones"), 0)
+            for segment in snapshot.segments:
+                for key, size in segment.memory_usage().items():
+                    usage[key] += size
+            usage["doc_ids"] += sys.getsizeof(snapshot.locations)
+            if state is not None:
+                usage["idf"] = sum(values.nbytes() for values in state.idf)
+                usage["doc_norms"] = sum(map(sys.getsizeof, state.norms or ()))
+        usage["matrix"] = sum(matrix.nbytes for matrix in state.matrices) if state and state.matrices else 0
+        usage["total"] = sum(usage.values())
+        return usage
+
+    def _load_mapped(self) -> None:
+        """Replace the read-only mapped index with in-memory segments."""
+        documents = list(self._mapped.documents)
+        self._mapped = None
+        self._snapshot = Snapshot(generation=self._snapshot.generation)
+        self.add_documents(documents)
+
+    def document_metadata(self, doc_id: int) -> DocumentMetadata:
+        """Speaker, timestamp and mentioned tickets/releases of a document."""
+        return DocumentMetadata.from_text(self.document(doc_id))
+
+    def _tfidf(self, snapshot: Snapshot) -> _TfidfState:
+        return snapshot.derived(
+            "tfidf", lambda current: _TfidfState.build(current, matrices=self.backend == "numpy"))
 
+    def _scorer_stats(self, snapshot: Snapshot) -> Any:
+        return snapshot.derived(self.scorer, self.scorer.prepare)
+
+    def _prepare(self, snapshot: Snapshot) -> None:
+        """Derive the ranking statistics of ``snapshot`` ahead of its first search."""
+        if self.scorer is None:
+            self._tfidf(snapshot)
+        else:
+            self._scorer_stats(snapshot)
+
+    def search(self, query: str, top_k: int = 3, filters: FilterLike = None) -> List[SearchResult]:
+        return self.search_many([query], top_k=top_k, filters=filters)[0]
+
+    def search_many(self, queries: Sequence[str], top_k: int = 3,
+                    filters: FilterLike = None) -> List[List[SearchResult]]:
+        """Search several queries at once, returning one result list per query.
+
+        Queries are vectorised together and share a single pass over the
+        postings of their combined terms (or one sparse matrix-matrix product
+        with the NumPy backend). A query's scores may differ from a lone
+        ``search`` call in the last floating point bit when it shares terms
+        with other queries in the batch. Queries found in the query cache
+        are not searched again.
+        """
+        snapshot = self._snapshot
+        search_filter = as_filter(filters)
+        cache = self._query_cache
+        if cache is None:
+            return self._search_snapshot(snapshot, queries, top_k, search_filter)
+
+        filter_key = search_filter.key() if search_filter is not None else None
+        keys = [(tuple(sorted(Counter(_tokenize(query)).items())), top_k, filter_key) for query in queries]
+        results = [cache.get(snapshot.generation, key) for key in keys]
+        missed = [slot for slot, found in enumerate(results) if found is None]
+        if missed:
+            searched = self._search_snapshot(snapshot, [queries[slot] for slot in missed], top_k, search_filter)
+            for slot, found in zip(missed, searched):
+                cache.put(snapshot.generation, keys[slot], found)
+                results[slot] = found
+        # Callers get their own lists, so changing one leaves the cached list (and its frozen results) intact
+        return [list(found) for found in results]
+
+    def query_cache_stats(self) -> Optional[Dict[str, int]]:
+        """Entries, hits, misses, evictions and invalidations of the query cache (None if disabled)."""
+        return self._query_cache.stats() if self._query_cache is not None else None
+
+    def _search_snapshot(self, snapshot: Snapshot, queries: Sequence[str], top_k: int,
+                         search_filter: Optional[SearchFilter]) -> List[List[SearchResult]]:
+        results: List[List[SearchResult]] = [[] for _ in queries]
+        if not snapshot.document_count:
+            return results
+        allowed = self._select(snapshot, search_filter)
+        if allowed is not None and not any(allowed):
+            return results
+        if self.scorer is not None:
+            return self._search_with_scorer(snapshot, queries, top_k, allowed)
+
+        state = self._tfidf(snapshot)
+        prepared = []
+        for slot, query in enumerate(queries):
+            tokens = _tokenize(query)
+            if tokens:
+                prepared.append((slot, *self._query_vector(state, tokens)))
+        if not prepared:
+            return results
+
+        # (score, -segment, -row) per query, so ties keep corpus order
+        found: List[List[Tuple[float, int, int]]] = [[] for _ in prepared]
+        subscribers: dict[str, List[Tuple[int, float]]] = {}
+        for index, (_, q_vec, _) in enumerate(prepared):
+            for term, q_weight in q_vec.items():
+                subscribers.setdefault(term, []).append((index, q_weight))
+
+        for position, segment in enumerate(snapshot.segments):
+            rows = allowed[position] if allowed is not None else None
+            if rows is not None and not rows:
+                continue
+            if state.matrices is None:
+                self._score_segment(segment, position, state.idf[position], state.norms[position],
+                                    prepared, subscribers, rows, top_k, found)
+                continue
+            # Filtered rows are already live
+            exclude = segment.dead if segment.dead_rows and rows is None else None
+            scored = state.matrices[position].score_batch(
+                [(q_vec, q_norm) for _, q_vec, q_norm in prepared], rows=rows
+            )
+            for candidates, (doc_rows, scores) in zip(found, scored):
+                candidates.extend(
+                    (score, -position, -row) for row, score in top_k_indices(scores, top_k, doc_rows, exclude)
+                )
+
+        for (slot, _, _), candidates in zip(prepared, found):
+            results[slot] = self._results(snapshot, candidates, top_k)
+        return results
+
+    def _select(self, snapshot: Snapshot, search_filter: Optional[SearchFilter]) -> Optional[List[List[int]]]:
+        """Sorted candidate rows of each segment for a filter, or None when unfiltered."""
+        if search_filter is None:
+            return None
+        return [segment.select(search_filter) for segment in snapshot.segments]
+
+    def _score_segment(self, segment: Segment, position: int, idf: TermValues, norms: Sequence[float],
+                       prepared: list, subscribers: Dict[str, List[Tuple[int, float]]],
+                       rows: Optional[List[int]], top_k: int, found: List[list]) -> None:
+        # Accumulate dot products term-at-a-time. For a single query the terms
+        # are visited in query order, so the floating point sums match a full
+        # per-document scan exactly.
+        dots: List[dict[int, float]] = [{} for _ in prepared]
+        allowed_set = set(rows) if rows is not None else None
+        for term, readers in subscribers.items():
+            postings = segment.postings.get(term)
+            if not postings:
+                continue
+            if rows is not None:
+                postings = _restrict(postings, rows, allowed_set)
+            term_idf = idf[term]
+            for row, tf in postings:
+                weight = tf * term_idf
+                for index, q_weight in readers:
+                    acc = dots[index]
+                    acc[row] = acc.get(row, 0.0) + q_weight * weight
+
+        dead = segment.dead if segment.dead_rows else None
+        for (_, _, q_norm), acc, candidates in zip(prepared, dots, found):
+            scored = []
+            for row, dot in acc.items():
+                if dead is not None and dead[row]:
+                    continue
+                doc_norm = norms[row]
+                score = dot / (q_norm * doc_norm) if q_norm and doc_norm else 0.0
+                if score > 0:
+                    scored.append((score, -position, -row))
+            candidates.extend(heapq.nlargest(top_k, scored))
+
+    def _search_with_scorer(self, snapshot: Snapshot, queries: Sequence[str], top_k: int,
+                            allowed: Optional[List[List[int]]]) -> List[List[SearchResult]]:
+        stats = self._scorer_stats(snapshot)
+        results = []
+        for query in queries:
+            query_terms = Counter(_tokenize(query))
+            candidates: List[Tuple[float, int, int]] = []
+            for position, segment in enumerate(snapshot.segments):
+                rows = allowed[position] if allowed is not None else None
+                if rows is not None and not rows:
+                    continue
+                full = {}
+                for term in query_terms:
+                    postings = segment.postings.get(term)
+                    if postings:
+                        full[term] = postings
+                restricted = full
+                if rows is not None:
+                    allowed_set = set(rows)
+                    restricted = {term: _restrict(postings, rows, allowed_set) for term, postings in full.items()}
+                ranked = self.scorer.top_k(stats, position, query_terms, restricted, top_k, full_postings=full)
+                candidates.extend((score, -position, -row) for row, score in ranked)
+            results.append(self._results(snapshot, candidates, top_k))
+        return results
+
+    def _results(self, snapshot: Snapshot, candidates: List[Tuple[float, int, int]],
+                 top_k: int) -> List[SearchResult]:
+        """The best ``top_k`` of every segment's ``(score, -segment, -row)`` candidates."""
+        top = heapq.nlargest(top_k, candidates) if len(snapshot.segments) > 1 else candidates[:top_k]
+        results = []
+        for score, neg_position, neg_row in top:
+            segment = snapshot.segments[-neg_position]
+            results.append(SearchResult(text=segment.documents[-neg_row], score=score,
+                                        doc_id=segment.row_ids[-neg_row]))
+        return results
+
+    def _query_vector(self, state: _TfidfState, tokens: List[str]) -> Tuple[dict[str, float], float]:
         q_counts = Counter(tokens)
         length = sum(q_counts.values()) or 1
         q_vec = {
-            term: (q_counts[term] / length) * self._idf.get(term, 1.0)
+            term: (q_counts[term] / length) * state.term_idf(term)
             for term in q_counts
         }
         q_norm = math.sqrt(sum(value * value for value in q_vec.values())) or 1.0
-
-        results: List[SearchResult] = []
-        for (doc_vec, doc_norm), doc_text in zip(self._doc_vectors, self._documents):
-            dot = sum(q_vec.get(term, 0.0) * doc_vec.get(term, 0.0) for term in q_vec)
-            score = dot / (q_norm * doc_norm) if q_norm and doc_norm else 0.0
-            if score > 0:
-                results.append(SearchResult(text=doc_text, score=score))
-
-        results.sort(key=lambda item: item.score, reverse=True)
-        return results[:top_k]
+        return q_vec, q_norm
 
 
 __all__ = ["SimpleVectorStore", "SearchResult"]
@@ -0,0 +1,150 @@
+"""Interned vocabulary and array-backed postings for ``SimpleVectorStore``.
+
+Every term string is stored once, in :class:`Vocabulary`, and numbered in
+order of first appearance. Everything else refers to terms by id: each
+term's postings are a :class:`PostingList` of two flat arrays (doc ids and
+term frequencies), and per-term values such as IDF live in one array
+indexed by term id. A posting then costs 12 bytes instead of a tuple, a
+boxed int and a boxed float (~100 bytes).
+
+:class:`TermPostings` and :class:`TermValues` present these arrays as the
+read-only ``term -> ...`` mappings the store, the scorers and the index
+writer already use, so callers still look terms up by string.
+"""
+from __future__ import annotations
+
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class Vocabulary:
+    """Terms numbered in order of first appearance; each string is kept once."""
+
+    __slots__ = ("ids", "terms")
+
+    def __init__(self) -> None:
+        self.ids: Dict[str, int] = {}
+        self.terms: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def __contains__(self, term: object) -> bool:
+        return term in self.ids
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.terms)
+
+    def get(self, term: str, default: Optional[int] = None) -> Optional[int]:
+        return self.ids.get(term, default)
+
+    def add(self, term: str) -> int:
+        """Id of ``term``, assigning the next id if it is new."""
+        term_id = self.ids.get(term)
+        if term_id is None:
+            term_id = self.ids[term] = len(self.terms)
+            self.terms.append(term)
+        return term_id
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the id map and the term strings."""
+        return sys.getsizeof(self.ids) + sys.getsizeof(self.terms) + sum(map(sys.getsizeof, self.terms))
+
+
+class PostingList(Sequence):
+    """One term's ``(doc id, term frequency)`` pairs, in doc id order."""
+
+    __slots__ = ("doc_ids", "tfs")
+
+    def __init__(self) -> None:
+        self.doc_ids = array("i")
+        self.tfs = array("d")
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def __iter__(self) -> Iterator[Tuple[int, float]]:
+        return zip(self.doc_ids, self.tfs)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(zip(self.doc_ids[index], self.tfs[index]))
+        return self.doc_ids[index], self.tfs[index]
+
+    def append(self, doc_id: int, tf: float) -> None:
+        self.doc_ids.append(doc_id)
+        self.tfs.append(tf)
+
+    def extend(self, doc_ids: Iterable[int], tfs: Iterable[float]) -> None:
+        self.doc_ids.extend(doc_ids)
+        self.tfs.extend(tfs)
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self.doc_ids) + sys.getsizeof(self.tfs)
+
+
+class TermPostings(Mapping):
+    """``term -> PostingList`` over a vocabulary; ``lists`` is indexed by term id."""
+
+    __slots__ = ("vocabulary", "lists")
+
+    def __init__(self, vocabulary: Optional[Vocabulary] = None) -> None:
+        self.vocabulary = vocabulary if vocabulary is not None else Vocabulary()
+        self.lists: List[PostingList] = []
+
+    def intern(self, term: str) -> int:
+        """Id of ``term``, adding it with an empty posting list if it is new."""
+        term_id = self.vocabulary.add(term)
+        if term_id == len(self.lists):
+            self.lists.append(PostingList())
+        return term_id
+
+    def __len__(self) -> int:
+        return len(self.lists)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.vocabulary.terms)
+
+    def __getitem__(self, term: str) -> PostingList:
+        return self.lists[self.vocabulary.ids[term]]
+
+    def get(self, term: str, default=None):
+        term_id = self.vocabulary.ids.get(term)
+        return default if term_id is None else self.lists[term_id]
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the posting lists (the vocabulary is counted separately)."""
+        return sys.getsizeof(self.lists) + sum(postings.nbytes() for postings in self.lists)
+
+
+class TermValues(Mapping):
+    """Read-only ``term -> float`` mapping over an array indexed by term id."""
+
+    __slots__ = ("vocabulary", "values")
+
+    def __init__(self, vocabulary: Vocabulary, values: Optional[array] = None) -> None:
+        self.vocabulary = vocabulary
+        self.values = values if values is not None else array("d")
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.vocabulary.terms[:len(self.values)])
+
+    def __getitem__(self, term: str) -> float:
+        return self.values[self.vocabulary.ids[term]]
+
+    def get(self, term: str, default=None):
+        term_id = self.vocabulary.ids.get(term)
+        if term_id is None or term_id >= len(self.values):
+            return default
+        return self.values[term_id]
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.values)
+
+
+__all__ = ["PostingList", "TermPostings", "TermValues", "Vocabulary"]
@@ -63,6 +63,11 @@ class ChatApp {
                 if (data.model) {
                     this.modelInfo.textContent = `Model: ${data.model} ${data.rag_enabled ? '(RAG Enabled)' : ''}`;
                 }
+                // Keep polling while the server is still starting up
+                if (data.ready === false && data.startup) {
+                    this.statusIndicator.querySelector('.status-text').textContent = data.startup.message;
+                    setTimeout(() => this.checkStatus(), 2000);
+                }
             }
         } catch (error) {
             console.error('Status check failed:', error);
@@ -99,7 +104,7 @@ class ChatApp {
         this.addTypingIndicator();
 
         try {
-            const response = await fetch('/api/chat', {
+            const response = await fetch('/api/chat/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -107,21 +112,77 @@ class ChatApp {
                 body: JSON.stringify({ message }),
             });
 
-            const data = await response.json();
-            this.removeTypingIndicator();
-
-            if (data.success) {
-                this.addMessage('assistant', data.response, data.model);
-            } else {
+            if (!response.ok || !response.body) {
+                const data = await response.json();
+                this.removeTypingIndicator();
                 this.addMessage('assistant', `Error: ${data.error || 'Failed to get response'}`);
+                return;
             }
+
+            await this.readStream(response.body);
         } catch (error) {
             this.removeTypingIndicator();
             this.addMessage('assistant', `Error: ${error.message || 'Network error occurred'}`);
         }
     }
 
-    addMessage(type, content, model = null) {
+    async readStream(body) {
+        const reader = body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let messageDiv = null;
+
+        // Create the assistant bubble on the first token so the typing
+        // indicator stays up until the model actually starts answering
+        const ensureMessage = () => {
+            if (!messageDiv) {
+                this.removeTypingIndicator();
+                messageDiv = this.addMessage('assistant', '', null, false);
+            }
+            return messageDiv;
+        };
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // Server-Sent Events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const raw = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                if (!raw.startsWith('data: ')) continue;
+
+                const event = JSON.parse(raw.slice(6));
+                if (event.token) {
+                    ensureMessage().querySelector('.message-bubble').textContent += event.token;
+                    this.scrollToBottom();
+                } else if (event.done) {
+                    this.addModelMeta(ensureMessage(), event.model);
+                } else if (event.error) {
+                    if (messageDiv) {
+                        messageDiv.querySelector('.message-bubble').textContent += `\n\nError: ${event.error}`;
+                    } else {
+                        this.removeTypingIndicator();
+                        this.addMessage('assistant', `Error: ${event.error}`);
+                    }
+                }
+            }
+        }
+
+        if (!messageDiv) {
+            this.removeTypingIndicator();
+        }
+    }
+
+    addModelMeta(messageDiv, model) {
+        if (model) {
+            messageDiv.querySelector('.message-meta').innerHTML += `<span>🤖 ${model}</span>`;
+        }
+    }
+
+    addMessage(type, content, model = null, animate = true) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${type}`;
         
@@ -156,9 +217,11 @@ class ChatApp {
         this.scrollToBottom();
         
         // Typewriter effect for assistant messages
-        if (type === 'assistant') {
+        if (type === 'assistant' && animate) {
             this.typewriterEffect(bubble, content);
         }
+
+        return messageDiv;
     }
 
     typewriterEffect(element, text) {
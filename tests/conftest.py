@@ -0,0 +1,104 @@
+"""Shared fixtures: the ``src`` modules on the path and a stub Ollama server."""
+import json
+import re
+import sys
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+src_dir = Path(__file__).resolve().parent.parent / 'src'
+if str(src_dir) not in sys.path:
+    sys.path.insert(0, str(src_dir))
+
+
+class StubOllama:
+    """Local HTTP server standing in for Ollama.
+
+    ``routes`` maps ``(method, path)`` to a function of the parsed JSON body
+    returning ``(status, payload)``. Every request is appended to
+    ``requests`` and every accepted TCP connection counted in ``connections``.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def _respond(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                with stub._lock:
+                    stub.requests.append((method, self.path, body))
+                route = stub.routes.get((method, self.path))
+                status, payload = route(body) if route else (404, {'error': 'not found'})
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond('GET')
+
+            def do_POST(self):
+                self._respond('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self._thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+
+    def calls(self, path):
+        with self._lock:
+            return [body for _, request_path, body in self.requests if request_path == path]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def embed(body):
+    """``/api/embed`` stand-in: hashed bag of words, so texts sharing words are similar."""
+    inputs = body['input'] if isinstance(body['input'], list) else [body['input']]
+    vectors = []
+    for text in inputs:
+        vector = [0.0] * 64
+        for word in re.findall(r'\w+', text.lower()):
+            vector[zlib.crc32(word.encode('utf-8')) % 64] += 1.0
+        vectors.append(vector)
+    return 200, {'model': body['model'], 'embeddings': vectors}
+
+
+@pytest.fixture
+def ollama_stub():
+    stub = StubOllama().start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def embed_stub(ollama_stub):
+    ollama_stub.routes[('POST', '/api/embed')] = embed
+    return ollama_stub
@@ -0,0 +1,57 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import asgi_app
+from chatbot import LocalChatbot
+
+
+def post(path, body):
+    async def run():
+        transport = httpx.ASGITransport(app=asgi_app.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            return await client.post(path, json=body)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('path', ['/api/chat', '/api/chat/stream'])
+def test_bad_filters_are_rejected(path):
+    response = post(path, {'message': 'who ran the backup?', 'filters': {'mentions': 5}})
+    assert response.status_code == 400
+    assert response.json() == {'error': 'mentions must be a string or list'}
+
+
+def test_retrieval_does_not_block_the_event_loop(embed_stub, monkeypatch):
+    chatbot = LocalChatbot(ollama_host=embed_stub.url, retrieval='dense', embed_model='stub')
+    chatbot.build_dense_store()
+
+    embed = embed_stub.routes[('POST', '/api/embed')]
+
+    def slow_embed(body):
+        time.sleep(0.3)
+        return embed(body)
+
+    embed_stub.routes[('POST', '/api/embed')] = slow_embed
+    monkeypatch.setattr(asgi_app.service, 'startup', SimpleNamespace(chatbot=chatbot, message=lambda: ''))
+
+    async def run():
+        gaps = []
+
+        async def tick():
+            last = time.perf_counter()
+            while not answer.done():
+                await asyncio.sleep(0.01)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        answer = asyncio.ensure_future(asgi_app.service.retrieval_only('db backup status', None))
+        await tick()
+        return answer.result(), max(gaps)
+
+    response, longest_gap = asyncio.run(run())
+    assert 'backup' in response.lower()
+    assert longest_gap < 0.15
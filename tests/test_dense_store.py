@@ -0,0 +1,143 @@
+import numpy as np
+import pytest
+
+from chatbot import LocalChatbot
+from dense_store import DenseVectorStore, IvfIndex
+from embeddings import EmbeddingCache, OllamaEmbedder
+from ollama_client import OllamaClient
+
+
+def clustered(rng, count, dimension=32, clusters=64):
+    centers = rng.standard_normal((clusters, dimension))
+    return (centers[rng.integers(clusters, size=count)]
+            + 0.3 * rng.standard_normal((count, dimension))).astype(np.float32)
+
+
+def exact(vectors, queries, top_k, allowed=None):
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = queries @ vectors.T
+    if allowed is not None:
+        blocked = np.ones(len(vectors), dtype=bool)
+        blocked[allowed] = False
+        scores[:, blocked] = -np.inf
+    return [set(np.argsort(-row, kind='stable')[:top_k]) for row in scores]
+
+
+def test_ivf_recall_against_brute_force():
+    rng = np.random.default_rng(0)
+    vectors = clustered(rng, 20000)
+    index = IvfIndex(nprobe=16, exhaustive_below=1000)
+    for start in range(0, len(vectors), 2500):
+        index.add(vectors[start:start + 2500])
+    assert len(index) == 20000 and index.list_count > 0
+
+    queries = clustered(rng, 100)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    expected = exact(vectors, queries, 10)
+    found = [set(rows) for rows, _ in index.search(queries, 10)]
+    recall = np.mean([len(got & want) / 10 for got, want in zip(found, expected)])
+    assert recall >= 0.9
+
+
+def test_ivf_is_exact_below_threshold_and_with_filters():
+    rng = np.random.default_rng(1)
+    vectors = clustered(rng, 3000)
+    queries = clustered(rng, 20)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    small = IvfIndex(exhaustive_below=4096)
+    small.add(vectors)
+    assert small.list_count == 0
+    assert [set(rows) for rows, _ in small.search(queries, 5)] == exact(vectors, queries, 5)
+
+    large = IvfIndex(exhaustive_below=500)
+    large.add(vectors)
+    allowed = list(range(0, 3000, 97))
+    for (rows, _), want in zip(large.search(queries, 5, allowed), exact(vectors, queries, 5, allowed)):
+        assert set(rows) == want
+
+
+def test_embedding_cache_hits_and_misses(embed_stub, tmp_path):
+    path = str(tmp_path / 'embeddings.db')
+    client = OllamaClient(embed_stub.url)
+    cache = EmbeddingCache(path)
+    first = OllamaEmbedder(client, model='stub', cache=cache).embed(['db backup', 'release 40', 'db backup'])
+    assert first.shape == (3, 64)
+    assert embed_stub.calls('/api/embed') == [{'model': 'stub', 'input': ['db backup', 'release 40']}]
+    assert cache.stats() == {'entries': 2, 'hits': 0, 'misses': 2}
+    cache.close()
+
+    # A restart reads the same vectors back without calling the model
+    cache = EmbeddingCache(path)
+    embedder = OllamaEmbedder(client, model='stub', cache=cache)
+    again = embedder.embed(['release 40', 'db backup', 'patch 34'])
+    assert np.array_equal(again[:2], first[[1, 0]])
+    assert embed_stub.calls('/api/embed')[-1]['input'] == ['patch 34']
+    assert cache.stats() == {'entries': 3, 'hits': 2, 'misses': 1}
+
+    # The model name is part of the key
+    OllamaEmbedder(client, model='other', cache=cache).embed(['db backup'])
+    assert embed_stub.calls('/api/embed')[-1] == {'model': 'other', 'input': ['db backup']}
+    cache.close()
+
+
+def test_dense_store_matches_lexical_ids(embed_stub):
+    docs = ['Priya, Mar 3, 9:15 AM: db backup failed', '???', 'Sam, Mar 4, 10:00 AM: release 40 started']
+    store = DenseVectorStore(OllamaEmbedder(OllamaClient(embed_stub.url), model='stub'))
+    assert store.add_documents(docs) == [0, None, 1]
+    assert store.search('backup of the db', top_k=1)[0].doc_id == 0
+    assert store.search('release', top_k=2, filters={'speaker': 'Sam'})[0].doc_id == 1
+
+
+@pytest.fixture
+def dense_chatbot(embed_stub):
+    chatbot = LocalChatbot(ollama_host=embed_stub.url, retrieval='dense', embed_model='stub')
+    chatbot.build_dense_store()
+    return chatbot
+
+
+def test_dense_retrieval_falls_back_to_lexical(dense_chatbot, embed_stub):
+    question = 'any update on the db backup?'
+    dense = dense_chatbot.dense_store.search(question, top_k=3)
+    assert dense and dense_chatbot.retrieve(question) == dense
+
+    embed_stub.routes[('POST', '/api/embed')] = lambda body: (500, {'error': 'model crashed'})
+    lexical = dense_chatbot.vector_store.search(question, top_k=3)
+    assert lexical != dense
+    assert dense_chatbot.retrieve(question) == lexical
+
+
+def test_dense_store_needs_a_working_embedder(embed_stub):
+    embed_stub.routes[('POST', '/api/embed')] = lambda body: (404, {'error': 'model "stub" not found'})
+    chatbot = LocalChatbot(ollama_host=embed_stub.url, retrieval='dense', embed_model='stub')
+    with pytest.raises(RuntimeError, match='HTTP 404'):
+        chatbot.build_dense_store()
+    assert chatbot.dense_store is None
+    assert chatbot.retrieve('db backup') == chatbot.vector_store.search('db backup', top_k=3)
+
+
+def test_dense_store_keeps_ids_through_deletes_and_updates(embed_stub):
+    store = DenseVectorStore(OllamaEmbedder(OllamaClient(embed_stub.url), model='stub'))
+    docs = [f'Sam, Mar {day}, 10:00 AM: release {day} promoted' for day in range(1, 9)]
+    assert store.add_documents(['???', *docs], doc_ids=[5, *range(10, 18)]) == [None, *range(10, 18)]
+    with pytest.raises(ValueError, match='already indexed'):
+        store.add_documents(['Sam: release 1 again'], doc_ids=[10])
+
+    store.delete(12)
+    store.update(13, 'Priya, Mar 4, 11:00 AM: db backup failed')
+    assert 12 not in [result.doc_id for result in store.search('release 3 promoted', top_k=8)]
+    assert [(result.doc_id, result.text) for result in store.search('db backup', top_k=1)] == \
+        [(13, 'Priya, Mar 4, 11:00 AM: db backup failed')]
+    assert [result.doc_id for result in store.search('release', top_k=8, filters={'speaker': 'Priya'})] == [13]
+    with pytest.raises(KeyError):
+        store.delete(12)
+    assert store.add_documents(['Sam: release 9 promoted']) == [18]
+
+    # Past a quarter of the rows deleted, the live vectors are indexed again
+    assert len(store.index) == 10
+    store.delete(14)
+    assert store.document_count == len(store.index) == 7
+    store.delete(15)
+    assert store.document_count == 6
+    assert sorted(result.doc_id for result in store.search('release promoted', top_k=10)) == [10, 11, 13, 16, 17, 18]
+    assert store.search('db backup', top_k=1)[0].doc_id == 13
@@ -0,0 +1,61 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from dispatcher import AsyncDispatcher, FairScheduler, request_key
+from ollama_client import AsyncOllamaClient, OllamaBusyError
+
+
+def test_round_robin_across_clients():
+    scheduler = FairScheduler(limit=1)
+    granted = []
+    scheduler.request('m', 'a', lambda: granted.append('a0'))
+    for name in ('a1', 'a2', 'b1', 'c1'):
+        scheduler.request('m', name[0], lambda name=name: granted.append(name))
+    for _ in range(4):
+        scheduler.release('m')
+    assert granted == ['a0', 'a1', 'b1', 'c1', 'a2']
+
+
+def test_full_queue_is_rejected():
+    scheduler = FairScheduler(limit=1, max_queue=1)
+    scheduler.request('m', 'a', lambda: None)
+    scheduler.request('m', 'a', lambda: None)
+    with pytest.raises(OllamaBusyError):
+        scheduler.request('m', 'b', lambda: None)
+
+
+def test_scheduler_is_the_only_limit(ollama_stub):
+    running = peak = 0
+    lock = threading.Lock()
+
+    def chat(body):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return 200, {'message': {'content': body['messages'][0]['content']}, 'done': True}
+
+    ollama_stub.routes[('POST', '/api/chat')] = chat
+
+    async def run():
+        client = AsyncOllamaClient(ollama_stub.url, max_concurrency=None, pool_size=10)
+        dispatcher = AsyncDispatcher(FairScheduler(limit=3, max_queue=64))
+
+        async def ask(i):
+            payload = {'model': 'm', 'messages': [{'role': 'user', 'content': str(i)}]}
+            result = await dispatcher.call('m', request_key(payload), lambda: client.chat(payload), str(i))
+            return result['message']['content']
+
+        try:
+            return await asyncio.gather(*(ask(i) for i in range(12)))
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == [str(i) for i in range(12)]
+    assert peak == 3
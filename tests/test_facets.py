@@ -0,0 +1,135 @@
+import pytest
+
+import facets
+from benchmark import generate_corpus
+from facets import FacetIndex, SearchFilter, as_filter, extract_mentions
+from vector_store import SimpleVectorStore
+
+DOCS = [
+    'Priya Raman, Mar 3, 9:15 AM: release 3.0.50.040 started',
+    'Sam Lee, Mar 4, 10:00 AM: release notes for PNC-55366 are up',
+    'Priya Raman, Jun 2, 4:30 PM: patch 34 fixes the release',
+]
+FILTERS = [
+    SearchFilter(speaker='priya'),
+    SearchFilter(speaker='Sagar Naik', after='Mar 1'),
+    SearchFilter(mentions=('3.0.50',)),
+    SearchFilter(before='Feb 10', after='Jan 20'),
+]
+
+
+def test_from_dict():
+    search_filter = SearchFilter.from_dict({'speaker': 'Priya', 'mentions': 'PNC-55366'})
+    assert search_filter.speaker == 'Priya'
+    assert search_filter.mentions == ('PNC-55366',)
+    assert SearchFilter.from_dict({'mentions': ['34', 45]}).mentions == ('34', '45')
+    assert SearchFilter.from_dict(None) is None
+    assert SearchFilter.from_dict({'speaker': ''}) is None
+
+
+@pytest.mark.parametrize('data, message', [
+    ('Priya', 'filters must be an object'),
+    ({'author': 'Priya'}, 'Unknown filter fields: author'),
+    ({'mentions': 5}, 'mentions must be a string or list'),
+    ({'mentions': {'id': 'PNC-55366'}}, 'mentions must be a string or list'),
+])
+def test_from_dict_rejects_bad_filters(data, message):
+    with pytest.raises(ValueError, match=message):
+        SearchFilter.from_dict(data)
+
+
+def test_key_ignores_case_and_order():
+    first = as_filter({'speaker': ' Priya ', 'mentions': ['PNC-55366', '34']})
+    second = as_filter({'speaker': 'priya', 'mentions': ['34', 'pnc-55366']})
+    assert first.key() == second.key()
+
+
+def test_extract_mentions():
+    mentions = extract_mentions('Release 3.0.50.040 started; patch 34 and PNC-55366')
+    assert {'3.0.50.040', '34', 'PNC-55366'} <= set(mentions)
+
+
+def test_filtered_search():
+    store = SimpleVectorStore()
+    store.add_documents(DOCS)
+    assert sorted(r.doc_id for r in store.search('release', 5, filters={'speaker': 'priya'})) == [0, 2]
+    assert [r.doc_id for r in store.search('release', 5, filters={'mentions': 'PNC-55366'})] == [1]
+    assert store.search('release', 5, filters={'speaker': 'nobody'}) == []
+
+
+
+def facet_index(documents):
+    index = FacetIndex()
+    index.update(documents)
+    return index
+
+
+def live_documents(store):
+    return [(doc_id, doc) for segment in store._snapshot.segments
+            for doc_id, doc, dead in zip(segment.row_ids, segment.documents, segment.dead) if not dead]
+
+
+def expected_ids(store, search_filter):
+    """Doc ids matching ``search_filter``, extracting the metadata of every live document afresh."""
+    live = live_documents(store)
+    return sorted(live[position][0] for position in facet_index([doc for _, doc in live]).select(search_filter))
+
+
+def selected_ids(store, search_filter):
+    """Doc ids matching ``search_filter`` according to each segment's facets."""
+    return sorted(segment.row_ids[row] for segment in store._snapshot.segments
+                  for row in segment.select(search_filter))
+
+
+def refuse_extraction(monkeypatch):
+    def refuse(text):
+        raise AssertionError('metadata extracted again')
+    monkeypatch.setattr(facets.DocumentMetadata, 'from_text', staticmethod(refuse))
+
+
+@pytest.fixture
+def churned_store():
+    corpus = list(generate_corpus(1500))
+    store = SimpleVectorStore(query_cache_size=0)
+    for start in range(0, len(corpus), 100):
+        store.add_documents(corpus[start:start + 100])
+    for doc_id in range(0, len(corpus), 3):
+        store.delete(doc_id)
+    store.update(4, 'Priya Raman, Jan 25, 9:00 AM: promoted 3.0.50.001 to staging')
+    return store
+
+
+def test_extend_matches_extracting_again():
+    documents = list(generate_corpus(300))
+    kept = [row for row in range(200) if row % 4]
+    index = facet_index(documents[:100])
+    index.extend(facet_index(documents[100:]))
+    index.extend(facet_index(documents[:200]), kept)
+    expected = facet_index(documents + [documents[row] for row in kept])
+    assert index.n_docs == expected.n_docs
+    assert index.speakers == expected.speakers
+    assert index.mentions == expected.mentions
+    assert index.timestamps == expected.timestamps
+    for search_filter in FILTERS:
+        assert index.select(search_filter) == expected.select(search_filter)
+
+
+def test_merged_segments_keep_facets(churned_store, monkeypatch):
+    expected = [expected_ids(churned_store, search_filter) for search_filter in FILTERS]
+    assert churned_store.segment_count > 1
+    refuse_extraction(monkeypatch)
+    churned_store.compact()
+    for search_filter, ids in zip(FILTERS, expected):
+        assert ids
+        assert selected_ids(churned_store, search_filter) == ids
+
+
+def test_saved_index_keeps_facets(churned_store, tmp_path, monkeypatch):
+    churned_store.save(tmp_path / 'chat.index')
+    expected = [churned_store.search('release', 10, filters=search_filter) for search_filter in FILTERS]
+    refuse_extraction(monkeypatch)
+    opened = SimpleVectorStore.open(tmp_path / 'chat.index')
+    for search_filter, results in zip(FILTERS, expected):
+        got = opened.search('release', 10, filters=search_filter)
+        assert [result.text for result in got] == [result.text for result in results]
+        assert [result.score for result in got] == pytest.approx([result.score for result in results])
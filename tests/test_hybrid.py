@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+
+from chatbot import LocalChatbot
+from hybrid import HybridRetriever
+from vector_store import SearchResult
+
+
+class Ranked:
+    """Retriever returning fixed doc ids, optionally after a delay or with an error."""
+
+    def __init__(self, doc_ids, delay=0.0, error=None):
+        self.doc_ids = doc_ids
+        self.delay = delay
+        self.error = error
+        self.finished = threading.Event()
+        self.queries = []
+
+    def search(self, query, top_k=3, filters=None):
+        self.queries.append(query)
+        time.sleep(self.delay)
+        self.finished.set()
+        if self.error is not None:
+            raise self.error
+        return [SearchResult(f'doc {doc_id}', 1.0 / rank, doc_id)
+                for rank, doc_id in enumerate(self.doc_ids[:top_k], start=1)]
+
+
+@pytest.fixture
+def make_retriever():
+    retrievers = []
+
+    def make(*args, **kwargs):
+        retriever = HybridRetriever(*args, **kwargs)
+        retrievers.append(retriever)
+        return retriever
+
+    yield make
+    for retriever in retrievers:
+        retriever.close()
+
+
+def ids(results):
+    return [result.doc_id for result in results]
+
+
+def test_fusion_prefers_documents_both_retrievers_rank(make_retriever):
+    hybrid = make_retriever({'lexical': Ranked([1, 2, 3]), 'dense': Ranked([3, 1, 4])})
+    results = hybrid.search('q', top_k=3)
+    assert ids(results) == [1, 3, 2]
+    assert results[0].score == pytest.approx(1 / 61 + 1 / 62)
+
+
+def test_slow_retriever_is_left_out(make_retriever):
+    slow = Ranked([9, 8], delay=1.0)
+    hybrid = make_retriever({'lexical': Ranked([1, 2]), 'dense': slow}, timeout=0.1)
+    started = time.perf_counter()
+    results, timings = hybrid.search_timed('q', top_k=2)
+    assert time.perf_counter() - started < 0.5
+    assert ids(results) == [1, 2]
+    assert timings['dense'] is None
+    assert hybrid.stats()['dense'] == {'ok': 0, 'timeout': 1, 'error': 0}
+    # The late call still completes in the background
+    assert slow.finished.wait(2)
+
+
+def test_budget_holds_when_every_retriever_is_slow(make_retriever):
+    hybrid = make_retriever({'lexical': Ranked([1], delay=1.0), 'dense': Ranked([2], delay=1.0)}, timeout=0.1)
+    started = time.perf_counter()
+    assert hybrid.search('q') == []
+    assert time.perf_counter() - started < 0.5
+    assert all(counts['timeout'] == 1 for counts in hybrid.stats().values())
+
+
+def test_queued_calls_are_cancelled_at_the_deadline(make_retriever):
+    slow = Ranked([9], delay=0.5)
+    hybrid = make_retriever({'lexical': Ranked([1]), 'dense': slow}, timeout=0.1, workers_per_retriever=1)
+    assert ids(hybrid.search('first')) == [1]
+    # The second call waits behind the first on the dense retriever's only thread
+    assert ids(hybrid.search('second')) == [1]
+    assert slow.finished.wait(2)
+    time.sleep(0.2)
+    assert slow.queries == ['first']
+    assert hybrid.stats()['dense'] == {'ok': 0, 'timeout': 2, 'error': 0}
+
+
+def test_failed_retriever_is_counted(make_retriever):
+    outcomes = []
+    hybrid = make_retriever({'lexical': Ranked([1]), 'dense': Ranked([2], error=RuntimeError('down'))})
+    hybrid.on_outcome = lambda name, outcome: outcomes.append((name, outcome))
+    assert ids(hybrid.search('q')) == [1]
+    assert sorted(outcomes) == [('dense', 'error'), ('lexical', 'ok')]
+
+
+def test_chatbot_hybrid_survives_embedding_failure(embed_stub):
+    chatbot = LocalChatbot(ollama_host=embed_stub.url, retrieval='hybrid', embed_model='stub',
+                           retrieval_timeout=2.0)
+    chatbot.build_dense_store()
+    try:
+        question = 'any update on the db backup?'
+        assert chatbot.retrieve(question)
+        embed_stub.routes[('POST', '/api/embed')] = lambda body: (500, {'error': 'model crashed'})
+        lexical = chatbot.vector_store.search(question, top_k=3)
+        assert ids(chatbot.retrieve(question)) == ids(lexical)
+        assert chatbot.hybrid.stats()['dense']['error'] == 1
+    finally:
+        chatbot.hybrid.close()
+
+
+def test_chatbot_hybrid_after_deletes_and_updates(embed_stub):
+    chatbot = LocalChatbot(ollama_host=embed_stub.url, retrieval='hybrid', embed_model='stub',
+                           retrieval_timeout=2.0)
+    chatbot.build_dense_store()
+    try:
+        backup = ids(chatbot.vector_store.search('db backup', top_k=3))
+        chatbot.delete_document(backup[0])
+        chatbot.update_document(backup[1], 'Priya, Nov 2, 9:00 AM: the db backup now runs nightly')
+        [added] = chatbot.add_documents(['Sam, Nov 3, 10:00 AM: db backup restored on staging'])
+        assert list(chatbot.dense_store.documents) == list(chatbot.vector_store.documents)
+
+        results = chatbot.retrieve('db backup', n_results=5)
+        assert chatbot.hybrid.stats()['dense']['ok'] == 1
+        assert len(set(ids(results))) == len(results)
+        assert backup[0] not in ids(results)
+        assert {backup[1], added} <= set(ids(results))
+        for result in results:
+            assert result.text == chatbot.vector_store.document(result.doc_id)
+    finally:
+        chatbot.hybrid.close()
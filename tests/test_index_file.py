@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+import segments
+from benchmark import generate_corpus, sample_queries
+from index_file import MappedIndex, read_corpus_fingerprint
+from ingest import corpus_fingerprint, index_is_current
+from vector_store import SimpleVectorStore
+
+SCORERS = ['tfidf', 'bm25', 'bm25+']
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    return list(generate_corpus(2000))
+
+
+@pytest.fixture(scope='module')
+def saved(corpus, tmp_path_factory):
+    path = tmp_path_factory.mktemp('index') / 'chat.index'
+    store = SimpleVectorStore(query_cache_size=0)
+    store.add_documents(corpus)
+    store.save(path)
+    return path
+
+
+def ranking(results):
+    return [(result.doc_id, result.text) for result in results]
+
+
+@pytest.mark.parametrize('backend', SimpleVectorStore.BACKENDS)
+@pytest.mark.parametrize('scorer', SCORERS)
+def test_round_trip_keeps_rankings(corpus, saved, backend, scorer):
+    memory = SimpleVectorStore(backend=backend, scorer=scorer, query_cache_size=0)
+    memory.add_documents(corpus)
+    mapped = SimpleVectorStore.open(saved, backend=backend, scorer=scorer, query_cache_size=0)
+    assert list(mapped.documents) == corpus
+    queries = sample_queries(corpus, 40)
+    for expected, got in zip(memory.search_many(queries, 5), mapped.search_many(queries, 5)):
+        assert ranking(got) == ranking(expected)
+        assert [r.score for r in got] == pytest.approx([r.score for r in expected], rel=1e-12)
+    filters = {'speaker': 'Priya'}
+    for query in queries[:10]:
+        assert ranking(mapped.search(query, 5, filters=filters)) == ranking(memory.search(query, 5, filters=filters))
+
+
+def test_mapped_matrix_matches_in_memory(corpus, saved):
+    memory = SimpleVectorStore(backend='numpy', query_cache_size=0)
+    memory.add_documents(corpus)
+    expected = memory._tfidf(memory._snapshot).matrices[0]
+    got = MappedIndex(saved).csr_index()
+    assert np.array_equal(got.indptr, expected.indptr)
+    # Columns are numbered in sorted term order in the file, in first-seen order in memory
+    column = np.zeros(len(expected.vocabulary), dtype=np.int64)
+    for term, col in expected.vocabulary.items():
+        column[col] = got.vocabulary.get(term)
+    for row in range(expected.n_docs):
+        start, end = expected.indptr[row], expected.indptr[row + 1]
+        want = sorted(zip(column[expected.indices[start:end]], expected.data[start:end]))
+        have = list(zip(got.indices[start:end], got.data[start:end]))
+        assert [col for col, _ in have] == [col for col, _ in want]
+        assert [value for _, value in have] == pytest.approx([value for _, value in want], rel=1e-12)
+
+
+def test_corpus_fingerprint_detects_changed_exports(tmp_path):
+    exports = tmp_path / 'exports'
+    exports.mkdir()
+    (exports / 'a.txt').write_text('Priya, Mar 3, 9:15 AM: db backup failed\n')
+    index = tmp_path / 'chat.index'
+    assert not index_is_current(index, [exports])
+
+    store = SimpleVectorStore()
+    store.add_documents(['Priya, Mar 3, 9:15 AM: db backup failed'])
+    store.save(index, corpus_fingerprint([exports]))
+    assert read_corpus_fingerprint(index) == corpus_fingerprint([exports])
+    assert index_is_current(index, [exports]) and index_is_current(index)
+
+    (exports / 'b.jsonl').write_text('"Sam: release 40 is out"\n')
+    assert not index_is_current(index, [exports])
+    assert index_is_current(index)
+
+    index.write_bytes(b'not an index')
+    assert not index_is_current(index)
+
+
+def test_mapped_index_stores_document_lengths(corpus, saved, monkeypatch):
+    memory = SimpleVectorStore(query_cache_size=0)
+    memory.add_documents(corpus)
+    mapped = SimpleVectorStore.open(saved, scorer='bm25', query_cache_size=0)
+
+    def refuse(text):
+        raise AssertionError('document tokenised again')
+    monkeypatch.setattr(segments, '_tokenize', refuse)
+    assert list(mapped._snapshot.segments[0].document_lengths()) == list(memory._snapshot.segments[0].lengths)
+    assert mapped.search('release backup', 5)
@@ -0,0 +1,33 @@
+from chatbot import LocalChatbot
+from ingest import ingest
+from vector_store import SimpleVectorStore
+
+
+def test_counts_only_indexed_messages(tmp_path):
+    export = tmp_path / 'chat.txt'
+    export.write_text('backup finished\n???\n\nbackup finished\n--- !!\nrelease 3.0 is out\n')
+    store = SimpleVectorStore()
+
+    stats = ingest(store, [export], batch_size=2)
+
+    assert stats.indexed == store.document_count == 2
+    assert stats.duplicates == 1
+    assert stats.empty == 2
+    assert stats.read == stats.indexed + stats.duplicates + stats.empty
+
+
+def test_chatbot_reindexes_when_exports_change(tmp_path):
+    exports = tmp_path / 'exports'
+    exports.mkdir()
+    (exports / 'week1.txt').write_text('Priya, Mar 3, 9:15 AM: db backup failed\n')
+    index = str(tmp_path / 'chat.index')
+
+    first = LocalChatbot(index_path=index, corpus_paths=[str(exports)])
+    assert list(first.vector_store.documents) == ['Priya, Mar 3, 9:15 AM: db backup failed']
+    reopened = LocalChatbot(index_path=index, corpus_paths=[str(exports)])
+    assert 'mapped' in reopened.vector_store.memory_usage()
+
+    (exports / 'week2.txt').write_text('Sam, Mar 10, 2:00 PM: release 40 started\n')
+    updated = LocalChatbot(index_path=index, corpus_paths=[str(exports)])
+    assert updated.vector_store.search('release 40')[0].text == 'Sam, Mar 10, 2:00 PM: release 40 started'
+    assert len(LocalChatbot(index_path=index, corpus_paths=[str(exports)]).vector_store.documents) == 2
@@ -0,0 +1,65 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ollama_client import AsyncOllamaClient, OllamaClient
+
+
+def tags(_body):
+    return 200, {'models': []}
+
+
+def test_sequential_requests_reuse_one_connection(ollama_stub):
+    ollama_stub.routes[('GET', '/api/tags')] = tags
+    client = OllamaClient(ollama_stub.url, pool_size=2)
+    try:
+        for _ in range(20):
+            assert client.get('/api/tags').status_code == 200
+    finally:
+        client.close()
+    assert len(ollama_stub.calls('/api/tags')) == 20
+    assert ollama_stub.connections == 1
+
+
+def test_threads_share_the_pool(ollama_stub):
+    ollama_stub.routes[('POST', '/api/chat')] = lambda body: (200, {'message': {'content': body['model']}})
+    client = OllamaClient(ollama_stub.url, pool_size=4)
+    try:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            responses = list(pool.map(
+                lambda i: client.post('/api/chat', json={'model': f'm{i}'}), range(100)))
+    finally:
+        client.close()
+    assert [r.json()['message']['content'] for r in responses] == [f'm{i}' for i in range(100)]
+    # One connection per worker thread at most, not one per request
+    assert ollama_stub.connections <= 4
+
+
+def test_async_client_reuses_connections(ollama_stub):
+    ollama_stub.routes[('GET', '/api/tags')] = tags
+
+    async def run():
+        client = AsyncOllamaClient(ollama_stub.url, pool_size=2)
+        try:
+            for _ in range(20):
+                assert (await client.get('/api/tags')).status_code == 200
+        finally:
+            await client.aclose()
+
+    asyncio.run(run())
+    assert ollama_stub.connections == 1
+
+
+def test_async_chat_raises_on_error_status(ollama_stub):
+    ollama_stub.routes[('POST', '/api/chat')] = lambda body: (500, {'error': 'boom'})
+
+    async def run():
+        client = AsyncOllamaClient(ollama_stub.url)
+        try:
+            await client.chat({'model': 'm', 'messages': []})
+        finally:
+            await client.aclose()
+
+    with pytest.raises(RuntimeError, match='HTTP 500'):
+        asyncio.run(run())
@@ -0,0 +1,46 @@
+import sqlite3
+import time
+
+from response_cache import ResponseCache
+
+
+def rows(path):
+    with sqlite3.connect(path) as db:
+        return [key for key, in db.execute('SELECT key FROM responses ORDER BY created')]
+
+
+def test_lru_and_stats():
+    cache = ResponseCache(max_entries=2)
+    cache.put('a', 'A')
+    cache.put('b', 'B')
+    assert cache.get('a') == 'A'
+    cache.put('c', 'C')
+    assert cache.get('b') is None
+    assert cache.stats() == {'entries': 2, 'hits': 1, 'misses': 1, 'evictions': 1}
+
+
+def test_key_ignores_case_and_punctuation():
+    assert ResponseCache.make_key('DB backup?', 'm', ['x']) == ResponseCache.make_key('db backup', 'm', ['x'])
+    assert ResponseCache.make_key('db backup', 'm', ['x']) != ResponseCache.make_key('db backup', 'm', ['y'])
+
+
+def test_file_is_capped_at_max_entries(tmp_path):
+    path = str(tmp_path / 'responses.db')
+    cache = ResponseCache(max_entries=3, path=path)
+    for number in range(10):
+        cache.put(f'q{number}', f'answer {number}')
+    assert rows(path) == ['q7', 'q8', 'q9']
+
+    restarted = ResponseCache(max_entries=3, path=path)
+    assert restarted.get('q9') == 'answer 9'
+    assert restarted.get('q0') is None
+
+
+def test_expired_rows_are_swept_on_put(tmp_path):
+    path = str(tmp_path / 'responses.db')
+    cache = ResponseCache(max_entries=100, ttl_seconds=0.05, path=path)
+    cache.put('old', 'stale')
+    time.sleep(0.1)
+    cache.put('new', 'fresh')
+    assert rows(path) == ['new']
+    assert cache.get('old') is None and cache.get('new') == 'fresh'
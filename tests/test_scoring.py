@@ -0,0 +1,78 @@
+import math
+from collections import Counter
+
+import pytest
+
+from benchmark import generate_corpus, sample_queries
+from scoring import Bm25Scorer
+from segments import _tokenize
+from vector_store import SimpleVectorStore
+
+DOCS = [
+    'release 040 is promoted to staging',
+    'the release backup failed again and again',
+    'backup job rescheduled',
+    'staging backup is green after the release backup',
+    'nothing to see here',
+]
+
+
+def reference_bm25(documents, query, k1=1.2, b=0.75, delta=0.0):
+    """BM25 (BM25+ with ``delta``) of every document, straight from the formula."""
+    tokenized = [_tokenize(doc) for doc in documents]
+    average = sum(map(len, tokenized)) / len(tokenized)
+    scores = []
+    for tokens in tokenized:
+        counts = Counter(tokens)
+        score = 0.0
+        for term, query_count in Counter(_tokenize(query)).items():
+            if not counts[term]:
+                continue
+            doc_freq = sum(term in other for other in tokenized)
+            idf = math.log(1 + (len(tokenized) - doc_freq + 0.5) / (doc_freq + 0.5))
+            norm = k1 * (1 - b + b * len(tokens) / average)
+            score += query_count * idf * (counts[term] * (k1 + 1) / (counts[term] + norm) + delta)
+        scores.append(score)
+    return scores
+
+
+@pytest.mark.parametrize('scorer, delta', [('bm25', 0.0), ('bm25+', 1.0)])
+@pytest.mark.parametrize('backend', SimpleVectorStore.BACKENDS)
+@pytest.mark.parametrize('query', ['release backup', 'backup backup staging', 'again', 'unknown words'])
+def test_scores_match_reference(scorer, delta, backend, query):
+    store = SimpleVectorStore(backend=backend, scorer=scorer, query_cache_size=0)
+    store.add_documents(DOCS)
+    scores = reference_bm25(DOCS, query, delta=delta)
+    expected = sorted((doc_id for doc_id, score in enumerate(scores) if score > 0),
+                      key=lambda doc_id: (-scores[doc_id], doc_id))
+    results = store.search(query, top_k=len(DOCS))
+    assert [result.doc_id for result in results] == expected
+    assert [result.score for result in results] == pytest.approx([scores[doc_id] for doc_id in expected],
+                                                                 rel=1e-12)
+
+
+class Exhaustive(Bm25Scorer):
+    EXHAUSTIVE_POSTINGS = math.inf
+
+
+class Pruned(Bm25Scorer):
+    EXHAUSTIVE_POSTINGS = 0
+
+
+@pytest.mark.parametrize('delta', [0.0, 1.0])
+def test_max_score_matches_exhaustive(delta):
+    corpus = list(generate_corpus(4000))
+    queries = sample_queries(corpus, 80) + ['release backup job', 'the the to', 'release']
+    stores = []
+    for scorer in (Exhaustive(delta=delta), Pruned(delta=delta)):
+        store = SimpleVectorStore(scorer=scorer, query_cache_size=0)
+        for start in range(0, len(corpus), 1000):
+            store.add_documents(corpus[start:start + 1000])
+        for doc_id in range(0, len(corpus), 5):
+            store.delete(doc_id)
+        stores.append(store)
+    exhaustive, pruned = stores
+    for top_k in (1, 10):
+        for expected, got in zip(exhaustive.search_many(queries, top_k), pruned.search_many(queries, top_k)):
+            assert [(result.doc_id, result.score) for result in got] == \
+                [(result.doc_id, result.score) for result in expected]
@@ -0,0 +1,254 @@
+import dataclasses
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmark import generate_corpus, index_state, sample_queries
+from vector_store import SimpleVectorStore
+
+BACKENDS = SimpleVectorStore.BACKENDS
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    return list(generate_corpus(3000))
+
+
+@pytest.fixture(scope='module')
+def queries(corpus):
+    return sample_queries(corpus, 60) + ['', '???', 'zzzz unseen words']
+
+
+def ranking(results):
+    return [(result.doc_id, result.text) for result in results]
+
+
+def weights(store):
+    """Document norms (python backend) or normalised TF-IDF matrices (numpy backend)."""
+    state = store._tfidf(store._snapshot)
+    if state.norms is not None:
+        return [list(norms) for norms in state.norms]
+    return [(matrix.indptr.tolist(), matrix.indices.tolist(), matrix.data.tolist()) for matrix in state.matrices]
+
+
+def assert_same(got, expected):
+    """Same documents in the same order, with scores equal up to the last bits."""
+    assert ranking(got) == ranking(expected)
+    assert [result.score for result in got] == pytest.approx([result.score for result in expected],
+                                                             rel=1e-12, abs=1e-15)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_search_many_matches_search(corpus, queries, backend):
+    store = SimpleVectorStore(backend=backend, query_cache_size=0)
+    store.add_documents(corpus)
+    for query, results in zip(queries, store.search_many(queries, top_k=5)):
+        assert_same(results, store.search(query, top_k=5))
+    filters = {'speaker': 'Priya'}
+    for query, results in zip(queries, store.search_many(queries, top_k=5, filters=filters)):
+        assert_same(results, store.search(query, top_k=5, filters=filters))
+
+
+def test_backends_agree(corpus, queries):
+    python, numpy = (SimpleVectorStore(backend=backend, query_cache_size=0) for backend in BACKENDS)
+    python.add_documents(corpus)
+    numpy.add_documents(corpus)
+    for python_results, numpy_results in zip(python.search_many(queries, 5), numpy.search_many(queries, 5)):
+        assert_same(numpy_results, python_results)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_parallel_build_matches_serial(queries, backend):
+    # More documents than one 2000-document shard, so the pool really splits the work
+    corpus = list(generate_corpus(5000, seed=7))
+    serial, parallel = (SimpleVectorStore(backend=backend, query_cache_size=0) for _ in range(2))
+    serial.add_documents(corpus)
+    parallel.add_documents(corpus, workers=2)
+
+    assert index_state(parallel) == index_state(serial)
+    assert weights(parallel) == weights(serial)
+    for parallel_results, serial_results in zip(parallel.search_many(queries, 10), serial.search_many(queries, 10)):
+        assert ranking(parallel_results) == ranking(serial_results)
+        assert [result.score for result in parallel_results] == [result.score for result in serial_results]
+
+
+def live_items(store):
+    """``(doc_id, text)`` of every live document, in corpus order."""
+    return [(doc_id, doc) for segment in store._snapshot.segments
+            for doc_id, doc, dead in zip(segment.row_ids, segment.documents, segment.dead) if not dead]
+
+
+def assert_matches_fresh_index(store, queries):
+    """Rankings equal those of an index built from scratch over the live documents.
+
+    The fresh index adds the documents in corpus order, which is the order
+    ties are broken in, so its rankings map onto the store's ids one to one.
+    """
+    items = live_items(store)
+    fresh = SimpleVectorStore(backend=store.backend, scorer=store.scorer, query_cache_size=0)
+    fresh.add_documents([doc for _, doc in items])
+    assert store.document_count == len(items)
+    for query, got, expected in zip(queries, store.search_many(queries, 10), fresh.search_many(queries, 10)):
+        assert ranking(got) == [(items[result.doc_id][0], result.text) for result in expected], query
+        assert [result.score for result in got] == pytest.approx([result.score for result in expected],
+                                                                 rel=1e-12, abs=1e-15)
+
+
+@pytest.mark.parametrize('scorer', ['tfidf', 'bm25'])
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_churn_matches_fresh_index(corpus, queries, backend, scorer):
+    store = SimpleVectorStore(backend=backend, scorer=scorer, query_cache_size=0)
+    for start in range(0, 2000, 250):
+        store.add_documents(corpus[start:start + 250])
+    for doc_id in range(0, 2000, 7):
+        store.delete(doc_id)
+    for doc_id in range(3, 2000, 50):
+        if doc_id % 7:
+            store.update(doc_id, corpus[2000 + doc_id // 50])
+    store.update(5, '!!!')
+    store.add_documents(corpus[2100:2400])
+    assert store.deleted_rows
+    assert_matches_fresh_index(store, queries)
+
+    store.compact()
+    assert store.segment_count == 1
+    assert store.deleted_rows == 0
+    assert_matches_fresh_index(store, queries)
+
+
+def test_document_frequency_and_idf_after_deletes():
+    store = SimpleVectorStore(query_cache_size=0)
+    store.add_documents(['backup failed', 'backup done', 'release done', 'release backup'])
+    store.delete(1)
+    store.delete(2)
+    assert store.document_frequency('backup') == 2
+    assert store.document_frequency('release') == 1
+    assert store.document_frequency('done') == 0
+    state = store._tfidf(store._snapshot)
+    assert state.term_idf('backup') == pytest.approx(math.log(3 / 3) + 1)
+    assert state.term_idf('release') == pytest.approx(math.log(3 / 2) + 1)
+    # A term left only in deleted documents weighs as much as an unseen one
+    assert state.term_idf('done') == 1.0
+    assert [result.doc_id for result in store.search('release done', 5)] == [3]
+
+
+def test_update_keeps_id():
+    store = SimpleVectorStore(query_cache_size=0)
+    store.add_documents(['alpha one', 'beta two', 'gamma three'])
+    store.update(1, 'beta rewritten')
+    assert store.document(1) == 'beta rewritten'
+    assert store.document(2) == 'gamma three'
+    assert [(result.doc_id, result.text) for result in store.search('beta', 5)] == [(1, 'beta rewritten')]
+    assert store.search('two', 5) == []
+    assert store.add_documents(['delta four']) == [3]
+    store.update(1, '')
+    with pytest.raises(KeyError):
+        store.document(1)
+    with pytest.raises(KeyError):
+        store.update(1, 'beta again')
+
+
+def test_segment_compacts_past_compact_ratio():
+    store = SimpleVectorStore(query_cache_size=0, compact_ratio=0.25)
+    store.add_documents([f'message number {number}' for number in range(100)])
+    for doc_id in range(25):
+        store.delete(doc_id)
+    assert store.deleted_rows == 25
+    store.delete(25)
+    assert store.deleted_rows == 0
+    assert store.document_count == 74
+    assert store.document(99) == 'message number 99'
+    assert [result.doc_id for result in store.search('number 60', 1)] == [60]
+
+
+@pytest.mark.parametrize('scorer', ['tfidf', 'bm25'])
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_rankings_unchanged_across_merges(corpus, queries, backend, scorer):
+    whole = SimpleVectorStore(backend=backend, scorer=scorer, query_cache_size=0)
+    whole.add_documents(corpus)
+    expected = whole.search_many(queries, 10)
+
+    store = SimpleVectorStore(backend=backend, scorer=scorer, query_cache_size=0)
+    for start in range(0, len(corpus), 70):
+        store.add_documents(corpus[start:start + 70])
+    assert store.segment_count > 1
+    for got, results in zip(store.search_many(queries, 10), expected):
+        assert_same(got, results)
+    store.compact()
+    assert store.segment_count == 1
+    for got, results in zip(store.search_many(queries, 10), expected):
+        assert_same(got, results)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_reader_keeps_its_snapshot_while_writer_publishes(corpus, queries, backend):
+    queries = queries[:20]
+    store = SimpleVectorStore(backend=backend, query_cache_size=0)
+    store.add_documents(corpus[:500])
+    held = store._snapshot
+    held_results = store._search_snapshot(held, queries, 5, None)
+    # Results of every published snapshot, computed by the writer as it publishes it
+    expected = {held: held_results}
+    seen = []
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            snapshot = store._snapshot
+            seen.append((snapshot, store._search_snapshot(snapshot, queries, 5, None)))
+            assert store._search_snapshot(held, queries, 5, None) == held_results
+
+    def published():
+        expected[store._snapshot] = store._search_snapshot(store._snapshot, queries, 5, None)
+
+    def write():
+        try:
+            for step, start in enumerate(range(500, 1700, 100)):
+                store.add_documents(corpus[start:start + 100])
+                published()
+                store.delete(step * 13)
+                published()
+                store.update(step * 13 + 1, corpus[2500 + step])
+                published()
+            store.compact()
+            published()
+        finally:
+            done.set()
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        readers = [pool.submit(read) for _ in range(2)]
+        pool.submit(write).result()
+        for reader in readers:
+            reader.result()
+
+    assert len(expected) > 2
+    assert len({snapshot for snapshot, _ in seen}) > 1
+    for snapshot, results in seen:
+        assert results == expected[snapshot]
+
+
+def test_query_cache_hits_evictions_and_invalidation():
+    store = SimpleVectorStore(query_cache_size=2)
+    store.add_documents(['db backup failed', 'release 40 started', 'backup restored'])
+    first = store.search('DB backup?', 2)
+    # Same bag of words, so the same entry
+    assert store.search('backup db', 2) == first
+    store.search('release', 2)
+    store.search('restored', 2)
+    store.search('backup db', 2)
+    assert store.query_cache_stats() == {'entries': 2, 'hits': 1, 'misses': 4, 'evictions': 2, 'invalidations': 0}
+
+    # Results handed out cannot change the cached ones
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        first[0].score = 0.0
+    store.search('restored', 2).clear()
+    assert ranking(store.search('restored', 2)) == [(2, 'backup restored')]
+    assert store.query_cache_stats()['hits'] == 3
+
+    store.add_documents(['backup backup backup'])
+    assert 3 in [result.doc_id for result in store.search('backup', 3)]
+    store.delete(3)
+    assert 3 not in [result.doc_id for result in store.search('backup', 3)]
+    assert store.query_cache_stats() == {'entries': 1, 'hits': 3, 'misses': 6, 'evictions': 2, 'invalidations': 2}